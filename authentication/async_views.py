@@ -0,0 +1,136 @@
+"""
+Async Views for Connectly API.
+Support for async DRF views, and the async Google login of the ASGI deployment
+(gunicorn_asgi_config.py), where a login waiting on Google does not hold up a
+worker.
+
+DRF views are synchronous, so AsyncAPIViewMixin runs a view's async handlers
+itself and hands its sync ones to the regular dispatch in a thread.
+Authentication, permissions and throttling use the sync ORM and cache, so they
+run in a thread too, in a single hop before the handler.
+
+Provides:
+- AsyncAPIViewMixin: runs the async handlers of a view or viewset on the event loop
+- AsyncGoogleLoginView: google_login, verifying the token without blocking
+"""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django_ratelimit.core import is_ratelimited
+from rest_framework import status
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from singletons.logger_singleton import LoggerSingleton
+from .google_oauth import GoogleTokenError, averify_access_token
+from .principal import get_principal
+from .progressive_rate_limit import get_progressive_rate_limit_key
+from .views import google_login_rate_limited, google_login_user
+
+logger = LoggerSingleton().get_logger()
+
+
+class AsyncAPIViewMixin:
+    """
+    APIView or ViewSet mixin serving the handlers and actions defined with
+    `async def` without leaving the event loop. Under WSGI Django runs the whole
+    view in an event loop of its own.
+    """
+
+    @classmethod
+    def as_view(cls, *args, **initkwargs):
+        view = super().as_view(*args, **initkwargs)
+        # The view returns dispatch()'s coroutine, so Django has to await it
+        return markcoroutinefunction(view)
+
+    async def dispatch(self, request, *args, **kwargs):
+        handler = getattr(self, request.method.lower(), None)
+        if not iscoroutinefunction(handler):
+            return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+        # APIView.dispatch(), with the handler awaited
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial_sync)(request, *args, **kwargs)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    def initial_sync(self, request, *args, **kwargs):
+        self.initial(request, *args, **kwargs)
+        # Resolving the principal loads the user's profile, so the async handler can
+        # read both without making a query
+        get_principal(request)
+
+    async def aget_object(self):
+        """Async counterpart of get_object()."""
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except queryset.model.DoesNotExist:
+            raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def apaginate_queryset(self, queryset):
+        """Async counterpart of paginate_queryset()."""
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+
+
+class AsyncGoogleLoginView(AsyncAPIViewMixin, APIView):
+    """
+    google_login, responding exactly as it does, with the token verified on the
+    event loop. Finding or creating the user runs in a thread.
+    """
+    permission_classes = [AllowAny]
+
+    def initial_sync(self, request, *args, **kwargs):
+        super().initial_sync(request, *args, **kwargs)
+        # The rate limit of google_login, counted in the same group
+        request.limited = is_ratelimited(
+            request, group='authentication.views.google_login', key=get_progressive_rate_limit_key,
+            rate='5/m', method='POST', increment=True
+        )
+        # Parse the body here rather than on the event loop
+        request.data
+
+    async def post(self, request):
+        if request.limited:
+            return await sync_to_async(google_login_rate_limited)(request)
+
+        if 'access_token' not in request.data:
+            return Response(
+                {'error': 'Access token is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            try:
+                user_data = await averify_access_token(request.data.get('access_token'))
+            except GoogleTokenError as e:
+                logger.error("Failed to verify Google token: Status %s", e.status_code)
+                return Response(
+                    {'error': 'Invalid Google token'},
+                    status=status.HTTP_401_UNAUTHORIZED
+                )
+
+            return await sync_to_async(google_login_user)(request, user_data)
+
+        except Exception as e:
+            logger.error("Error during Google login: %s", e)
+            return Response(
+                {'error': 'An unexpected error occurred'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
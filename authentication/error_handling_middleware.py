@@ -3,6 +3,7 @@ Error handling middleware for secure error responses.
 Prevents debug information disclosure in production.
 """
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.shortcuts import render
 from django.http import Http404
 from django.core.exceptions import PermissionDenied
@@ -17,14 +18,23 @@ class SecureErrorHandlingMiddleware:
     Middleware to handle errors securely without exposing debug information.
     Returns custom error pages instead of Django debug pages.
     """
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         response = self.get_response(request)
         return response
 
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
     def process_exception(self, request, exception):
         """
         Handle exceptions and return secure error pages.
@@ -35,7 +45,7 @@ class SecureErrorHandlingMiddleware:
             return None
 
         # Log the actual error for debugging (server-side only)
-        logger.error(f"Exception in view: {exception}", exc_info=True)
+        logger.error("Exception in view: %s", exception, exc_info=True)
 
         # Return secure error pages without exposing details
         if isinstance(exception, Http404):
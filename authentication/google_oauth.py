@@ -0,0 +1,244 @@
+"""
+Google OAuth
+Verifies Google access tokens against Google's userinfo endpoint.
+
+A fresh connection per login costs a TCP and TLS handshake on top of the round
+trip, so requests go through an HTTP client shared by the process that keeps its
+connections alive: a pooled requests Session for sync views, and an httpx
+AsyncClient per event loop for the async view of the ASGI profile
+(gunicorn_asgi_config.py). Each AsyncClient is closed when its loop shuts down.
+
+Verified tokens are cached for GOOGLE_TOKEN_CACHE_TIMEOUT seconds, keyed by the
+token's hash, so repeated logins with the same token skip Google. Rejected tokens
+are not cached. If Redis cannot be reached, tokens are verified with Google.
+
+GOOGLE_USERINFO_URL can point at the stub server (authentication/google_stub.py)
+in place of Google for tests and benchmarks.
+
+The account a Google user logged in to is cached too, as the user id behind
+their Google id, so repeat logins skip the account lookup. No API token is stored
+there: the login loads the user's token and reads the user from the token cache,
+keyed by the token's hash. Entries live for AUTH_TOKEN_CACHE_TIMEOUT seconds and
+are deleted by the signals in models.py when the Google account is unlinked.
+
+Provides:
+- GoogleTokenError: raised when Google rejects a token
+- verify_access_token: the userinfo of a token, from the cache or Google
+- averify_access_token: async counterpart of verify_access_token
+- get_session: the process' pooled requests Session
+- get_cached_account / cache_account / invalidate_account: the account cache
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+import weakref
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.cache import cache
+from singletons.logger_singleton import LoggerSingleton
+from .token_cache import REDIS_ERRORS
+
+logger = LoggerSingleton().get_logger()
+
+TOKEN_KEY = 'google_token:{}'
+ACCOUNT_KEY = 'google_account:{}'
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+# Event loop to its (AsyncClient, semaphore, closer), see _get_async_client()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+class GoogleTokenError(Exception):
+    """Google rejected an access token."""
+
+    def __init__(self, status_code):
+        super().__init__(f"Google rejected the token: Status {status_code}")
+        self.status_code = status_code
+
+
+def _token_cache_key(access_token):
+    # Never put the raw token in a cache key
+    return TOKEN_KEY.format(hashlib.sha256(access_token.encode()).hexdigest())
+
+
+def get_session():
+    """
+    Get the requests Session of this process, creating it on first use.
+    A process forked after creating it (e.g. a worker) gets a Session of its own
+    rather than sharing the parent's sockets.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session_pid != pid:
+        with _session_lock:
+            if _session_pid != pid:
+                session = requests.Session()
+                # Keep a connection alive for each concurrent login, e.g. per worker thread
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.GOOGLE_HTTP_POOL_SIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session, _session_pid = session, pid
+    return _session
+
+
+async def _get_async_client():
+    """
+    Get the httpx AsyncClient of the running event loop, creating it on first use.
+    Each loop gets a client of its own, closed when the loop shuts down, so the
+    short-lived loops of async_to_sync() do not leave their connections open.
+
+    Returns:
+        tuple: The client, and a semaphore to hold while using one of its connections
+    """
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(loop)
+    if entry is None:
+        pool_size = settings.GOOGLE_HTTP_POOL_SIZE
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=settings.GOOGLE_HTTP_TIMEOUT,
+        )
+        # httpx slows down with many requests queued for its connections,
+        # so requests over the pool size wait here instead
+        slots = asyncio.Semaphore(pool_size)
+        closer = _close_at_loop_shutdown(client)
+        entry = _async_clients[loop] = (client, slots, closer)
+        await closer.asend(None)
+    return entry[0], entry[1]
+
+
+async def _close_at_loop_shutdown(client):
+    """
+    Close a loop's AsyncClient when the loop shuts down. Started once and left
+    suspended, this async generator is finalized by the loop's shutdown_asyncgens(),
+    which asyncio.run() and async_to_sync() call before closing the loop.
+    """
+    try:
+        yield
+    finally:
+        # Runs on the loop shutting down
+        _async_clients.pop(asyncio.get_running_loop(), None)
+        await client.aclose()
+
+
+def _get_cached_userinfo(key):
+    try:
+        return cache.get(key)
+    except REDIS_ERRORS as e:
+        logger.warning("Google userinfo cache unavailable, asking Google: %s", e)
+        return None
+
+
+def _cache_userinfo(key, user_data):
+    try:
+        cache.set(key, user_data, timeout=settings.GOOGLE_TOKEN_CACHE_TIMEOUT)
+    except REDIS_ERRORS as e:
+        logger.warning("Google userinfo cache unavailable, not caching the userinfo: %s", e)
+
+
+async def _aget_cached_userinfo(key):
+    try:
+        return await cache.aget(key)
+    except REDIS_ERRORS as e:
+        logger.warning("Google userinfo cache unavailable, asking Google: %s", e)
+        return None
+
+
+async def _acache_userinfo(key, user_data):
+    try:
+        await cache.aset(key, user_data, timeout=settings.GOOGLE_TOKEN_CACHE_TIMEOUT)
+    except REDIS_ERRORS as e:
+        logger.warning("Google userinfo cache unavailable, not caching the userinfo: %s", e)
+
+
+def verify_access_token(access_token):
+    """
+    Get the userinfo of a Google access token.
+
+    Args:
+        access_token: Access token from the Google OAuth process
+
+    Returns:
+        dict: The userinfo Google returned for the token
+
+    Raises:
+        GoogleTokenError: If Google rejects the token
+        requests.RequestException: If Google cannot be reached
+    """
+    key = _token_cache_key(access_token)
+    user_data = _get_cached_userinfo(key)
+    if user_data is not None:
+        return user_data
+
+    response = get_session().get(
+        settings.GOOGLE_USERINFO_URL,
+        headers={'Authorization': f'Bearer {access_token}'},
+        timeout=settings.GOOGLE_HTTP_TIMEOUT
+    )
+    if not response.ok:
+        raise GoogleTokenError(response.status_code)
+    user_data = response.json()
+    _cache_userinfo(key, user_data)
+    return user_data
+
+
+async def averify_access_token(access_token):
+    """
+    Async counterpart of verify_access_token().
+
+    Raises:
+        GoogleTokenError: If Google rejects the token
+        httpx.HTTPError: If Google cannot be reached
+    """
+    key = _token_cache_key(access_token)
+    user_data = await _aget_cached_userinfo(key)
+    if user_data is not None:
+        return user_data
+
+    client, slots = await _get_async_client()
+    async with slots:
+        response = await client.get(
+            settings.GOOGLE_USERINFO_URL,
+            headers={'Authorization': f'Bearer {access_token}'}
+        )
+    if not response.is_success:
+        raise GoogleTokenError(response.status_code)
+    user_data = response.json()
+    await _acache_userinfo(key, user_data)
+    return user_data
+
+
+def get_cached_account(google_id):
+    """
+    Get the account a Google user last logged in to.
+
+    Returns:
+        int or None: The user id, or None on a cache miss or if Redis is unreachable
+    """
+    try:
+        return cache.get(ACCOUNT_KEY.format(google_id))
+    except REDIS_ERRORS as e:
+        logger.warning("Google account cache unavailable, using the database: %s", e)
+        return None
+
+
+def cache_account(google_id, user_id):
+    """Cache the account a Google user logged in to."""
+    try:
+        cache.set(ACCOUNT_KEY.format(google_id), user_id, timeout=getattr(settings, 'AUTH_TOKEN_CACHE_TIMEOUT', 300))
+    except REDIS_ERRORS as e:
+        logger.warning("Google account cache unavailable, not caching the account: %s", e)
+
+
+def invalidate_account(google_id):
+    """Drop the cached account of a Google user, e.g. when their Google account is unlinked."""
+    try:
+        cache.delete(ACCOUNT_KEY.format(google_id))
+    except REDIS_ERRORS as e:
+        logger.error("Could not invalidate the cached account of a Google user: %s", e)
@@ -0,0 +1,116 @@
+"""
+Google Stub Server
+A local stand-in for Google's userinfo endpoint, for tests and benchmarks.
+
+Point GOOGLE_USERINFO_URL at it (see GoogleStubServer.userinfo_url). Any bearer
+token is accepted and mapped to a made-up user derived from the token, except
+tokens starting with 'invalid', which get a 401. Userinfo can also be set per
+token. The server keeps connections alive, like Google, and counts them, so
+tests can check that they are reused.
+
+Run it with `python manage.py run_google_stub`, or in a thread:
+
+    server = GoogleStubServer()
+    server.start()
+    ...
+    server.stop()
+"""
+
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+USERINFO_PATH = '/oauth2/v3/userinfo'
+
+
+def stub_userinfo(access_token):
+    """The made-up userinfo of an access token."""
+    digest = hashlib.sha256(access_token.encode()).hexdigest()[:12]
+    return {
+        'sub': str(int(digest, 16)),
+        'email': f'stub-{digest}@example.com',
+        'email_verified': True,
+        'name': f'Stub {digest}',
+        'given_name': 'Stub',
+        'family_name': digest,
+        'picture': f'https://example.com/{digest}.jpg',
+    }
+
+
+class GoogleStubHandler(BaseHTTPRequestHandler):
+    # Keep-alive, as Google's endpoint
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; don't hold the body back
+    # waiting for the client to acknowledge the headers
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        scheme, _, access_token = self.headers.get('Authorization', '').partition(' ')
+        if self.path.split('?')[0] != USERINFO_PATH:
+            self._respond(404, {'error': 'not_found'})
+        elif scheme != 'Bearer' or not access_token or access_token.startswith('invalid'):
+            self._respond(401, {'error': 'invalid_request', 'error_description': 'Invalid Credentials'})
+        else:
+            self._respond(200, self.server.users.get(access_token) or stub_userinfo(access_token))
+
+    def _respond(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GoogleStubServer(ThreadingHTTPServer):
+    """
+    The stub userinfo endpoint.
+
+    Args:
+        host: Interface to listen on
+        port: Port to listen on; 0 picks a free one
+        latency: Seconds each request waits before responding, to stand in for
+            the round trip to Google
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        super().__init__((host, port), GoogleStubHandler)
+        self.latency = latency
+        self.users = {}
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self._thread = None
+
+    @property
+    def userinfo_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}{USERINFO_PATH}'
+
+    def start(self):
+        """Serve from a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, name='google-stub', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,35 @@
+"""
+Password Hashers
+Argon2 with its cost set from settings.
+
+Each password login hashes once, so the Argon2 cost sets the CPU time of a login
+on the sync workers. ARGON2_TIME_COST, ARGON2_MEMORY_COST and ARGON2_PARALLELISM
+tune it for the deployment box (measure with `manage.py benchmark_password_hashing`).
+
+Changing them needs no migration: hashes made with other parameters still verify,
+and Django's check_password() rehashes a password with the current parameters on
+the user's next successful login (must_update() compares the parameters).
+"""
+
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher
+
+
+class TunableArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2PasswordHasher with its time cost, memory cost (KiB) and parallelism from
+    the ARGON2_* settings, read on each use. It keeps the 'argon2' algorithm name,
+    so it replaces Django's Argon2 hasher in PASSWORD_HASHERS.
+    """
+
+    @property
+    def time_cost(self):
+        return settings.ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.ARGON2_PARALLELISM
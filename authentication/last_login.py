@@ -0,0 +1,190 @@
+"""
+Last Login
+Buffers User.last_login updates in Redis and writes them to the database in bulk.
+
+Saving last_login on every login is a row write on the busiest table. Instead,
+record_login() notes the login time in a Redis hash, at most once per user per
+LAST_LOGIN_UPDATE_INTERVAL seconds, and flush_last_logins() writes all buffered
+times with one bulk_update(). Each gunicorn worker flushes every
+LAST_LOGIN_FLUSH_INTERVAL seconds from a background thread (see gunicorn_config.py);
+the flush_last_logins command does the same for other deployments, e.g. from cron.
+
+last_login can therefore lag a user's latest login by up to the sum of both
+intervals. bulk_update() sends no signals, so the token cache is left in place.
+
+With the django-redis cache, recording a login is one Lua script call and taking
+the buffer is atomic across workers. Other cache backends (e.g. LocMemCache in
+tests) fall back to the cache API.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections
+from django_redis import get_redis_connection
+from singletons.logger_singleton import LoggerSingleton
+
+logger = LoggerSingleton().get_logger()
+
+RECENT_KEY = 'last_login_recent:{}'
+PENDING_KEY = 'last_login_pending'
+
+# Login bookkeeping.
+# KEYS: the user's recent login marker, pending logins hash. ARGV: user id, login
+# time, update interval. Returns 1 if the login was buffered, 0 if the user's last
+# login was buffered less than the update interval ago.
+RECORD_LOGIN_SCRIPT = """
+if redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[3]) then
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+_script = None
+_flusher = None
+
+
+def _get_script():
+    """Get the registered Lua script, or None if the cache is not django-redis."""
+    global _script
+    if _script is None:
+        try:
+            _script = get_redis_connection('default').register_script(RECORD_LOGIN_SCRIPT)
+        except NotImplementedError:
+            _script = False
+    return _script or None
+
+
+def record_login(user_id, when=None):
+    """
+    Buffer a user's login time for the next flush.
+
+    Args:
+        user_id: The user's primary key
+        when: Time of the login (default: now)
+
+    Returns:
+        bool: Whether the login was buffered, rather than skipped because the
+        user's last login was buffered less than LAST_LOGIN_UPDATE_INTERVAL ago
+    """
+    timestamp = (when or datetime.now(timezone.utc)).timestamp()
+    interval = max(settings.LAST_LOGIN_UPDATE_INTERVAL, 1)
+    script = _get_script()
+    if script:
+        return bool(script(
+            keys=[cache.make_key(RECENT_KEY.format(user_id)), cache.make_key(PENDING_KEY)],
+            args=[user_id, timestamp, interval]
+        ))
+
+    if not cache.add(RECENT_KEY.format(user_id), 1, timeout=interval):
+        return False
+    pending = cache.get(PENDING_KEY, {})
+    pending[user_id] = timestamp
+    cache.set(PENDING_KEY, pending, timeout=None)
+    return True
+
+
+def _take_pending():
+    """Remove and return the buffered logins, as {user id: timestamp}."""
+    script = _get_script()
+    if script:
+        pipe = get_redis_connection('default').pipeline()
+        pipe.hgetall(cache.make_key(PENDING_KEY))
+        pipe.delete(cache.make_key(PENDING_KEY))
+        pending, _ = pipe.execute()
+        return {int(user_id): float(timestamp) for user_id, timestamp in pending.items()}
+
+    pending = cache.get(PENDING_KEY, {})
+    cache.delete(PENDING_KEY)
+    return pending
+
+
+def _restore_pending(pending):
+    """Put logins that could not be written back into the buffer, behind any newer ones."""
+    script = _get_script()
+    if script:
+        pipe = get_redis_connection('default').pipeline()
+        for user_id, timestamp in pending.items():
+            pipe.hsetnx(cache.make_key(PENDING_KEY), user_id, timestamp)
+        pipe.execute()
+        return
+
+    buffered = cache.get(PENDING_KEY, {})
+    cache.set(PENDING_KEY, {**pending, **buffered}, timeout=None)
+
+
+def flush_last_logins(batch_size=500):
+    """
+    Write the buffered login times to User.last_login.
+
+    Returns:
+        int: Number of users updated
+    """
+    pending = _take_pending()
+    if not pending:
+        return 0
+
+    users = [
+        User(pk=user_id, last_login=datetime.fromtimestamp(timestamp, timezone.utc))
+        for user_id, timestamp in pending.items()
+    ]
+    try:
+        User.objects.bulk_update(users, ['last_login'], batch_size=batch_size)
+    except Exception:
+        _restore_pending(pending)
+        raise
+    return len(users)
+
+
+class LastLoginFlusher(threading.Thread):
+    """Background thread flushing the buffered logins every interval seconds."""
+
+    def __init__(self, interval):
+        super().__init__(name='last-login-flusher', daemon=True)
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        start = time.perf_counter()
+        try:
+            updated = flush_last_logins()
+        except Exception as e:
+            logger.error("Error writing buffered last logins: %s", e)
+        else:
+            if updated:
+                logger.info(
+                    "Wrote last_login for %d users in %.1f ms", updated, (time.perf_counter() - start) * 1000
+                )
+        finally:
+            # This thread's connections are not closed at the end of a request
+            connections.close_all()
+
+    def stop(self):
+        """Stop the thread and write out the logins buffered meanwhile."""
+        self._stopped.set()
+        self.join()
+        self.flush()
+
+
+def start_flusher():
+    """Start this process' flusher thread, if it is not running."""
+    global _flusher
+    if _flusher is None:
+        _flusher = LastLoginFlusher(settings.LAST_LOGIN_FLUSH_INTERVAL)
+        _flusher.start()
+
+
+def stop_flusher():
+    """Stop this process' flusher thread, writing out the remaining buffered logins."""
+    global _flusher
+    if _flusher is not None:
+        _flusher.stop()
+        _flusher = None
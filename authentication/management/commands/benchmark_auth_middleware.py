@@ -0,0 +1,60 @@
+import time
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from authentication.middleware import AuthRateLimitMiddleware
+
+
+def _time(func, requests, repeat):
+    """Return the best time per request of repeat runs of func over requests, in microseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for request in requests:
+            func(request)
+        best = min(best, time.perf_counter() - start)
+    return best / len(requests) * 1e6
+
+
+def _legacy_route_check(request):
+    # The route check as it ran on every request before the table was precompiled
+    auth_endpoints = [
+        '/api/auth/token/', '/api/auth/token', '/api/auth/login/', '/api/auth/login',
+        '/api/auth/registration/', '/api/auth/registration', '/admin/login/', '/admin/login',
+    ]
+    return request.path in auth_endpoints and request.method == 'POST'
+
+
+class Command(BaseCommand):
+    help = 'Measure the per-request overhead of AuthRateLimitMiddleware (uses the configured cache)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help='Requests per measurement')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement; the best is reported')
+
+    def handle(self, *args, **options):
+        count, repeat = options['requests'], options['repeat']
+        response = HttpResponse()
+        middleware = AuthRateLimitMiddleware(lambda request: response)
+        factory = RequestFactory()
+
+        paths = ['/static/app.css', '/health/', '/api/posts/feed/', '/api/posts/1/']
+        passthrough = [factory.get(paths[i % len(paths)]) for i in range(count)]
+        # Spread over many IPs so that the auth requests are not rejected
+        auth = [
+            factory.post('/api/auth/login/', REMOTE_ADDR=f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}')
+            for i in range(count // 10)
+        ]
+
+        results = [
+            ('Non-auth request, route check only (old list)', _time(_legacy_route_check, passthrough, repeat)),
+            ('Non-auth request, full middleware', _time(middleware, passthrough, repeat)),
+            ('Auth POST, full middleware (rate limit check)', _time(middleware, auth, 1)),
+        ]
+
+        self.stdout.write(f'AuthRateLimitMiddleware overhead per request (best of {repeat}):')
+        for label, elapsed in results:
+            self.stdout.write(f'  {label:<50} {elapsed:9.2f} us')
+        self.stdout.write(self.style.SUCCESS(
+            f'Non-auth requests: {results[1][1]:.2f} us per request in the middleware'
+        ))
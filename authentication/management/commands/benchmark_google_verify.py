@@ -0,0 +1,83 @@
+import asyncio
+import time
+import requests
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from authentication.google_oauth import _token_cache_key, averify_access_token, verify_access_token
+from authentication.google_stub import GoogleStubServer
+
+
+def _time(func, count):
+    """Return the mean time per call of count calls of func(i), in milliseconds."""
+    start = time.perf_counter()
+    for i in range(count):
+        func(i)
+    return (time.perf_counter() - start) / count * 1000
+
+
+def _fresh_connection(i):
+    # The verification as it ran before, with a new connection per login
+    response = requests.get(
+        settings.GOOGLE_USERINFO_URL,
+        headers={'Authorization': f'Bearer benchmark-fresh-{i}'},
+        timeout=settings.GOOGLE_HTTP_TIMEOUT
+    )
+    response.raise_for_status()
+
+
+async def _verify_concurrently(count):
+    await asyncio.gather(*(averify_access_token(f'benchmark-async-{i}') for i in range(count)))
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure Google token verification: a new connection per login, the pooled client, '
+        'cached tokens and concurrent async verification (against a local stub of Google by default)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200, help='Verifications per measurement')
+        parser.add_argument('--url', help='Userinfo endpoint to use in place of a local stub')
+        parser.add_argument(
+            '--latency', type=float, default=20.0, help="Milliseconds of the local stub's round trip"
+        )
+
+    def handle(self, *args, **options):
+        count = options['logins']
+        server = None
+        url = options['url']
+        if url is None:
+            server = GoogleStubServer(latency=options['latency'] / 1000)
+            server.start()
+            url = server.userinfo_url
+        self.stdout.write(f'Verifying {count} tokens against {url}')
+
+        try:
+            with override_settings(GOOGLE_USERINFO_URL=url):
+                # Distinct tokens, so that only the cached run hits the cache
+                results = [
+                    ('New connection per login', _time(_fresh_connection, count)),
+                    ('Pooled keep-alive client', _time(lambda i: verify_access_token(f'benchmark-pooled-{i}'), count)),
+                    ('Cached token', _time(lambda i: verify_access_token(f'benchmark-pooled-{i}'), count)),
+                ]
+                start = time.perf_counter()
+                async_to_sync(_verify_concurrently)(count)
+                results.append(('Async, all concurrent', (time.perf_counter() - start) / count * 1000))
+        finally:
+            cache.delete_many([
+                _token_cache_key(f'benchmark-{kind}-{i}') for kind in ('pooled', 'async') for i in range(count)
+            ])
+            if server is not None:
+                server.stop()
+
+        self.stdout.write('Mean time per verification:')
+        for label, elapsed in results:
+            self.stdout.write(f'  {label:<30} {elapsed:9.2f} ms')
+        if server is not None:
+            self.stdout.write(f'Stub server: {server.requests} requests over {server.connections} connections')
+        self.stdout.write(self.style.SUCCESS(
+            f'Pooled client: {results[0][1] / results[1][1]:.2f}x faster than a new connection per login'
+        ))
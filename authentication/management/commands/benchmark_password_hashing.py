@@ -0,0 +1,97 @@
+import statistics
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from authentication.hashers import TunableArgon2PasswordHasher
+
+DEFAULT_MEMORY_COSTS = (19456, 47104, 65536, 102400)
+DEFAULT_TIME_COSTS = (1, 2, 3, 4)
+
+
+def _time_hash(hasher, rounds):
+    """Return the median wall and CPU time of hashing a password, in milliseconds."""
+    wall, cpu = [], []
+    for i in range(rounds):
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        hasher.encode(f'benchmark-password-{i}', hasher.salt())
+        wall.append((time.perf_counter() - start_wall) * 1000)
+        cpu.append((time.process_time() - start_cpu) * 1000)
+    return statistics.median(wall), statistics.median(cpu)
+
+
+def _measure(memory_cost, time_cost, parallelism, rounds):
+    with override_settings(
+        ARGON2_MEMORY_COST=memory_cost, ARGON2_TIME_COST=time_cost, ARGON2_PARALLELISM=parallelism
+    ):
+        return _time_hash(TunableArgon2PasswordHasher(), rounds)
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure Argon2 password hashing time on this machine and recommend the ARGON2_* settings '
+        'with the highest cost that hash within a target login time'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target-ms', type=float, default=100.0, help='Longest acceptable hash time per login, in ms'
+        )
+        parser.add_argument('--rounds', type=int, default=5, help='Hashes per measurement; the median is reported')
+        parser.add_argument(
+            '--memory-cost', type=int, action='append', dest='memory_costs',
+            help=f'Memory cost to try, in KiB, repeatable (default: {" ".join(map(str, DEFAULT_MEMORY_COSTS))})'
+        )
+        parser.add_argument(
+            '--time-cost', type=int, action='append', dest='time_costs',
+            help=f'Time cost to try, repeatable (default: {" ".join(map(str, DEFAULT_TIME_COSTS))})'
+        )
+        parser.add_argument(
+            '--parallelism', type=int, action='append', dest='parallelisms',
+            help='Parallelism to try, repeatable (default: 1 and ARGON2_PARALLELISM)'
+        )
+
+    def handle(self, *args, **options):
+        target, rounds = options['target_ms'], options['rounds']
+        if rounds < 1:
+            raise CommandError('--rounds must be at least 1')
+        memory_costs = sorted(options['memory_costs'] or DEFAULT_MEMORY_COSTS)
+        time_costs = sorted(options['time_costs'] or DEFAULT_TIME_COSTS)
+        parallelisms = sorted(set(options['parallelisms'] or (1, settings.ARGON2_PARALLELISM)))
+
+        current = (settings.ARGON2_MEMORY_COST, settings.ARGON2_TIME_COST, settings.ARGON2_PARALLELISM)
+        current_wall, current_cpu = _measure(*current, rounds)
+        self.stdout.write(
+            f'Current settings m={current[0]} t={current[1]} p={current[2]}: '
+            f'{current_wall:.1f} ms per hash ({current_cpu:.1f} ms CPU)'
+        )
+
+        self.stdout.write(f'Hash time per configuration (median of {rounds}), target {target:g} ms:')
+        within_target = []
+        for parallelism in parallelisms:
+            for memory_cost in memory_costs:
+                for time_cost in time_costs:
+                    wall, cpu = _measure(memory_cost, time_cost, parallelism, rounds)
+                    fits = wall <= target
+                    self.stdout.write(
+                        f'  m={memory_cost:<7} t={time_cost:<2} p={parallelism:<2} '
+                        f'{wall:8.1f} ms {cpu:8.1f} ms CPU{"" if fits else "  over target"}'
+                    )
+                    if not fits:
+                        # Higher time costs only take longer
+                        break
+                    within_target.append((memory_cost * time_cost, -cpu, memory_cost, time_cost, parallelism, cpu))
+
+        if not within_target:
+            raise CommandError(f'No configuration hashes within {target:g} ms; try lower costs or a higher target')
+
+        # The most memory passes within the target, then the least CPU time
+        _, _, memory_cost, time_cost, parallelism, cpu = max(within_target)
+        self.stdout.write(
+            f'Each sync worker can serve about {1000 / cpu:.0f} password logins/s '
+            f'with the recommended settings (vs. {1000 / current_cpu:.0f} with the current ones)'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Recommended: ARGON2_MEMORY_COST={memory_cost} ARGON2_TIME_COST={time_cost} '
+            f'ARGON2_PARALLELISM={parallelism}'
+        ))
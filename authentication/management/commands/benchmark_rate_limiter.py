@@ -0,0 +1,58 @@
+import statistics
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from authentication.principal import Principal
+from authentication.rate_limiter import PolicyRateThrottle, RateLimiter, RateLimitPolicy
+import authentication.rate_limiter as rate_limiter
+
+OVERHEAD_BUDGET_MS = 1.0
+
+
+class Command(BaseCommand):
+    help = 'Measure the per-request overhead of the API rate limiter against the configured cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000, help='Throttled requests to time')
+        parser.add_argument('--users', type=int, default=100, help='Distinct users the requests come from')
+        parser.add_argument('--path', default='/api/posts/feed/', help='Request path, matched against the policies')
+
+    def handle(self, *args, **options):
+        count, users, path = options['requests'], options['users'], options['path']
+        limiter = RateLimiter.from_settings()
+        # Ahead of the configured policies, a policy that never rejects, so every
+        # request takes the full (allowed) path
+        limiter.policies.insert(0, RateLimitPolicy('benchmark', r'^' + path, f'{count}/s', key='user'))
+        rate_limiter._rate_limiter = limiter
+
+        factory = APIRequestFactory()
+        requests = []
+        for i in range(users):
+            request = Request(factory.get(path))
+            request.user = User(id=i + 1, username=f'benchmark{i}')
+            request._request.principal = Principal(user_id=i + 1, role='user')
+            requests.append(request)
+
+        throttle = PolicyRateThrottle()
+        throttle.allow_request(requests[0], None)  # Registers the script
+        timings = []
+        try:
+            for i in range(count):
+                start = time.perf_counter()
+                throttle.allow_request(requests[i % users], None)
+                timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            rate_limiter._rate_limiter = None
+
+        timings.sort()
+        p50, p99 = timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+        backend = 'Redis script' if limiter._get_script() else 'cache API fallback'
+        self.stdout.write(f'Rate limiter overhead for {count} requests from {users} users ({backend}):')
+        self.stdout.write(f'  mean {statistics.fmean(timings):.3f} ms, p50 {p50:.3f} ms, p99 {p99:.3f} ms')
+
+        if p99 < OVERHEAD_BUDGET_MS:
+            self.stdout.write(self.style.SUCCESS(f'p99 overhead is within the {OVERHEAD_BUDGET_MS} ms budget'))
+        else:
+            self.stdout.write(self.style.ERROR(f'p99 overhead exceeds the {OVERHEAD_BUDGET_MS} ms budget'))
@@ -0,0 +1,61 @@
+import time
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from whitenoise.middleware import WhiteNoiseFileResponse
+from authentication.security_headers_middleware import HSTS_HEADER, REMOVED_HEADERS, SecurityHeadersMiddleware
+
+
+def _time(func, calls, repeat):
+    """Return the best time per call of repeat runs of func over calls, in microseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for request, response in calls:
+            func(request, response)
+        best = min(best, time.perf_counter() - start)
+    return best / len(calls) * 1e6
+
+
+def _legacy_add_headers(headers):
+    # The headers as they were set on every response, static files included, before the header block
+    def add_headers(request, response):
+        for name in REMOVED_HEADERS:
+            del response[name]
+        for name, value in headers.items():
+            response[name] = value
+        if request.is_secure():
+            response[HSTS_HEADER[0]] = HSTS_HEADER[1]
+        return response
+    return add_headers
+
+
+class Command(BaseCommand):
+    help = 'Measure the per-response overhead of SecurityHeadersMiddleware, for API responses and static files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--responses', type=int, default=20000, help='Responses per measurement')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement; the best is reported')
+
+    def handle(self, *args, **options):
+        count, repeat = options['responses'], options['repeat']
+        middleware = SecurityHeadersMiddleware(lambda request: HttpResponse())
+        legacy = _legacy_add_headers(middleware.default_block.headers)
+        factory = RequestFactory()
+
+        api = [(factory.get('/api/posts/feed/', secure=True), HttpResponse()) for _ in range(count)]
+        static = [(factory.get('/static/app.css', secure=True), WhiteNoiseFileResponse()) for _ in range(count)]
+
+        results = [
+            ('API response, headers set one by one (old)', _time(legacy, api, repeat)),
+            ('API response, header block', _time(middleware.add_headers, api, repeat)),
+            ('Static file, headers set one by one (old)', _time(legacy, static, repeat)),
+            ('Static file, HSTS only (block added at load)', _time(middleware.add_headers, static, repeat)),
+        ]
+
+        self.stdout.write(f'SecurityHeadersMiddleware overhead per HTTPS response (best of {repeat}):')
+        for label, elapsed in results:
+            self.stdout.write(f'  {label:<50} {elapsed:9.2f} us')
+        self.stdout.write(self.style.SUCCESS(
+            f'Static files: {results[3][1]:.2f} us per response in the middleware, vs {results[2][1]:.2f} us'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from authentication.last_login import flush_last_logins
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the last_login times buffered in Redis (authentication/last_login.py) to the database; '
+        'gunicorn workers do this on their own, run it periodically for other deployments'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Users updated per UPDATE statement')
+
+    def handle(self, *args, **options):
+        updated = flush_last_logins(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote last_login for {updated} user(s).'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from authentication.google_stub import GoogleStubServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve a local stand-in for Google's userinfo endpoint (authentication/google_stub.py); "
+        'point GOOGLE_USERINFO_URL at it'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on')
+        parser.add_argument('--port', type=int, default=8900, help='Port to listen on')
+        parser.add_argument(
+            '--latency', type=float, default=0.0, help='Milliseconds each request waits before responding'
+        )
+
+    def handle(self, *args, **options):
+        server = GoogleStubServer(options['host'], options['port'], latency=options['latency'] / 1000)
+        self.stdout.write(f'GOOGLE_USERINFO_URL={server.userinfo_url}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -1,3 +1,6 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+import re
+from django.conf import settings
 from django.http import JsonResponse
 from django.utils.decorators import method_decorator
 from django_ratelimit.decorators import ratelimit
@@ -9,56 +12,100 @@ from .progressive_rate_limit import (
     handle_failed_authentication,
     handle_successful_authentication
 )
+from connectly import metrics
 from singletons.logger_singleton import LoggerSingleton
 
 logger = LoggerSingleton().get_logger()
 
+# Authentication endpoints, used when settings.AUTH_RATE_LIMIT_PATHS is not set
+DEFAULT_AUTH_PATHS = (
+    '/api/auth/token/',          # Django token auth
+    '/api/auth/login/',          # dj-rest-auth login
+    '/api/auth/registration/',   # dj-rest-auth registration
+    '/admin/login/',             # Django admin login
+)
+
+# Units of a django-ratelimit rate period, e.g. the 'm' of '5/m' or '5/10m'
+RATE_UNITS = {'s': 'second', 'm': 'minute', 'h': 'hour', 'd': 'day'}
+
+
+def _rate_limited_view(request):
+    return None
+
+
+def describe_rate(rate):
+    """Describe a django-ratelimit rate to clients, e.g. '5/m' as 'Maximum 5 attempts per minute allowed.'"""
+    count, period = rate.split('/')
+    multiplier, unit = re.fullmatch(r'(\d*)([smhd])', period).groups()
+    if multiplier and int(multiplier) != 1:
+        period = f"{multiplier} {RATE_UNITS[unit]}s"
+    else:
+        period = RATE_UNITS[unit]
+    attempts = 'attempt' if int(count) == 1 else 'attempts'
+    return f"Maximum {count} {attempts} per {period} allowed."
+
+
 class AuthRateLimitMiddleware:
     """
     Middleware to apply rate limiting to authentication endpoints
     """
     
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        # Paths are matched without their trailing slash, so both forms are limited
+        self.auth_paths = frozenset(
+            path.rstrip('/') for path in getattr(settings, 'AUTH_RATE_LIMIT_PATHS', DEFAULT_AUTH_PATHS)
+        )
+        self.rate = getattr(settings, 'AUTH_RATE_LIMIT_RATE', '5/m')
+        self.rejection = {
+            'error': 'Rate limit exceeded. Too many authentication attempts. Please try again later.',
+            'detail': describe_rate(self.rate)
+        }
+        # Apply progressive rate limiting: 5 attempts per minute per IP by default
+        self.check_rate_limit = ratelimit(
+            group='auth_endpoints', key=get_progressive_rate_limit_key, rate=self.rate, method='POST', block=True
+        )(_rate_limited_view)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        # Check if this is an authentication endpoint
-        auth_endpoints = [
-            '/api/auth/token/',      # Django token auth
-            '/api/auth/token',       # Without trailing slash
-            '/api/auth/login/',      # dj-rest-auth login
-            '/api/auth/login',       # Without trailing slash
-            '/api/auth/registration/', # dj-rest-auth registration
-            '/api/auth/registration', # Without trailing slash
-            '/admin/login/',         # Django admin login
-            '/admin/login',          # Without trailing slash
-        ]
-
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         # Apply rate limiting to auth endpoints
-        if request.path in auth_endpoints:
-            if request.method == 'POST':
-                try:
-                    # Apply progressive rate limiting: 5 attempts per minute per IP
-                    @ratelimit(key=get_progressive_rate_limit_key, rate='5/m', method='POST', block=True)
-                    def rate_limited_view(req):
-                        return None
-    
-                    rate_limited_view(request)
-                except Ratelimited:
-                    client_ip = get_client_ip(None, request)
-                    logger.warning(f"Rate limit exceeded for admin login from IP: {client_ip}")
-                    return JsonResponse({
-                        'error': 'Rate limit exceeded. Too many authentication attempts. Please try again later.',
-                        'detail': 'Maximum 5 attempts per minute allowed.'
-                    }, status=429)
+        if self.is_auth_request(request):
+            rejection = self.rate_limit(request)
+            if rejection is not None:
+                return rejection
 
         response = self.get_response(request)
         return response
 
+    async def __acall__(self, request):
+        if self.is_auth_request(request):
+            # The rate limit check uses the sync cache API
+            rejection = await sync_to_async(self.rate_limit)(request)
+            if rejection is not None:
+                return rejection
+        return await self.get_response(request)
+
+    def is_auth_request(self, request):
+        return request.method == 'POST' and request.path.rstrip('/') in self.auth_paths
+
+    def rate_limit(self, request):
+        """Count an auth request, returning the 429 response if it is over the limit."""
+        try:
+            self.check_rate_limit(request)
+        except Ratelimited:
+            metrics.record_rate_limit_rejection('auth', 'auth_endpoints')
+            client_ip = get_client_ip(None, request)
+            logger.warning("Rate limit exceeded for admin login from IP: %s", client_ip)
+            return JsonResponse(self.rejection, status=429)
+        return None
+
     def process_exception(self, request, exception):
         if isinstance(exception, Ratelimited):
-            return JsonResponse({
-                'error': 'Rate limit exceeded. Too many authentication attempts. Please try again later.',
-                'detail': 'Maximum 5 attempts per minute allowed.'
-            }, status=429)
+            return JsonResponse(self.rejection, status=429)
         return None
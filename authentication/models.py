@@ -1,7 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from allauth.socialaccount.models import SocialAccount
+from .google_oauth import invalidate_account
+from .token_cache import invalidate_token, invalidate_user
 
 class UserProfile(models.Model):
     """Extended user profile with additional fields"""
@@ -29,7 +33,30 @@ def create_user_profile(sender, instance, created, **kwargs):
             UserProfile.objects.create(user=instance, role='user')
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    # Check if profile exists before saving
-    if hasattr(instance, 'profile'):
+def save_user_profile(sender, instance, created, **kwargs):
+    # Check if profile exists before saving; a new user's was just created
+    if not created and hasattr(instance, 'profile'):
         instance.profile.save()
+
+# Signals to keep the token cache (see token_cache.py) in sync
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+    # Lets the user's next token be cached
+    invalidate_user(instance.user_id)
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_user(instance.pk)
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_profile_tokens(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_user(instance.user_id)
+
+# Signal to keep the Google account cache (see google_oauth.py) in sync
+@receiver([post_save, post_delete], sender=SocialAccount)
+def invalidate_google_account(sender, instance, created=False, **kwargs):
+    if instance.provider == 'google' and not created:
+        invalidate_account(instance.uid)
@@ -0,0 +1,158 @@
+"""
+Request Principal
+Resolves who is making a request (user id, role, staff flag) once per request,
+so permission classes and views never fetch the profile again.
+
+Provides:
+- Principal: the resolved identity of a request
+- PrincipalTokenAuthentication: TokenAuthentication that loads the user's
+  profile in the same query as the token and attaches the principal
+- CachedTokenAuthentication: PrincipalTokenAuthentication that resolves tokens
+  from the token cache (see token_cache.py), without a database round trip
+- get_principal: the principal for a request, resolved on first use
+"""
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from . import token_cache
+from .models import UserProfile
+
+
+class Principal:
+    """
+    Identity of the user making a request, as needed by permission checks.
+    Compare ownership with obj.author_id / obj.user_id against user_id, so that
+    checking a permission never loads the related user.
+    """
+    __slots__ = ('user_id', 'role', 'is_staff')
+
+    def __init__(self, user_id=None, role=None, is_staff=False):
+        self.user_id = user_id
+        self.role = role
+        self.is_staff = is_staff
+
+    @classmethod
+    def for_user(cls, user):
+        """Build the principal for a user, reading the profile at most once."""
+        if user is None or not user.is_authenticated:
+            return ANONYMOUS
+        role = user.profile.role if hasattr(user, 'profile') else None
+        return cls(user_id=user.pk, role=role, is_staff=user.is_staff)
+
+    @property
+    def is_authenticated(self):
+        return self.user_id is not None
+
+    @property
+    def is_admin(self):
+        return self.is_staff or self.role == 'admin'
+
+    @property
+    def is_guest(self):
+        return self.role == 'guest'
+
+    def owns(self, obj):
+        """Return True if obj is authored by, or belongs to, this principal."""
+        if not self.is_authenticated:
+            return False
+        if hasattr(obj, 'author_id'):
+            return obj.author_id == self.user_id
+        if hasattr(obj, 'user_id'):
+            return obj.user_id == self.user_id
+        return False
+
+    def __repr__(self):
+        return f"Principal(user_id={self.user_id}, role={self.role}, is_staff={self.is_staff})"
+
+
+ANONYMOUS = Principal()
+
+
+def get_principal(request):
+    """
+    Get the principal for a request, resolving it on first use.
+
+    Args:
+        request: A DRF Request or a Django HttpRequest
+
+    Returns:
+        Principal: Cached on the underlying HttpRequest for the rest of the request
+    """
+    http_request = getattr(request, '_request', request)
+    user = getattr(request, 'user', None)
+    user_id = user.pk if user is not None and user.is_authenticated else None
+
+    principal = getattr(http_request, 'principal', None)
+    # Re-resolve if the user changed since, e.g. after a login within the request
+    if principal is None or principal.user_id != user_id:
+        principal = Principal.for_user(user)
+        http_request.principal = principal
+    return principal
+
+
+class PrincipalTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that fetches the user's profile together with the
+    token and resolves the request principal right away.
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            getattr(request, '_request', request).principal = Principal.for_user(result[0])
+        return result
+
+    def authenticate_credentials(self, key):
+        model = self.get_model()
+        try:
+            token = model.objects.select_related('user__profile').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (token.user, token)
+
+
+class CachedTokenAuthentication(PrincipalTokenAuthentication):
+    """
+    Token authentication backed by the token cache. On a hit, the user and its
+    profile are rebuilt from the cached snapshot without touching the database.
+    Fields missing from the snapshot (password, last_login, date_joined) are
+    deferred: they are loaded on first access and left alone by save().
+    """
+
+    def authenticate_credentials(self, key):
+        snapshot = token_cache.get_user_snapshot(key)
+        if snapshot is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set_user_snapshot(key, token_cache.snapshot_user(user))
+            return (user, token)
+
+        user = self._user_from_snapshot(snapshot)
+        token = Token.from_db(DEFAULT_DB_ALIAS, ['key', 'user_id'], [key, user.pk])
+        token.user = user
+        return (user, token)
+
+    def _user_from_snapshot(self, snapshot):
+        field_names = [
+            field.attname for field in User._meta.concrete_fields
+            if field.attname in token_cache.USER_SNAPSHOT_FIELDS
+        ]
+        user = User.from_db(DEFAULT_DB_ALIAS, field_names, [snapshot[name] for name in field_names])
+
+        profile = None
+        if snapshot['profile_id'] is not None:
+            profile = UserProfile.from_db(
+                DEFAULT_DB_ALIAS, ['id', 'user_id', 'role'],
+                [snapshot['profile_id'], user.pk, snapshot['role']]
+            )
+            profile.user = user
+        # Cache the reverse relation, so that user.profile never queries
+        User.profile.related.set_cached_value(user, profile)
+        return user
@@ -1,16 +1,48 @@
 """
 Progressive Rate Limiting with Exponential Backoff
 Implements progressive delays for repeated failed authentication attempts
+
+With the django-redis cache, every decision runs as one Lua script on the Redis
+server: atomic across gunicorn workers and one network round trip per call.
+Other cache backends (e.g. LocMemCache in tests) fall back to the cache API.
 """
 
 import time
+import zlib
 from django.core.cache import cache
 from django.conf import settings
+from django_redis import get_redis_connection
+from connectly import metrics
 from .rate_limit_utils import get_client_ip
 from singletons.logger_singleton import LoggerSingleton
 
 logger = LoggerSingleton().get_logger()
 
+# Lockout check for the rate limit key function.
+# KEYS: lockout key, failed attempts key. ARGV: lockout threshold, lockout duration.
+# Returns {is_locked_out, failed_attempts, lockout_applied}, applying the lockout once
+# the failed attempts exceed the threshold.
+CHECK_LOCKOUT_SCRIPT = """
+local failed_attempts = tonumber(redis.call('GET', KEYS[2]) or '0') or 0
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return {1, failed_attempts, 0}
+end
+if failed_attempts > tonumber(ARGV[1]) then
+    redis.call('SET', KEYS[1], '1', 'EX', ARGV[2])
+    return {1, failed_attempts, 1}
+end
+return {0, failed_attempts, 0}
+"""
+
+# Failed attempt bookkeeping.
+# KEYS: lockout key, failed attempts key. ARGV: counter timeout.
+# Returns {failed_attempts, is_locked_out} after incrementing the counter.
+RECORD_FAILURE_SCRIPT = """
+local failed_attempts = redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return {failed_attempts, redis.call('EXISTS', KEYS[1])}
+"""
+
 class ProgressiveRateLimit:
     """
     Implements progressive rate limiting with exponential backoff
@@ -20,8 +52,37 @@ class ProgressiveRateLimit:
     def __init__(self):
         self.base_rate = '5/m'  # Base rate limit
         self.max_delay = 300  # Maximum delay in seconds (5 minutes)
+        self.free_attempts = 5  # Failed attempts before delays start
+        self.lockout_threshold = 10  # Failed attempts before a lockout
+        self.lockout_duration = 300  # Lockout length in seconds
+        self.failed_attempts_timeout = 3600  # Kept for 1 hour to allow gradual decay
         self.failed_attempts_key = 'failed_auth_attempts:{}'
         self.lockout_key = 'auth_lockout:{}'
+        self._scripts = None
+    
+    def _get_scripts(self):
+        """
+        Get the registered Lua scripts, or None if the cache is not django-redis.
+        Scripts are sent with EVALSHA, falling back to EVAL after a Redis restart.
+        """
+        if self._scripts is None:
+            try:
+                client = get_redis_connection('default')
+            except NotImplementedError:
+                self._scripts = False
+            else:
+                self._scripts = {
+                    'check_lockout': client.register_script(CHECK_LOCKOUT_SCRIPT),
+                    'record_failure': client.register_script(RECORD_FAILURE_SCRIPT),
+                }
+        return self._scripts or None
+    
+    def _redis_keys(self, ip_address):
+        # The same keys the cache API uses, so both paths share state
+        return [
+            cache.make_key(self.lockout_key.format(ip_address)),
+            cache.make_key(self.failed_attempts_key.format(ip_address)),
+        ]
     
     def get_failed_attempts_count(self, ip_address):
         """Get the number of failed authentication attempts for an IP"""
@@ -29,66 +90,112 @@ class ProgressiveRateLimit:
         return cache.get(key, 0)
     
     def increment_failed_attempts(self, ip_address):
-        """Increment failed authentication attempts counter"""
-        key = self.failed_attempts_key.format(ip_address)
-        current_count = cache.get(key, 0)
-        new_count = current_count + 1
-        
-        # Store for 1 hour to allow gradual decay
-        cache.set(key, new_count, timeout=3600)
+        """
+        Increment failed authentication attempts counter
+        Returns (new count, whether the IP is locked out) from a single atomic operation
+        """
+        scripts = self._get_scripts()
+        if scripts:
+            new_count, is_locked = scripts['record_failure'](
+                keys=self._redis_keys(ip_address), args=[self.failed_attempts_timeout]
+            )
+        else:
+            key = self.failed_attempts_key.format(ip_address)
+            cache.add(key, 0, timeout=self.failed_attempts_timeout)
+            try:
+                new_count = cache.incr(key)
+            except ValueError:
+                # Expired between add() and incr()
+                cache.set(key, 1, timeout=self.failed_attempts_timeout)
+                new_count = 1
+            cache.touch(key, self.failed_attempts_timeout)
+            is_locked = self.is_locked_out(ip_address)
         
-        logger.warning(f"Failed authentication attempt #{new_count} from IP: {ip_address}")
-        return new_count
+        logger.warning("Failed authentication attempt #%s from IP: %s", new_count, ip_address)
+        metrics.record_auth_failure()
+        return new_count, bool(is_locked)
     
     def reset_failed_attempts(self, ip_address):
         """Reset failed authentication attempts counter (on successful auth)"""
         key = self.failed_attempts_key.format(ip_address)
         cache.delete(key)
-        logger.info(f"Reset failed authentication attempts for IP: {ip_address}")
+        logger.info("Reset failed authentication attempts for IP: %s", ip_address)
     
-    def calculate_delay(self, failed_attempts):
+    def calculate_delay(self, failed_attempts, ip_address=''):
         """
         Calculate progressive delay based on failed attempts
         Uses exponential backoff with jitter
         """
-        if failed_attempts <= 5:
+        if failed_attempts <= self.free_attempts:
             return 0  # No delay for first 5 attempts
         
         # Exponential backoff: 2^(n-5) seconds, capped at max_delay
-        delay = min(2 ** (failed_attempts - 5), self.max_delay)
+        delay = min(2 ** (failed_attempts - self.free_attempts), self.max_delay)
         
-        # Add jitter (±20%) to prevent synchronized retries
+        # Add jitter (±20%) to prevent synchronized retries. Seeded with crc32 rather
+        # than hash(), which differs between worker processes.
         jitter = delay * 0.2
-        delay_with_jitter = delay + (jitter * (2 * (hash(ip_address) % 100) / 100 - 1))
+        delay_with_jitter = delay + (jitter * (2 * (zlib.crc32(ip_address.encode()) % 100) / 100 - 1))
         
         return int(delay_with_jitter)
     
     def is_locked_out(self, ip_address):
         """Check if IP is currently locked out"""
         lockout_key = self.lockout_key.format(ip_address)
-        return cache.get(lockout_key, False)
+        return bool(cache.get(lockout_key, False))
     
     def apply_lockout(self, ip_address, duration):
         """Apply temporary lockout to an IP"""
         lockout_key = self.lockout_key.format(ip_address)
         cache.set(lockout_key, True, timeout=duration)
-        logger.warning(f"Applied {duration}s lockout for IP: {ip_address}")
+        logger.warning("Applied %ss lockout for IP: %s", duration, ip_address)
     
-    def get_rate_limit_info(self, ip_address):
+    def check_lockout(self, ip_address):
         """
-        Get current rate limiting status for an IP
-        Returns dict with rate limit information
+        Check whether an IP is locked out, locking it out once its failed attempts
+        exceed the lockout threshold
+        Returns (is_locked_out, failed attempts) from a single atomic operation
         """
+        scripts = self._get_scripts()
+        if scripts:
+            is_locked, failed_attempts, lockout_applied = scripts['check_lockout'](
+                keys=self._redis_keys(ip_address),
+                args=[self.lockout_threshold, self.lockout_duration],
+            )
+            if lockout_applied:
+                logger.warning("Applied %ss lockout for IP: %s", self.lockout_duration, ip_address)
+                metrics.record_auth_lockout()
+            return bool(is_locked), failed_attempts
+        
+        if self.is_locked_out(ip_address):
+            return True, self.get_failed_attempts_count(ip_address)
         failed_attempts = self.get_failed_attempts_count(ip_address)
-        current_delay = self.calculate_delay(failed_attempts)
-        is_locked = self.is_locked_out(ip_address)
+        if failed_attempts > self.lockout_threshold:
+            self.apply_lockout(ip_address, self.lockout_duration)
+            metrics.record_auth_lockout()
+            return True, failed_attempts
+        return False, failed_attempts
+    
+    def get_rate_limit_info(self, ip_address, failed_attempts=None, is_locked=None):
+        """
+        Get current rate limiting status for an IP
+        Returns dict with rate limit information. Pass failed_attempts and
+        is_locked when already known to skip reading them from the cache.
+        """
+        if failed_attempts is None or is_locked is None:
+            values = cache.get_many([
+                self.failed_attempts_key.format(ip_address), self.lockout_key.format(ip_address)
+            ])
+            failed_attempts = values.get(self.failed_attempts_key.format(ip_address), 0)
+            is_locked = bool(values.get(self.lockout_key.format(ip_address), False))
+        current_delay = self.calculate_delay(failed_attempts, ip_address)
         
         return {
             'ip_address': ip_address,
             'failed_attempts': failed_attempts,
             'current_delay': current_delay,
             'is_locked_out': is_locked,
-            'remaining_attempts': max(0, 5 - failed_attempts),
+            'remaining_attempts': max(0, self.free_attempts - failed_attempts),
             'suggested_retry_after': current_delay if is_locked else 0
         }
 
@@ -103,19 +210,14 @@ def get_progressive_rate_limit_key(group, request):
     """
     ip_address = get_client_ip(group, request)
     
-    # Check if IP is locked out
-    if progressive_rate_limit.is_locked_out(ip_address):
+    # Check for (and apply) a lockout and read the failed attempts in one round trip.
+    # After 10 failed attempts the IP gets a 5-minute lockout.
+    is_locked, failed_attempts = progressive_rate_limit.check_lockout(ip_address)
+    if is_locked:
         return f"locked_out:{ip_address}"
     
-    # Get failed attempts count
-    failed_attempts = progressive_rate_limit.get_failed_attempts_count(ip_address)
-    
     # Apply progressive rate limiting
-    if failed_attempts > 10:
-        # After 10 failed attempts, apply 5-minute lockout
-        progressive_rate_limit.apply_lockout(ip_address, 300)
-        return f"locked_out:{ip_address}"
-    elif failed_attempts > 5:
+    if failed_attempts > progressive_rate_limit.free_attempts:
         # After 5 failed attempts, reduce rate limit
         return f"progressive:{ip_address}:{failed_attempts}"
     
@@ -130,21 +232,21 @@ def handle_failed_authentication(request, endpoint_name):
     ip_address = get_client_ip(None, request)
     
     # Increment failed attempts counter
-    failed_attempts = progressive_rate_limit.increment_failed_attempts(ip_address)
+    failed_attempts, is_locked = progressive_rate_limit.increment_failed_attempts(ip_address)
     
     # Calculate current delay
-    current_delay = progressive_rate_limit.calculate_delay(failed_attempts)
+    current_delay = progressive_rate_limit.calculate_delay(failed_attempts, ip_address)
     
     logger.warning(
-        f"Failed authentication on {endpoint_name} from IP: {ip_address}. "
-        f"Attempt #{failed_attempts}, current delay: {current_delay}s"
+        "Failed authentication on %s from IP: %s. Attempt #%s, current delay: %ss",
+        endpoint_name, ip_address, failed_attempts, current_delay
     )
     
     # Return rate limit information
     return {
         'error': 'Authentication failed',
         'detail': 'Invalid credentials provided',
-        'rate_limit_info': progressive_rate_limit.get_rate_limit_info(ip_address)
+        'rate_limit_info': progressive_rate_limit.get_rate_limit_info(ip_address, failed_attempts, is_locked)
     }
 
 
@@ -154,4 +256,4 @@ def handle_successful_authentication(request):
     """
     ip_address = get_client_ip(None, request)
     progressive_rate_limit.reset_failed_attempts(ip_address)
-    logger.info(f"Successful authentication from IP: {ip_address}, resetting failed attempts counter")
+    logger.info("Successful authentication from IP: %s, resetting failed attempts counter", ip_address)
@@ -0,0 +1,143 @@
+"""
+Query Budget Guard
+Catches N+1 query regressions before they reach production.
+
+Provides:
+- QueryBudgetMiddleware: dev-mode middleware that logs any request running more
+  database queries than QUERY_BUDGET_MAX_QUERIES
+- aexecute_wrapper: async counterpart of connection.execute_wrapper()
+- QueryBudgetAssertionsMixin: test helpers asserting that an endpoint stays within
+  a query budget and that its query count does not grow with page size
+"""
+
+from contextlib import asynccontextmanager, contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from singletons.logger_singleton import LoggerSingleton
+
+logger = LoggerSingleton().get_logger()
+
+
+class QueryCounter:
+    """
+    Database execute wrapper that counts the queries run on a connection.
+    Unlike CaptureQueriesContext it works with DEBUG=False.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _add_execute_wrapper(wrapper):
+    connection.execute_wrappers.append(wrapper)
+
+
+def _remove_execute_wrapper(wrapper):
+    connection.execute_wrappers.remove(wrapper)
+
+
+@asynccontextmanager
+async def aexecute_wrapper(wrapper):
+    """
+    Async counterpart of connection.execute_wrapper(). The async ORM runs queries
+    in the request's sync thread, on that thread's connection rather than the one
+    seen from async code, so the wrapper is installed (and removed) there.
+    """
+    await sync_to_async(_add_execute_wrapper)(wrapper)
+    try:
+        yield
+    finally:
+        await sync_to_async(_remove_execute_wrapper)(wrapper)
+
+
+class QueryBudgetMiddleware:
+    """
+    Middleware to log requests that exceed the configured query budget.
+    Only active when QUERY_BUDGET_ENABLED is set (defaults to DEBUG), so
+    production requests pay nothing for it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.max_queries = getattr(settings, 'QUERY_BUDGET_MAX_QUERIES', 20)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        self.check_budget(request, counter)
+        return response
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        async with aexecute_wrapper(counter):
+            response = await self.get_response(request)
+        self.check_budget(request, counter)
+        return response
+
+    def check_budget(self, request, counter):
+        if counter.count > self.max_queries:
+            logger.warning(
+                "Query budget exceeded: %s %s ran %s queries (budget %s)",
+                request.method, request.path, counter.count, self.max_queries
+            )
+
+
+class QueryBudgetAssertionsMixin:
+    """
+    Mixin for TestCase classes that adds query budget assertions.
+    """
+
+    def count_queries(self, func, *args, **kwargs):
+        """
+        Call func and count the queries it runs.
+
+        Returns:
+            tuple: (result of func, list of captured queries)
+        """
+        with CaptureQueriesContext(connection) as context:
+            result = func(*args, **kwargs)
+        return result, context.captured_queries
+
+    @contextmanager
+    def assertMaxQueries(self, max_queries):
+        """Assert that the wrapped block runs at most max_queries queries."""
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > max_queries:
+            queries = '\n'.join(
+                f"{i}. {query['sql']}" for i, query in enumerate(context.captured_queries, start=1)
+            )
+            self.fail(f"{executed} queries executed, budget is {max_queries}\n{queries}")
+
+    def assertQueryCountConstant(self, make_request, sizes=(5, 50)):
+        """
+        Assert that make_request(size) runs the same number of queries for
+        every page size in sizes, i.e. there is no per-row query.
+        """
+        counts = {}
+        for size in sizes:
+            response, queries = self.count_queries(make_request, size)
+            self.assertLess(response.status_code, 400, f"page_size={size} returned {response.status_code}")
+            counts[size] = len(queries)
+        self.assertEqual(
+            len(set(counts.values())), 1,
+            f"Query count grows with page size: {counts}"
+        )
+        return counts
@@ -0,0 +1,248 @@
+"""
+API Rate Limiter
+GCRA (generic cell rate algorithm) rate limiting for API routes, with policies
+declared in settings.RATE_LIMIT_POLICIES.
+
+GCRA is a token bucket kept as a single timestamp per client, the theoretical
+arrival time (TAT) of its next request: a policy of `rate` requests per period
+admits a steady `rate` per period, plus bursts of up to `burst` requests, with
+no 2x burst at window boundaries. With the django-redis cache each check is one
+Lua script call (read, decide, write) and so atomic across workers. Other cache
+backends (e.g. LocMemCache in tests) run the same algorithm through the cache
+API, which is not atomic. Requests are let through while Redis is unreachable.
+
+Provides:
+- PolicyRateThrottle: DRF throttle applying the policy matching a request
+- RateLimitHeadersMiddleware: adds RateLimit-* and Retry-After headers
+- get_rate_limiter: the RateLimiter built from settings
+"""
+
+import math
+import re
+import time
+from collections import namedtuple
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django_redis import get_redis_connection
+from rest_framework.throttling import BaseThrottle
+from connectly import metrics
+from singletons.logger_singleton import LoggerSingleton
+from .principal import get_principal
+from .rate_limit_utils import get_client_ip
+from .token_cache import REDIS_ERRORS
+
+logger = LoggerSingleton().get_logger()
+
+RATE_LIMIT_KEY = 'api_rate_limit:{}:{}'
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# GCRA check. KEYS: TAT key. ARGV: now, emission interval, burst tolerance (seconds).
+# Returns {allowed, remaining, retry_after_ms, reset_ms}.
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local tolerance = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or ARGV[1])
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval
+local allow_at = new_tat - tolerance
+if now < allow_at then
+    return {0, 0, math.ceil((allow_at - now) * 1000), math.ceil((tat - now) * 1000)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+local remaining = math.floor((tolerance - (new_tat - now)) / interval + 1e-9)
+return {1, remaining, 0, math.ceil((new_tat - now) * 1000)}
+"""
+
+RateLimitResult = namedtuple('RateLimitResult', 'policy allowed remaining retry_after reset')
+
+
+def parse_rate(rate):
+    """
+    Parse a rate like '60/m' or '1000/h'.
+
+    Returns:
+        tuple: (number of requests, period in seconds)
+    """
+    count, _, period = rate.partition('/')
+    return int(count), PERIODS[period[0]]
+
+
+class RateLimitPolicy:
+    """A rate limit applied to the requests matching a path pattern and methods."""
+
+    def __init__(self, name, path, rate, burst=None, methods=None, key='user'):
+        if key not in ('user', 'ip'):
+            raise ValueError(f"Rate limit policy {name}: key must be 'user' or 'ip', not {key!r}")
+        self.name = name
+        self.pattern = re.compile(path)
+        self.methods = frozenset(method.upper() for method in methods) if methods else None
+        self.limit, self.period = parse_rate(rate)
+        self.burst = burst or self.limit
+        self.key = key
+        # Requests are spaced by interval; tolerance lets burst of them arrive at once
+        self.interval = self.period / self.limit
+        self.tolerance = self.interval * self.burst
+
+    def matches(self, path, method):
+        if self.methods is not None and method not in self.methods:
+            return False
+        return self.pattern.match(path) is not None
+
+    def __repr__(self):
+        return f"RateLimitPolicy({self.name}: {self.limit}/{self.period}s, burst {self.burst}, per {self.key})"
+
+
+class RateLimiter:
+    """Applies the first matching policy of an ordered list to requests."""
+
+    def __init__(self, policies):
+        self.policies = policies
+        self._script = None
+
+    @classmethod
+    def from_settings(cls):
+        return cls([
+            RateLimitPolicy(name, **config)
+            for name, config in getattr(settings, 'RATE_LIMIT_POLICIES', {}).items()
+        ])
+
+    def policy_for(self, path, method):
+        for policy in self.policies:
+            if policy.matches(path, method):
+                return policy
+        return None
+
+    def _get_script(self):
+        # None until first use, False when the cache is not django-redis
+        if self._script is None:
+            try:
+                self._script = get_redis_connection('default').register_script(GCRA_SCRIPT)
+            except NotImplementedError:
+                self._script = False
+        return self._script or None
+
+    def hit(self, policy, identity, now=None):
+        """
+        Count a request from identity against policy.
+
+        Returns:
+            RateLimitResult: Whether the request is allowed, the requests remaining,
+            and the seconds until a retry is allowed and until the bucket is full
+        """
+        now = time.time() if now is None else now
+        key = RATE_LIMIT_KEY.format(policy.name, identity)
+        script = self._get_script()
+        if script:
+            allowed, remaining, retry_after_ms, reset_ms = script(
+                keys=[cache.make_key(key)], args=[now, policy.interval, policy.tolerance]
+            )
+        else:
+            allowed, remaining, retry_after_ms, reset_ms = self._hit_cache(policy, key, now)
+        return RateLimitResult(
+            policy, bool(allowed), remaining, math.ceil(retry_after_ms / 1000), math.ceil(reset_ms / 1000)
+        )
+
+    def _hit_cache(self, policy, key, now):
+        """GCRA_SCRIPT on the cache API, for cache backends without scripting."""
+        tat = max(cache.get(key, now), now)
+        new_tat = tat + policy.interval
+        allow_at = new_tat - policy.tolerance
+        if now < allow_at:
+            return 0, 0, math.ceil((allow_at - now) * 1000), math.ceil((tat - now) * 1000)
+        cache.set(key, new_tat, timeout=math.ceil(new_tat - now))
+        remaining = math.floor((policy.tolerance - (new_tat - now)) / policy.interval + 1e-9)
+        return 1, remaining, 0, math.ceil((new_tat - now) * 1000)
+
+
+_rate_limiter = None
+
+
+def get_rate_limiter():
+    """Get the RateLimiter for settings.RATE_LIMIT_POLICIES, built on first use."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter.from_settings()
+    return _rate_limiter
+
+
+@receiver(setting_changed)
+def _reset_rate_limiter(setting, **kwargs):
+    global _rate_limiter
+    if setting in ('RATE_LIMIT_POLICIES', 'CACHES'):
+        _rate_limiter = None
+
+
+class PolicyRateThrottle(BaseThrottle):
+    """
+    Throttle requests by the first policy in settings.RATE_LIMIT_POLICIES matching
+    their path and method. Runs after authentication, so 'user' policies count
+    authenticated users by id and anonymous users by IP.
+    """
+
+    def allow_request(self, request, view):
+        self.result = None
+        if not getattr(settings, 'RATE_LIMIT_ENABLED', True):
+            return True
+
+        limiter = get_rate_limiter()
+        policy = limiter.policy_for(request.path_info, request.method)
+        if policy is None:
+            return True
+
+        user_id = get_principal(request).user_id if policy.key == 'user' else None
+        identity = f'user:{user_id}' if user_id is not None else f'ip:{get_client_ip(None, request)}'
+        try:
+            self.result = limiter.hit(policy, identity)
+        except REDIS_ERRORS as e:
+            # Fail open rather than take the API down with Redis
+            logger.warning("Rate limiter unavailable, not limiting %s: %s", policy.name, e)
+            return True
+        # Picked up by RateLimitHeadersMiddleware
+        getattr(request, '_request', request).rate_limit = self.result
+        if not self.result.allowed:
+            metrics.record_rate_limit_rejection('api', policy.name)
+        return self.result.allowed
+
+    def wait(self):
+        return self.result.retry_after if self.result else None
+
+
+class RateLimitHeadersMiddleware:
+    """
+    Add RateLimit-Limit, RateLimit-Remaining, RateLimit-Reset and RateLimit-Policy
+    headers to rate limited responses, and Retry-After to rejected ones.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.add_headers(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.add_headers(request, await self.get_response(request))
+
+    def add_headers(self, request, response):
+        result = getattr(request, 'rate_limit', None)
+        if result is not None:
+            policy = result.policy
+            response.headers['RateLimit-Limit'] = str(policy.burst)
+            response.headers['RateLimit-Remaining'] = str(result.remaining)
+            response.headers['RateLimit-Reset'] = str(result.reset)
+            response.headers['RateLimit-Policy'] = f'{policy.limit};w={policy.period};burst={policy.burst}'
+            if not result.allowed and 'Retry-After' not in response.headers:
+                response.headers['Retry-After'] = str(result.retry_after)
+        return response
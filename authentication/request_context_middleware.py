@@ -0,0 +1,110 @@
+"""
+Request Context Middleware
+Adds the context of the current request to every log record made while handling it,
+and logs one record per request with its status, duration and query count.
+
+Each record gets request_id, method, route, user_id, status (once known), duration_ms
+and db_queries (so far). The request id is taken from the X-Request-ID header when it
+is well formed, generated otherwise, and returned in the X-Request-ID response header.
+"""
+
+import re
+import time
+import uuid
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connection
+from django.utils.functional import LazyObject, empty
+from singletons.logger_singleton import LoggerSingleton, log_context
+from .query_budget import QueryCounter, aexecute_wrapper
+
+logger = LoggerSingleton().get_logger()
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class RequestLogContext:
+    """The log context of a request, see singletons.logger_singleton.log_context."""
+    __slots__ = ('request', 'request_id', 'started', 'queries', 'status')
+
+    def __init__(self, request, request_id):
+        self.request = request
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.queries = QueryCounter()
+        self.status = None
+
+    def user_id(self):
+        # Only users already resolved, so that logging never authenticates the request
+        principal = getattr(self.request, 'principal', None)
+        if principal is not None:
+            return principal.user_id
+        # A LazyObject until resolved, then (or once DRF authenticates) the user itself
+        user = getattr(self.request, 'user', None)
+        if isinstance(user, LazyObject):
+            user = None if user._wrapped is empty else user._wrapped
+        return user.pk if user is not None and user.is_authenticated else None
+
+    def fields(self):
+        match = self.request.resolver_match
+        return {
+            'request_id': self.request_id,
+            'method': self.request.method,
+            'route': match.route if match is not None else self.request.path_info,
+            'user_id': self.user_id(),
+            'status': self.status,
+            'duration_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'db_queries': self.queries.count,
+        }
+
+
+class RequestContextMiddleware:
+    """
+    Middleware setting the log context for each request. Place it first, so that
+    duration_ms and db_queries cover the whole middleware chain.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        context = self.start(request)
+        token = log_context.set(context)
+        try:
+            with connection.execute_wrapper(context.queries):
+                response = self.get_response(request)
+            return self.finish(request, response, context)
+        finally:
+            log_context.reset(token)
+
+    async def __acall__(self, request):
+        context = self.start(request)
+        token = log_context.set(context)
+        try:
+            async with aexecute_wrapper(context.queries):
+                response = await self.get_response(request)
+            return self.finish(request, response, context)
+        finally:
+            log_context.reset(token)
+
+    def start(self, request):
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        if not _REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+        return RequestLogContext(request, request_id)
+
+    def finish(self, request, response, context):
+        context.status = response.status_code
+        response[REQUEST_ID_HEADER] = context.request_id
+        logger.info(
+            '%s %s %s', request.method, request.path, response.status_code,
+            extra={'event': 'request_finished', **context.fields()}
+        )
+        return response
@@ -0,0 +1,202 @@
+"""
+Server Timing
+Breaks the time spent on each request down into database, cache and serializer time.
+
+Provides:
+- ServerTimingMiddleware: times each request, keeps per-route histograms and, when
+  SERVER_TIMING_HEADER is set, reports the breakdown in a Server-Timing header
+- timed: context manager adding the time of a block to the current request
+- TimedRedisClient: django-redis client class timing cache calls
+- route_histograms: the per-route duration histograms of this process
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django_redis.client import DefaultClient
+from connectly import metrics
+from .query_budget import aexecute_wrapper
+
+# Histogram bucket upper bounds in milliseconds; durations above the last one are counted separately
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Route label for requests that did not resolve to a view, e.g. 404s and static files
+UNMATCHED_ROUTE = 'unmatched'
+
+_current_timings = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Durations (in seconds) and counts of the timed operations of one request."""
+    __slots__ = ('started', 'durations', 'counts', '_running')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = {}
+        self.counts = {}
+        self._running = set()
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def __call__(self, execute, sql, params, many, context):
+        # Database execute wrapper
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('db', time.perf_counter() - start)
+
+    def milliseconds(self):
+        """Durations in milliseconds, with the total so far under 'total'."""
+        durations = {name: seconds * 1000 for name, seconds in self.durations.items()}
+        durations['total'] = (time.perf_counter() - self.started) * 1000
+        return durations
+
+    def header(self):
+        """The Server-Timing header value."""
+        entries = []
+        for name, duration in self.milliseconds().items():
+            count = self.counts.get(name)
+            description = f';desc="{count} calls"' if count else ''
+            entries.append(f'{name};dur={duration:.1f}{description}')
+        return ', '.join(entries)
+
+
+@contextmanager
+def timed(name):
+    """
+    Add the time spent in the block to the current request's timings under name.
+    Does nothing outside a request, and inside another block timed under the same
+    name, so that nested calls are not counted twice.
+    """
+    timings = _current_timings.get()
+    if timings is None or name in timings._running:
+        yield
+        return
+    timings._running.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings._running.discard(name)
+        timings.add(name, time.perf_counter() - start)
+
+
+def _timed_cache_call(method):
+    def timed_method(self, *args, **kwargs):
+        with timed('cache'):
+            return method(self, *args, **kwargs)
+    timed_method.__name__ = method.__name__
+    timed_method.__doc__ = method.__doc__
+    return timed_method
+
+
+class TimedRedisClient(DefaultClient):
+    """django-redis client adding the time of cache calls to the request timings."""
+    get = _timed_cache_call(DefaultClient.get)
+    get_many = _timed_cache_call(DefaultClient.get_many)
+    set = _timed_cache_call(DefaultClient.set)
+    set_many = _timed_cache_call(DefaultClient.set_many)
+    add = _timed_cache_call(DefaultClient.add)
+    delete = _timed_cache_call(DefaultClient.delete)
+    delete_many = _timed_cache_call(DefaultClient.delete_many)
+    incr = _timed_cache_call(DefaultClient.incr)
+    touch = _timed_cache_call(DefaultClient.touch)
+
+
+class RouteHistograms:
+    """Thread-safe duration histograms per route and metric (total, db, cache, ...)."""
+
+    def __init__(self, buckets=HISTOGRAM_BUCKETS_MS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, durations):
+        """Count one request's durations (in milliseconds, by metric) for route."""
+        with self._lock:
+            for metric, duration in durations.items():
+                histogram = self._histograms.get((route, metric))
+                if histogram is None:
+                    histogram = self._histograms[(route, metric)] = {
+                        'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0
+                    }
+                histogram['counts'][bisect.bisect_left(self.buckets, duration)] += 1
+                histogram['sum'] += duration
+                histogram['count'] += 1
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: (route, metric) to a copy of its histogram: 'counts' per bucket (the
+            last one for durations above all buckets), 'sum' in milliseconds and 'count'
+        """
+        with self._lock:
+            return {
+                key: {'counts': list(histogram['counts']), 'sum': histogram['sum'], 'count': histogram['count']}
+                for key, histogram in self._histograms.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+route_histograms = RouteHistograms()
+
+
+class ServerTimingMiddleware:
+    """
+    Middleware timing each request. Place it near the top of MIDDLEWARE, so that
+    the total covers the middleware below it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.emit_header = getattr(settings, 'SERVER_TIMING_HEADER', settings.DEBUG)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        try:
+            with connection.execute_wrapper(timings):
+                response = self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        try:
+            async with aexecute_wrapper(timings):
+                response = await self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        match = request.resolver_match
+        # Label by route pattern rather than path, so that the number of histograms stays bounded
+        route = match.route if match is not None else UNMATCHED_ROUTE
+        durations = timings.milliseconds()
+        route_histograms.observe(route, durations)
+        metrics.observe_request(route, request.method, response.status_code, durations)
+        metrics.record_db_queries(route, timings.counts.get('db', 0))
+        if self.emit_header:
+            response['Server-Timing'] = timings.header()
+        return response
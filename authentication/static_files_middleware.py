@@ -0,0 +1,61 @@
+"""
+Static Files Middleware
+WhiteNoise static file serving that also runs in async mode.
+
+WhiteNoiseMiddleware is sync only, so under ASGI Django would run it, and every
+middleware and view below it, in a thread. StaticFilesMiddleware serves the same
+files, but passes other requests on without leaving the event loop.
+
+It also adds the default security headers (security_headers_middleware.py) to
+each file's headers once, when WhiteNoise loads the file, before any
+WHITENOISE_ADD_HEADERS_FUNCTION. Serving a file then copies them with the rest.
+"""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+from .security_headers_middleware import HeaderBlock, build_security_headers
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoiseMiddleware for both WSGI and ASGI."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        # Built before WhiteNoise loads the files, in super().__init__()
+        self.security_headers = HeaderBlock(build_security_headers())
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @property
+    def add_headers_function(self):
+        return self.add_security_headers
+
+    @add_headers_function.setter
+    def add_headers_function(self, function):
+        # WhiteNoise sets it from WHITENOISE_ADD_HEADERS_FUNCTION
+        self.configured_add_headers_function = function
+
+    def add_security_headers(self, headers, path, url):
+        """Add the security headers to the headers of a static file, once per file."""
+        self.security_headers.apply(headers)
+        if self.configured_add_headers_function is not None:
+            self.configured_add_headers_function(headers, path, url)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            # Looks the file up on disk
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            # Opens and stats the file
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
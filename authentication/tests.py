@@ -1,13 +1,58 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User
 from rest_framework.test import APITestCase
 from rest_framework import status
 from unittest.mock import patch, MagicMock
 from allauth.socialaccount.models import SocialAccount
+from django.core.cache import cache
+import hashlib
+import os
+import tempfile
+from .query_budget import QueryBudgetAssertionsMixin
+from .principal import CachedTokenAuthentication, get_principal
+from . import google_oauth, token_cache
+from .token_cache import local_cache
+from connectly.testing import clear_cache
+from redis.exceptions import ConnectionError as RedisConnectionError
+from .rate_limiter import RateLimiter, RateLimitPolicy
+from .middleware import AuthRateLimitMiddleware
+from .security_headers_middleware import SecurityHeadersMiddleware
+from .static_files_middleware import StaticFilesMiddleware
+from whitenoise.middleware import WhiteNoiseFileResponse
+from singletons.logger_singleton import JSONFormatter, LogContextFilter, LoggerSingleton, log_context
+import json
+import logging
+from .server_timing import RequestTimings, route_histograms, timed, _current_timings
+from prometheus_client import REGISTRY
+from django.http import HttpResponse
+from django.test import RequestFactory
+from .progressive_rate_limit import (
+    progressive_rate_limit, get_progressive_rate_limit_key, handle_failed_authentication
+)
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from asgiref.sync import async_to_sync
+from .async_views import AsyncGoogleLoginView
+from .google_oauth import ACCOUNT_KEY, TOKEN_KEY, GoogleTokenError, averify_access_token, verify_access_token
+from .google_stub import GoogleStubServer, stub_userinfo
+from .last_login import flush_last_logins, record_login
+from .hashers import TunableArgon2PasswordHasher
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.utils import timezone
 
 class GoogleLoginTest(APITestCase):
     def setUp(self):
+        # Rate limit counts and verified Google tokens
+        clear_cache()
+
         # Create a test user
         self.test_user = User.objects.create_user(
             username='testuser',
@@ -28,7 +73,7 @@ class GoogleLoginTest(APITestCase):
         # URL to test
         self.url = reverse('google-login')
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_google_login_creates_new_user(self, mock_get):
         """Test that Google login creates a new user if none exists"""
         # Mock the response from Google
@@ -57,7 +102,7 @@ class GoogleLoginTest(APITestCase):
         self.assertEqual(response.data['last_name'], 'User')
         self.assertEqual(response.data['picture'], 'https://example.com/picture.jpg')
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_google_login_links_existing_user(self, mock_get):
         """Test that Google login links to an existing user with the same email"""
         # Create a user with the same email as in the Google response
@@ -90,7 +135,7 @@ class GoogleLoginTest(APITestCase):
         self.assertIn('token', response.data)
         self.assertEqual(response.data['user_id'], existing_user.id)
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_google_login_uses_existing_social_account(self, mock_get):
         """Test that Google login uses an existing social account"""
         # Create a user
@@ -134,7 +179,7 @@ class GoogleLoginTest(APITestCase):
         self.assertIn('token', response.data)
         self.assertEqual(response.data['user_id'], existing_user.id)
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_google_login_invalid_token(self, mock_get):
         """Test that Google login fails with an invalid token"""
         # Mock the response from Google to indicate failure
@@ -159,7 +204,7 @@ class GoogleLoginTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('error', response.data)
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_google_login_missing_email(self, mock_get):
         """Test that Google login fails if the Google response doesn't include an email"""
         # Mock response missing email
@@ -177,3 +222,772 @@ class GoogleLoginTest(APITestCase):
         # Check that the response is an error
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('error', response.data)
+
+
+class AuthQueryBudgetTest(QueryBudgetAssertionsMixin, APITestCase):
+    """
+    Hit every route in authentication/urls.py and fail if any of them
+    exceeds its query budget.
+    """
+
+    def setUp(self):
+        # Rate limit counters live in the cache and must not leak between tests
+        clear_cache()
+        self.user = User.objects.create_user(
+            username='budgetuser',
+            email='budget@example.com',
+            password='testpass123'
+        )
+        for i in range(50):
+            User.objects.create_user(username=f'budget{i}', email=f'budget{i}@example.com')
+
+    def test_token_routes_stay_within_budget(self):
+        """Test that token endpoints stay within a fixed query budget"""
+        with self.assertMaxQueries(6):
+            response = self.client.post(
+                reverse('api-token-auth-ratelimited'),
+                {'username': 'budgetuser', 'password': 'testpass123'}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # ModelBackend and the allauth backend each look the user up
+        with self.assertMaxQueries(4):
+            self.client.post(
+                reverse('api-token-auth-ratelimited'),
+                {'username': 'budgetuser', 'password': 'wrong'}
+            )
+
+        with self.assertMaxQueries(0):
+            self.client.get(reverse('token-info'))
+
+    def test_signup_stays_within_budget(self):
+        """Test that registration stays within a fixed query budget"""
+        with self.assertMaxQueries(8):
+            response = self.client.post(reverse('register-user'), {
+                'username': 'newbudget',
+                'email': 'newbudget@example.com',
+                'password': 'A-strong-pass-123',
+                'first_name': 'New',
+                'last_name': 'Budget',
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @patch('requests.Session.get')
+    def test_google_login_stays_within_budget(self, mock_get):
+        """Test that Google login stays within a fixed query budget for new and returning users"""
+        mock_response = MagicMock()
+        mock_response.ok = True
+        mock_response.json.return_value = {
+            'sub': '999', 'email': 'budget@gmail.com', 'given_name': 'Budget', 'family_name': 'User'
+        }
+        mock_get.return_value = mock_response
+
+        with self.assertMaxQueries(20):
+            response = self.client.post(reverse('google-login'), {'access_token': 'fake'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertMaxQueries(8):
+            response = self.client.post(reverse('google-login'), {'access_token': 'fake'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_MAX_QUERIES=1)
+    def test_middleware_logs_requests_over_budget(self):
+        """Test that the query budget middleware warns about expensive requests"""
+        with self.assertLogs('connectly_logger', level='WARNING') as logs:
+            self.client.post(
+                reverse('api-token-auth-ratelimited'),
+                {'username': 'budgetuser', 'password': 'testpass123'}
+            )
+        self.assertTrue(any('Query budget exceeded' in line for line in logs.output))
+
+    @patch.dict(os.environ, {'GOOGLE_AUTH_URI': 'https://accounts.example.com/auth', 'GOOGLE_CLIENT_ID': 'id'})
+    def test_oauth_pages_stay_within_budget(self):
+        """Test that the OAuth demo and callback pages do not touch the database"""
+        with self.assertMaxQueries(0):
+            self.client.get(reverse('oauth-demo'))
+        with self.assertMaxQueries(0):
+            self.client.get(reverse('oauth-callback'))
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    def setUp(self):
+        clear_cache()
+        self.user = User.objects.create_user(username='cachedtoken', password='testpass123', email='c@example.com')
+        self.token = Token.objects.create(user=self.user)
+        self.factory = APIRequestFactory()
+
+    def authenticate(self):
+        request = self.factory.get('/', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        request = Request(request, authenticators=[CachedTokenAuthentication()])
+        return request.user, get_principal(request)
+
+    def test_cached_token_skips_database(self):
+        """Test that a cached token authenticates without any query"""
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user, principal = self.authenticate()
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.username, 'cachedtoken')
+        self.assertEqual(principal.role, 'user')
+
+    def test_redis_entry_survives_local_eviction(self):
+        """Test that the shared cache serves tokens evicted from the local LRU"""
+        self.authenticate()
+        local_cache.clear()
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_token_deletion_invalidates(self):
+        """Test that a deleted token stops authenticating immediately"""
+        self.authenticate()
+        self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_user_deactivation_invalidates(self):
+        """Test that a deactivated user stops authenticating immediately"""
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_role_change_invalidates(self):
+        """Test that a role change is seen by the next request"""
+        self.authenticate()
+        self.user.profile.role = 'admin'
+        self.user.profile.save()
+        _, principal = self.authenticate()
+        self.assertTrue(principal.is_admin)
+
+    def test_saving_cached_user_keeps_other_fields(self):
+        """Test that saving a user rebuilt from the cache does not blank uncached fields"""
+        self.authenticate()
+        user, _ = self.authenticate()
+        user.first_name = 'Cached'
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Cached')
+        self.assertTrue(self.user.check_password('testpass123'))
+
+    def test_snapshot_read_before_change_not_cached(self):
+        """Test that a snapshot read before a role change is not cached after it"""
+        stale = token_cache.snapshot_user(self.user)
+        self.user.profile.role = 'admin'
+        self.user.profile.save()
+        token_cache.set_user_snapshot(self.token.key, stale)
+        _, principal = self.authenticate()
+        self.assertTrue(principal.is_admin)
+
+    def test_unreachable_redis_falls_back_to_database(self):
+        """Test that tokens authenticate from the database and users save while Redis is down"""
+        unreachable = MagicMock()
+        for method in ('get', 'add', 'set', 'touch', 'delete'):
+            getattr(unreachable, method).side_effect = RedisConnectionError
+        with patch('authentication.token_cache.cache', unreachable), \
+                patch('authentication.token_cache.get_redis_connection', side_effect=NotImplementedError), \
+                self.assertLogs('connectly_logger', level='WARNING'):
+            user, _ = self.authenticate()
+            self.assertEqual(user.pk, self.user.pk)
+            self.user.is_active = False
+            self.user.save()
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_active)
+
+
+class ProgressiveRateLimitTest(TestCase):
+    """Progressive rate limiting, on the cache API path used with non-Redis caches."""
+
+    def setUp(self):
+        clear_cache()
+        self.request = APIRequestFactory().post('/api/auth/login/', REMOTE_ADDR='10.0.0.1')
+
+    def fail(self, times):
+        for _ in range(times):
+            result = handle_failed_authentication(self.request, 'login')
+        return result
+
+    def test_no_delay_for_first_attempts(self):
+        """Test that the first five failures are not delayed"""
+        info = self.fail(5)['rate_limit_info']
+        self.assertEqual(info['failed_attempts'], 5)
+        self.assertEqual(info['current_delay'], 0)
+        self.assertEqual(get_progressive_rate_limit_key(None, self.request), 'normal:10.0.0.1')
+
+    def test_delay_grows_after_free_attempts(self):
+        """Test that failures past the free attempts get an exponential, jittered delay"""
+        result = self.fail(7)
+        info = result['rate_limit_info']
+        self.assertEqual(result['error'], 'Authentication failed')
+        self.assertEqual(info['failed_attempts'], 7)
+        self.assertEqual(info['remaining_attempts'], 0)
+        self.assertTrue(3 <= info['current_delay'] <= 5)
+        self.assertEqual(info['current_delay'], progressive_rate_limit.calculate_delay(7, '10.0.0.1'))
+        self.assertEqual(get_progressive_rate_limit_key(None, self.request), 'progressive:10.0.0.1:7')
+
+    def test_lockout_after_threshold(self):
+        """Test that an IP is locked out once it passes the lockout threshold"""
+        self.fail(11)
+        self.assertEqual(get_progressive_rate_limit_key(None, self.request), 'locked_out:10.0.0.1')
+        info = self.fail(1)['rate_limit_info']
+        self.assertTrue(info['is_locked_out'])
+        self.assertEqual(info['suggested_retry_after'], info['current_delay'])
+        self.assertEqual(progressive_rate_limit.get_rate_limit_info('10.0.0.1'), info)
+
+    def test_counter_is_per_ip(self):
+        """Test that failures from one IP do not count against another"""
+        self.fail(6)
+        other = APIRequestFactory().post('/api/auth/login/', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(get_progressive_rate_limit_key(None, other), 'normal:10.0.0.2')
+
+
+TEST_RATE_LIMIT_POLICIES = {
+    'feed': {'path': r'^/api/(posts/)?feed/$', 'methods': ['GET'], 'rate': '60/m', 'burst': 2, 'key': 'user'},
+}
+
+
+@override_settings(RATE_LIMIT_ENABLED=True, RATE_LIMIT_POLICIES=TEST_RATE_LIMIT_POLICIES)
+class APIRateLimiterTest(APITestCase):
+    """GCRA rate limiting of API routes, on the cache API path used with non-Redis caches."""
+
+    def setUp(self):
+        clear_cache()
+        self.user = User.objects.create_user(username='limited', password='testpass123')
+        self.other = User.objects.create_user(username='other', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def test_burst_then_rejected_with_headers(self):
+        """Test that requests past the burst get a 429 with Retry-After and RateLimit headers"""
+        first = self.client.get('/api/posts/feed/')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first['RateLimit-Limit'], '2')
+        self.assertEqual(first['RateLimit-Remaining'], '1')
+        self.assertEqual(first['RateLimit-Policy'], '60;w=60;burst=2')
+
+        self.assertEqual(self.client.get('/api/posts/feed/')['RateLimit-Remaining'], '0')
+        rejected = self.client.get('/api/posts/feed/')
+        self.assertEqual(rejected.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(rejected['Retry-After'], '1')
+        self.assertEqual(rejected['RateLimit-Remaining'], '0')
+
+    def test_limits_are_per_user(self):
+        """Test that one user's requests do not count against another's"""
+        for _ in range(3):
+            self.client.get('/api/posts/feed/')
+        self.client.force_authenticate(user=self.other)
+        self.assertEqual(self.client.get('/api/posts/feed/').status_code, status.HTTP_200_OK)
+
+    def test_unmatched_routes_are_not_limited(self):
+        """Test that routes without a policy get no rate limit headers"""
+        for _ in range(3):
+            response = self.client.get('/api/posts/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('RateLimit-Limit', response)
+
+    def test_no_boundary_burst(self):
+        """Test that the bucket refills one request per interval, without window resets"""
+        policy = RateLimitPolicy('test', r'^/', '60/m', burst=2)
+        limiter = RateLimiter([policy])
+        now = 1000.0
+        self.assertTrue(limiter.hit(policy, 'ip:1', now).allowed)
+        self.assertTrue(limiter.hit(policy, 'ip:1', now).allowed)
+        self.assertFalse(limiter.hit(policy, 'ip:1', now + 0.5).allowed)
+        self.assertTrue(limiter.hit(policy, 'ip:1', now + 1).allowed)
+        self.assertFalse(limiter.hit(policy, 'ip:1', now + 1).allowed)
+
+    def test_unreachable_redis_lets_requests_through(self):
+        """Test that API requests are not limited, nor failed, while Redis is down"""
+        with patch.object(RateLimiter, 'hit', side_effect=RedisConnectionError), \
+                self.assertLogs('connectly_logger', level='WARNING'):
+            for _ in range(3):
+                response = self.client.get('/api/posts/feed/')
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('RateLimit-Limit', response)
+
+
+@override_settings(AUTH_RATE_LIMIT_RATE='2/m')
+class AuthRateLimitMiddlewareTest(TestCase):
+    """Route matching of AuthRateLimitMiddleware."""
+
+    def setUp(self):
+        clear_cache()
+        self.middleware = AuthRateLimitMiddleware(lambda request: HttpResponse())
+        self.factory = RequestFactory()
+
+    def post(self, path):
+        return self.middleware(self.factory.post(path, REMOTE_ADDR='10.0.0.9')).status_code
+
+    def test_auth_paths_limited_with_and_without_slash(self):
+        """Test that both forms of an auth path share one limit"""
+        self.assertEqual(self.post('/api/auth/login/'), 200)
+        self.assertEqual(self.post('/api/auth/login'), 200)
+        self.assertEqual(self.post('/api/auth/login/'), 429)
+
+    @override_settings(AUTH_RATE_LIMIT_RATE='1/10m')
+    def test_rejection_describes_configured_rate(self):
+        """Test that the 429 response states the configured rate"""
+        middleware = AuthRateLimitMiddleware(lambda request: HttpResponse())
+        middleware(self.factory.post('/api/auth/login/', REMOTE_ADDR='10.0.0.9'))
+        response = middleware(self.factory.post('/api/auth/login/', REMOTE_ADDR='10.0.0.9'))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(json.loads(response.content)['detail'], 'Maximum 1 attempt per 10 minutes allowed.')
+
+    def test_other_requests_pass_through(self):
+        """Test that non-auth paths and non-POST requests are never limited"""
+        for _ in range(3):
+            self.assertEqual(self.post('/api/posts/'), 200)
+            self.assertEqual(self.middleware(self.factory.get('/api/auth/login/')).status_code, 200)
+
+
+class SecurityHeadersMiddlewareTest(TestCase):
+    """Prebuilt security header blocks of SecurityHeadersMiddleware."""
+
+    def get(self, path, response, **extra):
+        middleware = SecurityHeadersMiddleware(lambda request: response)
+        return middleware(RequestFactory().get(path, **extra))
+
+    def test_default_headers(self):
+        """Test that responses get the strict CSP and lose server headers"""
+        response = self.get('/api/posts/', HttpResponse(headers={'Server': 'gunicorn', 'X-Powered-By': 'x'}))
+        self.assertNotIn('Server', response)
+        self.assertNotIn('X-Powered-By', response)
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+        self.assertIn("script-src 'self';", response['Content-Security-Policy'])
+        self.assertIn('usb=()', response['Permissions-Policy'])
+        self.assertNotIn('Strict-Transport-Security', response)
+
+    def test_route_override(self):
+        """Test that the OAuth demo page gets its relaxed CSP, with or without trailing slash"""
+        for path in ('/api/auth/demo/', '/api/auth/demo'):
+            csp = self.get(path, HttpResponse())['Content-Security-Policy']
+            self.assertIn("script-src 'self' 'unsafe-inline';", csp)
+            self.assertIn("frame-ancestors 'none'", csp)
+
+    def serve_static(self, **extra):
+        """Serve /static/app.css through StaticFilesMiddleware below SecurityHeadersMiddleware."""
+        static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(static_root.cleanup)
+        with open(os.path.join(static_root.name, 'app.css'), 'w') as f:
+            f.write('body {}')
+        with self.settings(STATIC_ROOT=static_root.name, WHITENOISE_AUTOREFRESH=False, WHITENOISE_USE_FINDERS=False):
+            static_files = StaticFilesMiddleware(lambda request: HttpResponse())
+            middleware = SecurityHeadersMiddleware(static_files)
+            return middleware(RequestFactory().get('/static/app.css', **extra))
+
+    def test_static_files_get_all_headers(self):
+        """Test that static files get the full set of security headers, added when WhiteNoise loads them"""
+        response = self.serve_static(secure=True)
+        self.assertIsInstance(response, WhiteNoiseFileResponse)
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+        self.assertEqual(response['Referrer-Policy'], 'strict-origin-when-cross-origin')
+        self.assertIn('Strict-Transport-Security', response)
+        self.assertIn("default-src 'self'", response['Content-Security-Policy'])
+
+    def test_static_files_keep_configured_headers_function(self):
+        """Test that WHITENOISE_ADD_HEADERS_FUNCTION still runs after the security headers"""
+        def add_headers(headers, path, url):
+            headers['X-Frame-Options'] = 'SAMEORIGIN'
+        with self.settings(WHITENOISE_ADD_HEADERS_FUNCTION=add_headers):
+            response = self.serve_static()
+        self.assertEqual(response['X-Frame-Options'], 'SAMEORIGIN')
+        self.assertIn('Content-Security-Policy', response)
+
+    def test_static_file_responses_skipped(self):
+        """Test that WhiteNoise responses only get HSTS from the middleware"""
+        response = self.get('/static/app.css', WhiteNoiseFileResponse(), secure=True)
+        self.assertIn('Strict-Transport-Security', response)
+        self.assertNotIn('Content-Security-Policy', response)
+
+
+class RequestContextMiddlewareTest(APITestCase):
+    """Request context for log records, set by RequestContextMiddleware."""
+
+    def setUp(self):
+        clear_cache()
+        self.user = User.objects.create_user(username='contextuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        # Keep the records of these requests out of the real log file
+        patcher = patch.object(LoggerSingleton().listener, 'handlers', (logging.NullHandler(),))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_request_finished_record(self):
+        """Test that each request logs its route, user, status and query count"""
+        with self.assertLogs('connectly_logger', level='INFO') as logs:
+            response = self.client.get('/api/posts/')
+        record = [record for record in logs.records if getattr(record, 'event', None) == 'request_finished'][0]
+        self.assertEqual(record.request_id, response['X-Request-ID'])
+        self.assertEqual(record.user_id, self.user.pk)
+        self.assertEqual(record.status, 200)
+        self.assertIn('posts', record.route)
+        self.assertGreater(record.db_queries, 0)
+
+    def test_request_id_header(self):
+        """Test that a well-formed X-Request-ID is kept and any other is replaced"""
+        response = self.client.get('/api/posts/', HTTP_X_REQUEST_ID='abc-123')
+        self.assertEqual(response['X-Request-ID'], 'abc-123')
+        response = self.client.get('/api/posts/', HTTP_X_REQUEST_ID='bad id\n')
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+
+    def test_json_formatter_with_context(self):
+        """Test that JSON records carry the log context, extra fields and a redacted message"""
+        context = MagicMock()
+        context.fields.return_value = {'request_id': 'abc', 'user_id': 7}
+        record = logging.makeLogRecord({
+            'name': 'connectly_logger', 'levelname': 'INFO', 'msg': 'Login with %s',
+            'args': ('token=secretvalue',), 'cache_hit': True,
+        })
+        token = log_context.set(context)
+        try:
+            LogContextFilter().filter(record)
+        finally:
+            log_context.reset(token)
+        entry = json.loads(JSONFormatter().format(record))
+        self.assertEqual(entry['message'], 'Login with token=[REDACTED]')
+        self.assertEqual(entry['request_id'], 'abc')
+        self.assertEqual(entry['user_id'], 7)
+        self.assertIs(entry['cache_hit'], True)
+
+
+class ServerTimingMiddlewareTest(APITestCase):
+    """Request timings of ServerTimingMiddleware."""
+
+    def setUp(self):
+        clear_cache()
+        self.user = User.objects.create_user(username='timinguser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        route_histograms.clear()
+
+    @override_settings(SERVER_TIMING_HEADER=True)
+    def test_server_timing_header(self):
+        """Test that the header breaks the request down into db, serialize and total time"""
+        response = self.client.get('/api/posts/')
+        metrics = {metric.split(';')[0] for metric in response['Server-Timing'].split(', ')}
+        self.assertTrue({'db', 'serialize', 'total'} <= metrics)
+        self.assertNotIn('Server', response)
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_header_disabled(self):
+        """Test that no header is sent when disabled, but timings are still aggregated"""
+        response = self.client.get('/api/posts/')
+        self.assertNotIn('Server-Timing', response)
+        totals = [
+            histogram for (route, metric), histogram in route_histograms.snapshot().items()
+            if metric == 'total' and 'posts' in route
+        ]
+        self.assertEqual(sum(histogram['count'] for histogram in totals), 1)
+
+    def test_security_headers_keep_server_timing(self):
+        """Test that SecurityHeadersMiddleware removes Server but not Server-Timing"""
+        response = HttpResponse(headers={'Server': 'gunicorn', 'Server-Timing': 'total;dur=1.0'})
+        response = SecurityHeadersMiddleware(lambda request: response)(RequestFactory().get('/api/posts/'))
+        self.assertNotIn('Server', response)
+        self.assertEqual(response['Server-Timing'], 'total;dur=1.0')
+
+    def test_nested_timing_counted_once(self):
+        """Test that a block timed inside another of the same name is not counted twice"""
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        try:
+            with timed('cache'):
+                with timed('cache'):
+                    pass
+        finally:
+            _current_timings.reset(token)
+        self.assertEqual(timings.counts, {'cache': 1})
+
+
+class MetricsEndpointTest(APITestCase):
+    """Prometheus metrics served at /metrics/."""
+
+    def setUp(self):
+        clear_cache()
+        self.user = User.objects.create_user(username='metricsuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_counted_by_route(self):
+        """Test that requests are counted and timed under their route pattern"""
+        labels = {'route': 'api/posts/$', 'method': 'GET', 'status': '200'}
+        before = self.sample('connectly_requests_total', **labels)
+        self.client.get('/api/posts/')
+        self.assertEqual(self.sample('connectly_requests_total', **labels), before + 1)
+        self.assertGreater(
+            self.sample('connectly_request_duration_seconds_count', route='api/posts/$', component='db'), 0
+        )
+
+        with self.settings(METRICS_TOKEN='scrape-secret'):
+            response = self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'connectly_requests_total{method="GET",route="api/posts/$",status="200"}', response.content)
+
+    def test_feed_cache_lookups_counted(self):
+        """Test that feed cache misses and hits are counted"""
+        before_miss = self.sample('connectly_cache_lookups_total', cache='public_feed', result='miss')
+        before_hit = self.sample('connectly_cache_lookups_total', cache='public_feed', result='hit')
+        # The feed skips its cache for SERVER_NAME=testserver
+        self.client.get('/api/posts/feed/', SERVER_NAME='localhost')
+        self.client.get('/api/posts/feed/', SERVER_NAME='localhost')
+        self.assertEqual(
+            self.sample('connectly_cache_lookups_total', cache='public_feed', result='miss'), before_miss + 1
+        )
+        self.assertEqual(self.sample('connectly_cache_lookups_total', cache='public_feed', result='hit'), before_hit + 1)
+
+    @override_settings(RATE_LIMIT_ENABLED=True, RATE_LIMIT_POLICIES=TEST_RATE_LIMIT_POLICIES)
+    def test_rate_limit_rejections_counted(self):
+        """Test that requests rejected by a rate limit policy are counted under it"""
+        before = self.sample('connectly_rate_limit_rejections_total', limiter='api', policy='feed')
+        for _ in range(3):
+            self.client.get('/api/posts/feed/')
+        self.assertEqual(self.sample('connectly_rate_limit_rejections_total', limiter='api', policy='feed'), before + 1)
+
+    def test_auth_failures_and_lockouts_counted(self):
+        """Test that failed authentication attempts and the lockout they lead to are counted"""
+        request = APIRequestFactory().post('/api/auth/login/', REMOTE_ADDR='10.0.0.9')
+        failures = self.sample('connectly_auth_failures_total')
+        lockouts = self.sample('connectly_auth_lockouts_total')
+        for _ in range(11):
+            handle_failed_authentication(request, 'login')
+        # The lockout is applied by the rate limit key check once the threshold is passed
+        get_progressive_rate_limit_key(None, request)
+        get_progressive_rate_limit_key(None, request)
+        self.assertEqual(self.sample('connectly_auth_failures_total'), failures + 11)
+        self.assertEqual(self.sample('connectly_auth_lockouts_total'), lockouts + 1)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_token_required_when_set(self):
+        """Test that a set METRICS_TOKEN is required as a bearer token"""
+        self.assertEqual(self.client.get('/metrics/').status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_closed_without_token(self):
+        """Test that without a METRICS_TOKEN the metrics are only served with DEBUG on"""
+        self.assertEqual(self.client.get('/metrics/').status_code, status.HTTP_404_NOT_FOUND)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get('/metrics/').status_code, status.HTTP_200_OK)
+
+
+class GoogleStubMixin:
+    """Serves Google's userinfo endpoint from a local stub during each test."""
+
+    def setUp(self):
+        clear_cache()
+        self.server = GoogleStubServer()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        stub_settings = override_settings(GOOGLE_USERINFO_URL=self.server.userinfo_url)
+        stub_settings.enable()
+        self.addCleanup(stub_settings.disable)
+
+
+class GoogleTokenVerificationTest(GoogleStubMixin, APITestCase):
+
+    def test_connection_reused(self):
+        """Test that token verifications reuse a kept-alive connection"""
+        self.assertEqual(verify_access_token('token-a'), stub_userinfo('token-a'))
+        self.assertEqual(verify_access_token('token-b'), stub_userinfo('token-b'))
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_verified_tokens_cached(self):
+        """Test that verified tokens are cached by hash and rejected ones are not cached"""
+        verify_access_token('token-a')
+        self.assertEqual(verify_access_token('token-a'), stub_userinfo('token-a'))
+        self.assertEqual(self.server.requests, 1)
+        self.assertIsNotNone(cache.get(TOKEN_KEY.format(hashlib.sha256(b'token-a').hexdigest())))
+
+        for _ in range(2):
+            with self.assertRaises(GoogleTokenError):
+                verify_access_token('invalid-token')
+        self.assertEqual(self.server.requests, 3)
+
+    def test_async_verification(self):
+        """Test that async verification returns the userinfo and shares the cache"""
+        self.assertEqual(async_to_sync(averify_access_token)('token-a'), stub_userinfo('token-a'))
+        verify_access_token('token-a')
+        self.assertEqual(self.server.requests, 1)
+        with self.assertRaises(GoogleTokenError):
+            async_to_sync(averify_access_token)('invalid-token')
+
+    def test_async_client_closed_with_its_loop(self):
+        """Test that each event loop's AsyncClient is closed when the loop shuts down"""
+        async def get_client():
+            client, _ = await google_oauth._get_async_client()
+            return client
+
+        first, second = async_to_sync(get_client)(), async_to_sync(get_client)()
+        self.assertIsNot(first, second)
+        self.assertTrue(first.is_closed)
+        self.assertTrue(second.is_closed)
+
+    def test_unreachable_redis_falls_back_to_google(self):
+        """Test that tokens are verified with Google while Redis is down"""
+        unreachable = MagicMock()
+        for method in ('get', 'set', 'aget', 'aset'):
+            getattr(unreachable, method).side_effect = RedisConnectionError
+        with patch('authentication.google_oauth.cache', unreachable), \
+                self.assertLogs('connectly_logger', level='WARNING'):
+            self.assertEqual(verify_access_token('token-a'), stub_userinfo('token-a'))
+            self.assertEqual(async_to_sync(averify_access_token)('token-a'), stub_userinfo('token-a'))
+        self.assertEqual(self.server.requests, 2)
+
+    def test_google_login_with_stub(self):
+        """Test that Google login signs up the user behind a token verified by the stub"""
+        self.server.users['token-a'] = dict(stub_userinfo('token-a'), email='stubuser@example.com')
+        response = self.client.post(reverse('google-login'), {'access_token': 'token-a'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['username'], 'stubuser')
+        self.assertTrue(SocialAccount.objects.filter(uid=stub_userinfo('token-a')['sub']).exists())
+
+    def test_async_google_login_view(self):
+        """Test that the async Google login view responds as google_login does"""
+        view = AsyncGoogleLoginView.as_view()
+        factory = APIRequestFactory()
+
+        response = async_to_sync(view)(factory.post('/api/auth/google/', {'access_token': 'token-a'}, format='json'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user = User.objects.get(email=stub_userinfo('token-a')['email'])
+        self.assertEqual(response.data['user_id'], user.pk)
+        self.assertEqual(response.data['token'], Token.objects.get(user=user).key)
+
+        response = async_to_sync(view)(factory.post('/api/auth/google/', {'access_token': 'invalid'}, format='json'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = async_to_sync(view)(factory.post('/api/auth/google/', {}, format='json'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class GoogleAccountResolutionTest(GoogleStubMixin, APITestCase):
+    def login(self, access_token='token-a'):
+        return self.client.post(reverse('google-login'), {'access_token': access_token}, format='json')
+
+    def test_repeat_login_served_from_cache(self):
+        """Test that a repeat Google login only queries the user's token"""
+        first = self.login()
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(1):
+            second = self.login()
+        self.assertEqual(second.data, first.data)
+
+    def test_cached_account_holds_no_token(self):
+        """Test that the Google account cache stores the user id, not the API token"""
+        response = self.login()
+        cached = cache.get(ACCOUNT_KEY.format(stub_userinfo('token-a')['sub']))
+        self.assertEqual(cached, response.data['user_id'])
+
+    def test_unique_username_in_one_query(self):
+        """Test that a new Google user gets the first free username suffix from one query"""
+        for username in ['stubuser', 'stubuser1', 'stubuser2', 'stubuser10', 'stubusers']:
+            User.objects.create_user(username=username, email=f'{username}@example.org')
+        self.server.users['token-a'] = dict(stub_userinfo('token-a'), email='stubuser@example.com')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.login()
+        self.assertEqual(response.data['username'], 'stubuser3')
+        username_queries = [q for q in queries if '"auth_user"."username" LIKE' in q['sql']]
+        self.assertEqual(len(username_queries), 1)
+
+    def test_unlinked_google_account_not_served_from_cache(self):
+        """Test that unlinking a Google account drops its cached account"""
+        first = self.login()
+        SocialAccount.objects.filter(uid=stub_userinfo('token-a')['sub']).delete()
+        User.objects.filter(pk=first.data['user_id']).update(email='changed@example.com')
+
+        # The email no longer matches, so the Google user gets a new account
+        second = self.login()
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(second.data['user_id'], first.data['user_id'])
+
+    def test_deleted_token_not_served_from_cache(self):
+        """Test that a login after the user's token is deleted returns a new token"""
+        first = self.login()
+        Token.objects.filter(key=first.data['token']).delete()
+        second = self.login()
+        self.assertEqual(second.data['user_id'], first.data['user_id'])
+        self.assertNotEqual(second.data['token'], first.data['token'])
+        self.assertTrue(Token.objects.filter(key=second.data['token']).exists())
+
+
+class LastLoginBufferTest(GoogleStubMixin, APITestCase):
+    def last_login(self, user_id):
+        return User.objects.get(pk=user_id).last_login
+
+    def test_logins_written_in_bulk(self):
+        """Test that logins are buffered and written with one UPDATE on flush"""
+        users = [User.objects.create_user(username=f'buffered{i}', password='pass12345') for i in range(3)]
+        for user in users:
+            self.assertTrue(record_login(user.pk))
+        self.assertIsNone(self.last_login(users[0].pk))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(flush_last_logins(), 3)
+        for user in users:
+            self.assertIsNotNone(self.last_login(user.pk))
+        self.assertEqual(flush_last_logins(), 0)
+
+    @override_settings(LAST_LOGIN_UPDATE_INTERVAL=900)
+    def test_one_write_per_update_interval(self):
+        """Test that logins within the update interval of a buffered one are skipped"""
+        user = User.objects.create_user(username='frequent', password='pass12345')
+        first = timezone.now() - timedelta(minutes=1)
+        self.assertTrue(record_login(user.pk, when=first))
+        self.assertFalse(record_login(user.pk))
+        flush_last_logins()
+        self.assertEqual(self.last_login(user.pk), first)
+
+    def test_failed_flush_keeps_logins(self):
+        """Test that logins are put back in the buffer when writing them fails"""
+        user = User.objects.create_user(username='retried', password='pass12345')
+        record_login(user.pk)
+        with patch.object(User.objects, 'bulk_update', side_effect=RuntimeError('database down')):
+            with self.assertRaises(RuntimeError):
+                flush_last_logins()
+        self.assertEqual(flush_last_logins(), 1)
+        self.assertIsNotNone(self.last_login(user.pk))
+
+    def test_logins_recorded(self):
+        """Test that Google and token logins record last_login, written on flush"""
+        response = self.client.post(reverse('google-login'), {'access_token': 'token-a'}, format='json')
+        google_user_id = response.data['user_id']
+        token_user = User.objects.create_user(username='tokenuser', password='pass12345')
+        response = self.client.post(
+            reverse('api-token-auth-ratelimited'), {'username': 'tokenuser', 'password': 'pass12345'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(self.last_login(google_user_id))
+
+        out = StringIO()
+        call_command('flush_last_logins', stdout=out)
+        self.assertIn('2 user(s)', out.getvalue())
+        self.assertIsNotNone(self.last_login(google_user_id))
+        self.assertIsNotNone(self.last_login(token_user.pk))
+
+
+@override_settings(ARGON2_TIME_COST=1, ARGON2_MEMORY_COST=1024, ARGON2_PARALLELISM=1)
+class TunableArgon2PasswordHasherTest(APITestCase):
+    def setUp(self):
+        clear_cache()
+
+    def test_parameters_from_settings(self):
+        """Test that passwords are hashed with the Argon2 parameters from settings"""
+        encoded = make_password('correct horse battery')
+        self.assertTrue(encoded.startswith('argon2$argon2id$v=19$m=1024,t=1,p=1$'))
+        self.assertTrue(check_password('correct horse battery', encoded))
+        self.assertIsInstance(identify_hasher(encoded), TunableArgon2PasswordHasher)
+
+    def test_rehash_on_login_after_parameters_change(self):
+        """Test that a password hashed with other parameters is rehashed on the next login"""
+        user = User.objects.create_user(username='rehashed', password='pass12345')
+        self.assertIn('$m=1024,t=1,p=1$', user.password)
+
+        with override_settings(ARGON2_TIME_COST=2, ARGON2_MEMORY_COST=2048):
+            response = self.client.post(
+                reverse('api-token-auth-ratelimited'), {'username': 'rehashed', 'password': 'pass12345'}, format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            user.refresh_from_db()
+            self.assertIn('$m=2048,t=2,p=1$', user.password)
+            self.assertTrue(user.check_password('pass12345'))
@@ -0,0 +1,194 @@
+"""
+Token Cache
+Caches the user behind an API token so authenticated requests skip the database.
+
+A token resolves to a snapshot of its user (id, username, flags and profile role),
+stored in the default cache (Redis) and fronted by a small per-process LRU:
+- Redis entries live for AUTH_TOKEN_CACHE_TIMEOUT seconds and are deleted by the
+  signals in models.py on token deletion, user changes (e.g. deactivation) and
+  profile changes (e.g. role).
+- LRU entries live for AUTH_TOKEN_LOCAL_CACHE_TTL seconds. Invalidation clears the
+  local LRU of the process making the change; other processes may keep serving
+  their copy until it expires, so keep this TTL short.
+
+Invalidation leaves a short-lived marker in place of the entries, and snapshots
+read from the database are only written with add() while no marker is set, so a
+request that read a user just before it changed cannot cache the old snapshot.
+
+If Redis cannot be reached, tokens are looked up in the database and invalidation
+is logged and skipped: entries then live until they expire.
+
+Changes made with QuerySet.update() do not send signals and are only picked up
+once the entries expire.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from singletons.logger_singleton import LoggerSingleton
+
+logger = LoggerSingleton().get_logger()
+
+TOKEN_KEY = 'auth_token:{}'
+USER_TOKEN_KEY = 'auth_token_user:{}'
+
+# Marker left by invalidation. It outlives any request that read the user from the
+# database before the change, so that request's snapshot is not written
+INVALIDATED = 'invalidated'
+INVALIDATED_TIMEOUT = 10
+
+# Errors of an unreachable Redis, on which the token cache falls back to the database
+REDIS_ERRORS = (RedisConnectionError, RedisTimeoutError)
+
+USER_SNAPSHOT_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser'
+)
+
+
+class LocalLRUCache:
+    """Thread-safe, size-bounded LRU with a per-entry time to live."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LocalLRUCache(
+    max_size=getattr(settings, 'AUTH_TOKEN_LOCAL_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'AUTH_TOKEN_LOCAL_CACHE_TTL', 5),
+)
+
+
+def _token_cache_key(token_key):
+    # Never put the raw token in a cache key
+    return TOKEN_KEY.format(hashlib.sha256(token_key.encode()).hexdigest())
+
+
+def snapshot_user(user):
+    """
+    Build the cacheable snapshot of a user, including the profile role.
+
+    Args:
+        user: User, ideally with its profile already loaded
+
+    Returns:
+        dict: The snapshot
+    """
+    snapshot = {field: getattr(user, field) for field in USER_SNAPSHOT_FIELDS}
+    profile = user.profile if hasattr(user, 'profile') else None
+    snapshot['profile_id'] = profile.pk if profile else None
+    snapshot['role'] = profile.role if profile else None
+    return snapshot
+
+
+def get_user_snapshot(token_key):
+    """
+    Get the cached user snapshot for a token.
+
+    Returns:
+        dict or None: The snapshot, or None on a cache miss or if Redis is unreachable
+    """
+    key = _token_cache_key(token_key)
+    snapshot = local_cache.get(key)
+    if snapshot is None:
+        try:
+            snapshot = cache.get(key)
+        except REDIS_ERRORS as e:
+            logger.warning("Auth cache unavailable, using the database: %s", e)
+            return None
+        if snapshot == INVALIDATED:
+            return None
+        if snapshot is not None:
+            local_cache.set(key, snapshot)
+    return snapshot
+
+
+def set_user_snapshot(token_key, snapshot):
+    """
+    Cache the user snapshot for a token, unless the user was invalidated since
+    the snapshot may have been read.
+    """
+    key = _token_cache_key(token_key)
+    user_key = USER_TOKEN_KEY.format(snapshot['id'])
+    timeout = getattr(settings, 'AUTH_TOKEN_CACHE_TIMEOUT', 300)
+    try:
+        if not cache.add(user_key, key, timeout=timeout):
+            # Set by an earlier snapshot of this token, or an invalidation marker
+            if cache.get(user_key) != key:
+                return
+            cache.touch(user_key, timeout)
+        if not cache.add(key, snapshot, timeout=timeout):
+            return
+    except REDIS_ERRORS as e:
+        logger.warning("Auth cache unavailable, not caching the user: %s", e)
+        return
+    local_cache.set(key, snapshot)
+
+
+def _swap(key, value, timeout):
+    """Set a cache key and return its previous value, atomically with django-redis."""
+    try:
+        client = get_redis_connection('default')
+    except NotImplementedError:
+        previous = cache.get(key)
+        cache.set(key, value, timeout=timeout)
+        return previous
+    previous = client.set(cache.make_key(key), cache.client.encode(value), ex=timeout, get=True)
+    return None if previous is None else cache.client.decode(previous)
+
+
+def invalidate_token(token_key):
+    """Drop the cached snapshot for a token, e.g. when it is deleted."""
+    key = _token_cache_key(token_key)
+    local_cache.delete(key)
+    try:
+        cache.delete(key)
+    except REDIS_ERRORS as e:
+        logger.error("Could not invalidate the auth cache entry of a deleted API key: %s", e)
+
+
+def invalidate_user(user_id):
+    """Drop the cached snapshot for a user's token, e.g. when the user or its profile changes."""
+    try:
+        key = _swap(USER_TOKEN_KEY.format(user_id), INVALIDATED, INVALIDATED_TIMEOUT)
+        if key is not None and key != INVALIDATED:
+            cache.set(key, INVALIDATED, timeout=INVALIDATED_TIMEOUT)
+            local_cache.delete(key)
+    except REDIS_ERRORS as e:
+        logger.error("Could not invalidate the auth cache entry of user %s: %s", user_id, e)
@@ -1,12 +1,17 @@
+from django.conf import settings
 from django.urls import path
+from .async_views import AsyncGoogleLoginView
 from .views import google_login, oauth_demo, oauth_callback, RateLimitedObtainAuthToken, register_user, token_info
 
+# The ASGI deployment verifies Google tokens without blocking
+google_login_view = AsyncGoogleLoginView.as_view() if settings.ASYNC_VIEWS else google_login
+
 #added
 urlpatterns = [
     path('token/', RateLimitedObtainAuthToken.as_view(), name='api-token-auth-ratelimited'),
     path('token-info/', token_info, name='token-info'),
     path('signup/', register_user, name='register-user'),
-    path('google/', google_login, name='google-login'),
+    path('google/', google_login_view, name='google-login'),
     path('demo/', oauth_demo, name='oauth-demo'),
     path('callback/', oauth_callback, name='oauth-callback'),
 ]
@@ -1,10 +1,9 @@
 from django.shortcuts import render, redirect
-import requests
+import re
 import urllib.parse
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import IntegrityError
-from django.utils import timezone
+from django.db import IntegrityError, transaction
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
@@ -16,7 +15,10 @@ from singletons.logger_singleton import LoggerSingleton
 from django_ratelimit.decorators import ratelimit
 from django_ratelimit.exceptions import Ratelimited
 from django.utils.decorators import method_decorator
+from .google_oauth import GoogleTokenError, cache_account, get_cached_account, verify_access_token
+from .last_login import record_login
 from .rate_limit_utils import get_client_ip
+from .token_cache import get_user_snapshot, set_user_snapshot, snapshot_user
 from .progressive_rate_limit import (
     get_progressive_rate_limit_key, 
     handle_failed_authentication,
@@ -39,7 +41,7 @@ def register_user(request):
     was_limited = getattr(request, 'limited', False)
     if was_limited:
         client_ip = get_client_ip(None, request)
-        logger.warning(f"Rate limit exceeded for registration from IP: {client_ip}")
+        logger.warning("Rate limit exceeded for registration from IP: %s", client_ip)
         return Response(
             {'error': 'Rate limit exceeded', 'detail': 'Too many requests. Please try again later.'},
             status=status.HTTP_429_TOO_MANY_REQUESTS
@@ -96,7 +98,7 @@ def register_user(request):
         # Create token for the user
         token = Token.objects.create(user=user)
 
-        logger.info(f"User {username} registered successfully")
+        logger.info("User %s registered successfully", username)
 
         # Return success response with token
         return Response({
@@ -110,13 +112,13 @@ def register_user(request):
         }, status=status.HTTP_201_CREATED)
 
     except IntegrityError as e:
-        logger.error(f"IntegrityError during user registration: {str(e)}")
+        logger.error("IntegrityError during user registration: %s", e)
         return Response(
             {'error': 'An account with this username or email already exists.'},
             status=status.HTTP_409_CONFLICT
         )
     except Exception as e:
-        logger.error(f"Error during user registration: {str(e)}")
+        logger.error("Error during user registration: %s", e)
         return Response(
             {'error': 'An unexpected error occurred during registration'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -135,15 +137,23 @@ class RateLimitedObtainAuthToken(ObtainAuthToken):
         """Override dispatch to check rate limit before processing request"""
         return super().dispatch(request, *args, **kwargs)
 
+    def get_serializer(self, *args, **kwargs):
+        # Kept to read the authenticated user from once the token is issued
+        self.serializer = super().get_serializer(*args, **kwargs)
+        return self.serializer
+
     def post(self, request, *args, **kwargs):
         # Debug: Log the IP that will be used for rate limiting
         client_ip = get_client_ip(None, request)
-        logger.debug(f"Token auth request from IP: {client_ip} (X-Forwarded-For: {request.META.get('HTTP_X_FORWARDED_FOR', 'None')}, REMOTE_ADDR: {request.META.get('REMOTE_ADDR', 'None')})")
+        logger.debug(
+            "Token auth request from IP: %s (X-Forwarded-For: %s, REMOTE_ADDR: %s)", client_ip,
+            request.META.get('HTTP_X_FORWARDED_FOR', 'None'), request.META.get('REMOTE_ADDR', 'None')
+        )
 
         # Check if rate limited  (block=False means we check manually)
         was_limited = getattr(request, 'limited', False)
         if was_limited:
-            logger.warning(f"Rate limit exceeded for IP: {client_ip}")
+            logger.warning("Rate limit exceeded for IP: %s", client_ip)
             return Response(
                 {'error': 'Rate limit exceeded', 'detail': 'Too many requests. Please try again later.'},
                 status=status.HTTP_429_TOO_MANY_REQUESTS
@@ -156,7 +166,8 @@ class RateLimitedObtainAuthToken(ObtainAuthToken):
             if response.status_code == 200:
                 # Successful authentication - reset failed attempts
                 handle_successful_authentication(request)
-                logger.info(f"Token obtained successfully for user from IP: {client_ip}")
+                record_login(self.serializer.validated_data['user'].pk)
+                logger.info("Token obtained successfully for user from IP: %s", client_ip)
             else:
                 # Failed authentication - track failed attempts
                 failed_response = handle_failed_authentication(request, 'token_endpoint')
@@ -166,7 +177,7 @@ class RateLimitedObtainAuthToken(ObtainAuthToken):
                 
             return response
         except Exception as e:
-            logger.error(f"Error during token authentication: {str(e)}")
+            logger.error("Error during token authentication: %s", e)
             raise
 
 def oauth_demo(request):
@@ -192,8 +203,8 @@ def oauth_demo(request):
     redirect_uri = f"{protocol}://{host}/api/auth/callback/"
 
     # Log configuration (secrets already redacted by logger_singleton)
-    logger.info(f"OAuth demo requested - Auth URI: {auth_uri}")
-    logger.info(f"OAuth demo requested - Redirect URI: {redirect_uri}")
+    logger.info("OAuth demo requested - Auth URI: %s", auth_uri)
+    logger.info("OAuth demo requested - Redirect URI: %s", redirect_uri)
     
     # Build params exactly as Google expects
     params = {
@@ -259,12 +270,7 @@ def google_login(request):
     # Check if rate limited
     was_limited = getattr(request, 'limited', False)
     if was_limited:
-        client_ip = get_client_ip(None, request)
-        logger.warning(f"Rate limit exceeded for Google login from IP: {client_ip}")
-        return Response(
-            {'error': 'Rate limit exceeded', 'detail': 'Too many requests. Please try again later.'},
-            status=status.HTTP_429_TOO_MANY_REQUESTS
-        )
+        return google_login_rate_limited(request)
 
     # Validate input
     if 'access_token' not in request.data:
@@ -277,124 +283,181 @@ def google_login(request):
     
     try:
         # Verify the token with Google
-        google_response = requests.get(
-            'https://www.googleapis.com/oauth2/v3/userinfo',
-            headers={'Authorization': f'Bearer {token}'},
-            timeout=10  # Add timeout to prevent hanging requests
-        )
-        
-        # NEW (SECURE): for Outh sanitation error logging
-        if not google_response.ok:
-            logger.error(f"Failed to verify Google token: Status {google_response.status_code}")
+        try:
+            user_data = verify_access_token(token)
+        except GoogleTokenError as e:
+            # NEW (SECURE): for Outh sanitation error logging
+            logger.error("Failed to verify Google token: Status %s", e.status_code)
             return Response(
                 {'error': 'Invalid Google token'},
                 status=status.HTTP_401_UNAUTHORIZED
             )
+
+        return google_login_user(request, user_data)
+
+    except Exception as e:
+        logger.error("Error during Google login: %s", e)
+        return Response(
+            {'error': 'An unexpected error occurred'}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+def google_login_rate_limited(request):
+    """Response to a Google login over its rate limit."""
+    client_ip = get_client_ip(None, request)
+    logger.warning("Rate limit exceeded for Google login from IP: %s", client_ip)
+    return Response(
+        {'error': 'Rate limit exceeded', 'detail': 'Too many requests. Please try again later.'},
+        status=status.HTTP_429_TOO_MANY_REQUESTS
+    )
+
+
+def google_login_user(request, user_data):
+    """
+    Log in the user behind a verified Google token, linking or creating the user
+    on their first Google login. Repeat logins are served from the Google account
+    cache (see google_oauth.py) and the token cache.
+
+    Args:
+        request: The login request
+        user_data: The userinfo Google returned for the token
+
+    Returns:
+        Response: The user's DRF token and profile, or the error
+    """
+    if 'email' not in user_data:
+        logger.error("Email not provided in Google response")
+        return Response(
+            {'error': 'Email not provided by Google'}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
         
-        # Parse user info from Google
-        user_data = google_response.json()
+    google_id = user_data['sub']
+    picture = user_data.get('picture')
+    
+    # Handle user creation/authentication
+    try:
+        user, token_key = None, None
+        user_id = get_cached_account(google_id)
+        if user_id is not None:
+            # The account cache holds no API token: load it, then read the user from the token cache
+            token_key = Token.objects.filter(user_id=user_id).values_list('key', flat=True).first()
+            user = get_user_snapshot(token_key) if token_key else None
+            if user is not None and user['id'] == user_id:
+                logger.info("User %s logged in via existing Google account", user['username'])
+            else:
+                user = None
+
+        if user is None:
+            db_user, token = _resolve_google_user(user_data)
+            user, token_key = snapshot_user(db_user), token.key
+            set_user_snapshot(token_key, user)
+            cache_account(google_id, user['id'])
         
-        if 'email' not in user_data:
-            logger.error("Email not provided in Google response")
-            return Response(
-                {'error': 'Email not provided by Google'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        # Update last login time, buffered and written in bulk
+        record_login(user['id'])
         
-        email = user_data['email']
-        google_id = user_data['sub']
-        name = user_data.get('name', email.split('@')[0])
-        picture = user_data.get('picture')
+        # Successful authentication - reset failed attempts
+        handle_successful_authentication(request)
         
-        # Handle user creation/authentication
-        try:
-            # Try to find if this Google account is already linked to a user
-            social_account = SocialAccount.objects.filter(
+        # Return the token to the client
+        return Response({
+            'token': token_key,
+            'user_id': user['id'],
+            'email': user['email'],
+            'username': user['username'],
+            'first_name': user['first_name'],
+            'last_name': user['last_name'],
+            'picture': picture
+        })
+        
+    except IntegrityError as e:
+        logger.error("IntegrityError during Google login: %s", e)
+        return Response(
+            {'error': 'An account with this username already exists.'}, 
+            status=status.HTTP_409_CONFLICT
+        )
+
+
+@transaction.atomic
+def _resolve_google_user(user_data):
+    """
+    Find the user linked to a Google account, linking the user with the same email
+    or creating a user if there is none.
+
+    Returns:
+        tuple: The user, with its profile loaded, and its DRF token
+    """
+    email = user_data['email']
+    google_id = user_data['sub']
+
+    # Try to find if this Google account is already linked to a user, in one
+    # indexed lookup that also loads the user, its profile and token
+    social_account = SocialAccount.objects.select_related(
+        'user__profile', 'user__auth_token'
+    ).filter(provider='google', uid=google_id).first()
+    
+    if social_account:
+        # If the account exists, get the user
+        user = social_account.user
+        token = getattr(user, 'auth_token', None)
+        logger.info("User %s logged in via existing Google account", user.username)
+    else:
+        # Check if a user with this email already exists
+        user = User.objects.select_related('profile', 'auth_token').filter(email=email).first()
+        
+        if user:
+            token = getattr(user, 'auth_token', None)
+            # Link the existing user to this Google account
+            SocialAccount.objects.create(
+                user=user,
                 provider='google',
-                uid=google_id
-            ).first()
-            
-            if social_account:
-                # If the account exists, get the user
-                user = social_account.user
-                logger.info(f"User {user.username} logged in via existing Google account")
-            else:
-                # Check if a user with this email already exists
-                user = User.objects.filter(email=email).first()
-                
-                if user:
-                    # Link the existing user to this Google account
-                    SocialAccount.objects.create(
-                        user=user,
-                        provider='google',
-                        uid=google_id,
-                        extra_data=user_data
-                    )
-                    logger.info(f"Linked Google account to existing user {user.username}")
-                else:
-                    # Create a new user with the Google data
-                    username = email.split('@')[0]
-                    base_username = username
-                    count = 1
-                    
-                    # Ensure username uniqueness
-                    while User.objects.filter(username=username).exists():
-                        username = f"{base_username}{count}"
-                        count += 1
-                    
-                    # Create the new user
-                    user = User.objects.create(
-                        username=username,
-                        email=email,
-                        first_name=user_data.get('given_name', ''),
-                        last_name=user_data.get('family_name', ''),
-                        is_active=True
-                    )
-                    
-                    # Set a unusable password for security
-                    user.set_unusable_password()
-                    user.save()
-                    
-                    # Create the social account
-                    SocialAccount.objects.create(
-                        user=user,
-                        provider='google',
-                        uid=google_id,
-                        extra_data=user_data
-                    )
-                    logger.info(f"Created new user {user.username} from Google account")
-            
-            # Get or create token for the user
-            token, created = Token.objects.get_or_create(user=user)
-            
-            # Update last login time
-            user.last_login = timezone.now()
-            user.save(update_fields=['last_login'])
-            
-            # Successful authentication - reset failed attempts
-            handle_successful_authentication(request)
-            
-            # Return the token to the client
-            return Response({
-                'token': token.key,
-                'user_id': user.pk,
-                'email': user.email,
-                'username': user.username,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'picture': picture
-            })
-            
-        except IntegrityError as e:
-            logger.error(f"IntegrityError during Google login: {str(e)}")
-            return Response(
-                {'error': 'An account with this username already exists.'}, 
-                status=status.HTTP_409_CONFLICT
+                uid=google_id,
+                extra_data=user_data
+            )
+            logger.info("Linked Google account to existing user %s", user.username)
+        else:
+            # Create a new user with the Google data, with an unusable password for security
+            user = User(
+                username=_unique_username(email.split('@')[0]),
+                email=email,
+                first_name=user_data.get('given_name', ''),
+                last_name=user_data.get('family_name', ''),
+                is_active=True
             )
+            user.set_unusable_password()
+            user.save()
+            token = Token.objects.create(user=user)
             
-    except Exception as e:
-        logger.error(f"Error during Google login: {str(e)}")
-        return Response(
-            {'error': 'An unexpected error occurred'}, 
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
+            # Create the social account
+            SocialAccount.objects.create(
+                user=user,
+                provider='google',
+                uid=google_id,
+                extra_data=user_data
+            )
+            logger.info("Created new user %s from Google account", user.username)
+    
+    # Create a token for an existing user without one
+    if token is None:
+        token, created = Token.objects.get_or_create(user=user)
+    return user, token
+
+
+def _unique_username(base_username):
+    """
+    Get the first free username of base_username, base_username1, base_username2, ...
+    in one query, however many of them are taken.
+    """
+    taken = set(User.objects.filter(
+        username__startswith=base_username,
+        username__regex=rf'^{re.escape(base_username)}[0-9]*$'
+    ).values_list('username', flat=True))
+    
+    username = base_username
+    count = 1
+    while username in taken:
+        username = f"{base_username}{count}"
+        count += 1
+    return username
@@ -0,0 +1,151 @@
+"""
+Prometheus Metrics
+Metrics served at /metrics/ in the Prometheus text format.
+
+Under gunicorn every worker records into the shared PROMETHEUS_MULTIPROC_DIR
+(set in gunicorn_config.py), and a scrape merges the files of all workers, so
+counters and histograms cover the whole server. Without that directory (e.g.
+runserver) the metrics are those of the current process.
+
+Recording a metric is a few microseconds. Process-level gauges (database and Redis
+connections, log queue depth) are refreshed at most once per GAUGE_REFRESH_INTERVAL
+seconds, at the end of a request. Scrapes only read the metric files, and so never
+hold up the requests of other workers.
+"""
+
+import hmac
+import os
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from singletons.logger_singleton import LoggerSingleton
+
+# Histogram buckets in seconds, matching authentication.server_timing.HISTOGRAM_BUCKETS_MS
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+GAUGE_REFRESH_INTERVAL = 1.0
+
+REQUESTS = Counter(
+    'connectly_requests_total', 'Requests handled, by route pattern, method and status',
+    ['route', 'method', 'status']
+)
+REQUEST_DURATION = Histogram(
+    'connectly_request_duration_seconds',
+    'Time spent on requests, by route pattern and component (total, db, cache, serialize)',
+    ['route', 'component'], buckets=DURATION_BUCKETS
+)
+DB_QUERIES = Counter('connectly_db_queries_total', 'Database queries run, by route pattern', ['route'])
+CACHE_LOOKUPS = Counter(
+    'connectly_cache_lookups_total', 'Cache lookups, by cache (e.g. feed) and result (hit or miss)',
+    ['cache', 'result']
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    'connectly_rate_limit_rejections_total', 'Requests rejected by a rate limit, by limiter and policy',
+    ['limiter', 'policy']
+)
+AUTH_FAILURES = Counter('connectly_auth_failures_total', 'Failed authentication attempts')
+AUTH_LOCKOUTS = Counter('connectly_auth_lockouts_total', 'IP lockouts applied after repeated failed authentication')
+DB_CONNECTIONS = Gauge(
+    'connectly_db_connections_open', 'Open (persistent) database connections', multiprocess_mode='livesum'
+)
+REDIS_CONNECTIONS = Gauge(
+    'connectly_redis_pool_connections', 'Connections in the Redis pool, by state (in_use or idle)',
+    ['state'], multiprocess_mode='livesum'
+)
+LOG_QUEUE_DEPTH = Gauge(
+    'connectly_log_queue_depth', 'Log records waiting to be written', multiprocess_mode='livesum'
+)
+LOG_RECORDS_DROPPED = Gauge(
+    'connectly_log_records_dropped', 'Log records dropped while the log queue was full', multiprocess_mode='livesum'
+)
+
+_gauges_refreshed_at = 0.0
+
+
+def observe_request(route, method, status, durations):
+    """
+    Record a finished request.
+
+    Args:
+        route: Route pattern, not the path, to keep the number of series bounded
+        durations: Milliseconds by component (total, db, cache, serialize)
+    """
+    REQUESTS.labels(route, method, status).inc()
+    for component, milliseconds in durations.items():
+        REQUEST_DURATION.labels(route, component).observe(milliseconds / 1000)
+    _refresh_process_gauges()
+
+
+def record_db_queries(route, count):
+    if count:
+        DB_QUERIES.labels(route).inc(count)
+
+
+def record_cache_lookup(cache_name, hit):
+    CACHE_LOOKUPS.labels(cache_name, 'hit' if hit else 'miss').inc()
+
+
+def record_rate_limit_rejection(limiter, policy):
+    RATE_LIMIT_REJECTIONS.labels(limiter, policy).inc()
+
+
+def record_auth_failure():
+    AUTH_FAILURES.inc()
+
+
+def record_auth_lockout():
+    AUTH_LOCKOUTS.inc()
+
+
+def _refresh_process_gauges():
+    global _gauges_refreshed_at
+    now = time.monotonic()
+    if now - _gauges_refreshed_at < GAUGE_REFRESH_INTERVAL:
+        return
+    _gauges_refreshed_at = now
+
+    DB_CONNECTIONS.set(sum(1 for conn in connections.all(initialized_only=True) if conn.connection is not None))
+
+    pool = _redis_pool()
+    if pool is not None:
+        in_use = len(getattr(pool, '_in_use_connections', ()))
+        REDIS_CONNECTIONS.labels('in_use').set(in_use)
+        REDIS_CONNECTIONS.labels('idle').set(getattr(pool, '_created_connections', in_use) - in_use)
+
+    queue_handler = LoggerSingleton().queue_handler
+    LOG_QUEUE_DEPTH.set(queue_handler.queue.qsize())
+    LOG_RECORDS_DROPPED.set(queue_handler.dropped)
+
+
+def _redis_pool():
+    # The pool of the default cache's Redis client, or None for other cache backends
+    client = getattr(cache, 'client', None)
+    if client is None or not hasattr(client, 'get_client'):
+        return None
+    return client.get_client(write=True).connection_pool
+
+
+def metrics_view(request):
+    """
+    Serve the metrics in the Prometheus text format. Requests must send
+    METRICS_TOKEN as a bearer token. Without a METRICS_TOKEN the endpoint is
+    only served with DEBUG on, and is a 404 otherwise.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponse(status=404)
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -98,21 +98,37 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'authentication.request_context_middleware.RequestContextMiddleware',  # Request context for log records
+    'authentication.server_timing.ServerTimingMiddleware',  # DB, cache and serializer timings per request
     'django.middleware.security.SecurityMiddleware',
     'authentication.security_headers_middleware.SecurityHeadersMiddleware',  # Custom security headers
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'authentication.static_files_middleware.StaticFilesMiddleware',  # WhiteNoise, also in async mode
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'authentication.middleware.AuthRateLimitMiddleware',  # Re-enabled for rate limiting
+    'authentication.rate_limiter.RateLimitHeadersMiddleware',  # RateLimit-* headers for API policies
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',  # Add this line for django-allauth
     'authentication.error_handling_middleware.SecureErrorHandlingMiddleware',  # Secure error handling
+    'authentication.query_budget.QueryBudgetMiddleware',  # Dev-only N+1 query guard
 ]
 
+# Server-Timing header with the db, cache, serialize and total time of each request
+# (authentication/server_timing.py). It exposes internals, so it is off unless DEBUG
+SERVER_TIMING_HEADER = bool(int(os.getenv('SERVER_TIMING_HEADER', '1' if DEBUG else '0')))
+
+# Bearer token required to scrape /metrics/ (connectly/metrics.py); while empty,
+# /metrics/ is only served with DEBUG on
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Query budget guard: log requests that run more queries than this (dev only)
+QUERY_BUDGET_ENABLED = DEBUG
+QUERY_BUDGET_MAX_QUERIES = int(os.getenv('QUERY_BUDGET_MAX_QUERIES', '20'))
+
 ROOT_URLCONF = 'connectly.urls'
 
 TEMPLATES = [
@@ -132,15 +148,24 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'connectly.wsgi.application'
+ASGI_APPLICATION = 'connectly.asgi.application'
+
+# Serve the read endpoints of the posts API (posts/async_views.py) and Google login
+# (authentication/async_views.py) with async views. Set by the ASGI profile,
+# gunicorn_asgi_config.py; under WSGI they only add overhead. ASYNC_READ_VIEWS, its
+# name before it covered login, is still read when ASYNC_VIEWS is unset
+ASYNC_VIEWS = bool(int(os.getenv('ASYNC_VIEWS', os.getenv('ASYNC_READ_VIEWS', '0'))))
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Persistent connections are kept per thread. Under ASGI each request runs its sync
+# code (and the async ORM's queries) in a thread of its own, so the ASGI profile sets 0
 DATABASES = {
     'default': dj_database_url.config(
         default=os.getenv('DATABASE_URL'),
-        conn_max_age=600,
+        conn_max_age=int(os.getenv('DB_CONN_MAX_AGE', '600')),
         conn_health_checks=True,
     )
 }
@@ -194,12 +219,17 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 REDIS_HOST = os.getenv('REDIS_HOST', 'redis')
 REDIS_PORT = int(os.getenv('REDIS_PORT', '6379'))
 
+# Tests use a Redis database of their own, which they empty between tests
+# (connectly/testing.py), so they never flush the cache of a running server
+REDIS_TEST_DB = int(os.getenv('REDIS_TEST_DB', '15'))
+TEST_RUNNER = 'connectly.testing.TestRunner'
+
 CACHES = {
     'default': {
         'BACKEND': 'django_redis.cache.RedisCache',
         'LOCATION': f'redis://{REDIS_HOST}:{REDIS_PORT}/1',
         'OPTIONS': {
-            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'CLIENT_CLASS': 'authentication.server_timing.TimedRedisClient',  # Times cache calls
             'SOCKET_CONNECT_TIMEOUT': 5,
             'SOCKET_TIMEOUT': 5,
             'RETRY_ON_TIMEOUT': True,
@@ -214,11 +244,73 @@ CACHES = {
     }
 }
 
+# Feed page cache lifetime. Writes invalidate pages through generation counters
+# (posts/feed_cache.py), so this only bounds memory use, not staleness
+FEED_CACHE_TIMEOUT = int(os.getenv('FEED_CACHE_TIMEOUT', '3600'))
+
+# Most private posts a user can have before their feed stops being merged into
+# the shared public timeline and falls back to a per-user cached feed
+FEED_PRIVATE_OVERLAY_LIMIT = int(os.getenv('FEED_PRIVATE_OVERLAY_LIMIT', '100'))
+
+# Token authentication cache (authentication/token_cache.py). Local LRU entries are
+# not invalidated across processes, so their TTL bounds how long a deactivated user
+# or changed role can still be seen by other workers
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', '300'))
+AUTH_TOKEN_LOCAL_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_LOCAL_CACHE_SIZE', '1024'))
+AUTH_TOKEN_LOCAL_CACHE_TTL = int(os.getenv('AUTH_TOKEN_LOCAL_CACHE_TTL', '5'))
+
+# Google token verification (authentication/google_oauth.py). GOOGLE_USERINFO_URL can
+# point at the stub server (authentication/google_stub.py) for tests and benchmarks.
+# Verified tokens are cached by hash, so a token revoked at Google can still log in
+# until its entry expires
+GOOGLE_USERINFO_URL = os.getenv('GOOGLE_USERINFO_URL', 'https://www.googleapis.com/oauth2/v3/userinfo')
+GOOGLE_HTTP_TIMEOUT = int(os.getenv('GOOGLE_HTTP_TIMEOUT', '10'))
+GOOGLE_HTTP_POOL_SIZE = int(os.getenv('GOOGLE_HTTP_POOL_SIZE', '10'))
+GOOGLE_TOKEN_CACHE_TIMEOUT = int(os.getenv('GOOGLE_TOKEN_CACHE_TIMEOUT', '60'))
+
+# last_login writes (authentication/last_login.py): at most one per user per
+# LAST_LOGIN_UPDATE_INTERVAL seconds, buffered in Redis and written in bulk every
+# LAST_LOGIN_FLUSH_INTERVAL seconds, so last_login can lag by up to both together
+LAST_LOGIN_UPDATE_INTERVAL = int(os.getenv('LAST_LOGIN_UPDATE_INTERVAL', '900'))
+LAST_LOGIN_FLUSH_INTERVAL = int(os.getenv('LAST_LOGIN_FLUSH_INTERVAL', '60'))
+
 # Rate limiting settings
 RATELIMIT_ENABLE = True
 RATELIMIT_USE_CACHE = 'default'
 RATELIMIT_VIEW = 'authentication.rate_limit_handler.ratelimited_error'
 
+# Authentication endpoints limited by AuthRateLimitMiddleware (POST only), with or
+# without their trailing slash
+AUTH_RATE_LIMIT_RATE = os.getenv('AUTH_RATE_LIMIT_RATE', '5/m')
+AUTH_RATE_LIMIT_PATHS = [
+    '/api/auth/token/',
+    '/api/auth/login/',
+    '/api/auth/registration/',
+    '/admin/login/',
+]
+
+# API rate limit policies (authentication/rate_limiter.py), applied by the DRF throttle.
+# The first policy matching a request's path and methods applies: `rate` requests per
+# period, in bursts of up to `burst`, counted per user ('user', per IP for anonymous
+# requests) or per IP ('ip')
+RATE_LIMIT_ENABLED = bool(int(os.getenv('RATE_LIMIT_ENABLED', '1')))
+RATE_LIMIT_POLICIES = {
+    'feed': {
+        'path': r'^/api/(posts/)?feed/$',
+        'methods': ['GET'],
+        'rate': os.getenv('RATE_LIMIT_FEED_RATE', '120/m'),
+        'burst': int(os.getenv('RATE_LIMIT_FEED_BURST', '30')),
+        'key': 'user',
+    },
+    'content_write': {
+        'path': r'^/api/(posts|comments)/',
+        'methods': ['POST', 'PUT', 'PATCH', 'DELETE'],
+        'rate': os.getenv('RATE_LIMIT_WRITE_RATE', '60/m'),
+        'burst': int(os.getenv('RATE_LIMIT_WRITE_BURST', '20')),
+        'key': 'user',
+    },
+}
+
 # Security Settings
 # Respect environment variables for security settings
 SECURE_SSL_REDIRECT = bool(int(os.getenv('SECURE_SSL_REDIRECT', '0')))
@@ -237,14 +329,21 @@ X_FRAME_OPTIONS = 'DENY'
 SECURE_REFERRER_POLICY = 'strict-origin-when-cross-origin'
 SECURE_CROSS_ORIGIN_OPENER_POLICY = 'same-origin'
 
-# Content Security Policy
+# Content Security Policy, sent by SecurityHeadersMiddleware. Each CSP_<NAME> setting
+# is the source list of the <name> directive (e.g. CSP_SCRIPT_SRC is script-src)
 CSP_DEFAULT_SRC = ["'self'"]
-CSP_SCRIPT_SRC = ["'self'", "'unsafe-inline'", "'unsafe-eval'"]
-CSP_STYLE_SRC = ["'self'", "'unsafe-inline'"]
-CSP_IMG_SRC = ["'self'", "data:", "https:"]
+CSP_SCRIPT_SRC = ["'self'"]  # No unsafe-inline or unsafe-eval
+CSP_STYLE_SRC = ["'self'"]   # No unsafe-inline
+CSP_IMG_SRC = ["'self'", "data:"]
 CSP_FONT_SRC = ["'self'"]
 CSP_CONNECT_SRC = ["'self'"]
 CSP_FRAME_ANCESTORS = ["'none'"]
+CSP_BASE_URI = ["'self'"]
+CSP_FORM_ACTION = ["'self'"]
+CSP_OBJECT_SRC = ["'none'"]
+CSP_MEDIA_SRC = ["'self'"]
+CSP_WORKER_SRC = ["'self'"]
+CSP_MANIFEST_SRC = ["'self'"]
 
 # Additional security headers
 SECURE_PERMISSIONS_POLICY = {
@@ -253,6 +352,23 @@ SECURE_PERMISSIONS_POLICY = {
     "geolocation": [],
     "microphone": [],
     "payment": [],
+    "usb": [],
+    "interest-cohort": [],
+}
+
+# Per-route changes to the security headers, by path. 'csp' replaces CSP directives,
+# 'headers' replaces headers (None removes one). The OAuth demo pages use inline
+# scripts and styles and show the Google profile picture
+_OAUTH_DEMO_SECURITY_HEADERS = {
+    'csp': {
+        'script-src': ["'self'", "'unsafe-inline'"],
+        'style-src': ["'self'", "'unsafe-inline'"],
+        'img-src': ["'self'", "data:", "https:"],
+    },
+}
+SECURITY_HEADERS_ROUTE_OVERRIDES = {
+    '/api/auth/demo/': _OAUTH_DEMO_SECURITY_HEADERS,
+    '/api/auth/callback/': _OAUTH_DEMO_SECURITY_HEADERS,
 }
 
 # Server signature removal (handled at web server level)
@@ -342,12 +458,15 @@ LOGGING = {
 # REST Framework Settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'authentication.principal.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'authentication.rate_limiter.PolicyRateThrottle',
+    ],
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.openapi.AutoSchema',
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
@@ -359,11 +478,19 @@ REST_FRAMEWORK = {
 
 # Password Hashers
 PASSWORD_HASHERS = [
-    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'authentication.hashers.TunableArgon2PasswordHasher',
     'django.contrib.auth.hashers.PBKDF2PasswordHasher',
     'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
 ]
 
+# Argon2 cost of password hashes (authentication/hashers.py), by default Django's.
+# Every password login hashes once on a sync worker, so these set its CPU time;
+# `manage.py benchmark_password_hashing` recommends values for a target login time.
+# Passwords hashed with other values are rehashed on the user's next login
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', '2'))
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', '102400'))  # KiB
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', '8'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
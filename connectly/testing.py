@@ -0,0 +1,49 @@
+"""
+Test Support
+Keeps the cached state of tests apart from each other and from running servers.
+
+The cache is Redis, shared by every process with the same settings, and outlives
+the test database. Like the test database, tests get a Redis database of their
+own, REDIS_TEST_DB, and each test class touching cached state (token snapshots,
+rate limit counters, feed generations, Google accounts, buffered logins) calls
+clear_cache() in setUp. Without Redis the cache falls back to the database or
+skips caching, so tests that do not depend on it still run.
+
+Provides:
+- TestRunner: DiscoverRunner pointing the django-redis caches at REDIS_TEST_DB
+- clear_cache: empty the cache and the per-process token cache
+"""
+
+import copy
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+from authentication.token_cache import REDIS_ERRORS, local_cache
+
+
+class TestRunner(DiscoverRunner):
+    """DiscoverRunner running the tests against the Redis database REDIS_TEST_DB."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        caches = copy.deepcopy(settings.CACHES)
+        for config in caches.values():
+            if config['BACKEND'] == 'django_redis.cache.RedisCache':
+                location = config['LOCATION'].rpartition('/')[0]
+                config['LOCATION'] = f'{location}/{settings.REDIS_TEST_DB}'
+        self._test_caches = override_settings(CACHES=caches)
+        self._test_caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_caches.disable()
+        super().teardown_test_environment(**kwargs)
+
+
+def clear_cache():
+    """Empty the cache, if Redis can be reached, and this process' token cache."""
+    try:
+        cache.clear()
+    except REDIS_ERRORS:
+        pass
+    local_cache.clear()
@@ -19,6 +19,7 @@ from django.urls import include, path
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.authtoken.views import obtain_auth_token
 from django.http import HttpResponse
+from connectly.metrics import metrics_view
 
 def health_check(request):
     return HttpResponse("OK")
@@ -69,4 +70,7 @@ urlpatterns = [
     
     # Health check
     path('health/', health_check, name='health_check'),
+
+    # Prometheus metrics
+    path('metrics/', metrics_view, name='metrics'),
 ]
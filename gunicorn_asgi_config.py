@@ -0,0 +1,22 @@
+"""
+Gunicorn configuration for the ASGI deployment: uvicorn workers serving
+connectly.asgi, with the read endpoints of the posts API and Google login served
+by async views.
+
+    gunicorn -c gunicorn_asgi_config.py connectly.asgi:application
+
+A request waiting on the database, Redis or Google leaves its worker free to serve
+others, where each sync worker (gunicorn_config.py) serves one request at a time.
+"""
+
+import os
+
+# Set before the workers load Django, honouring the older ASYNC_READ_VIEWS name
+os.environ.setdefault('ASYNC_VIEWS', os.environ.get('ASYNC_READ_VIEWS', '1'))
+# Each ASGI request runs its sync code in a new thread, so persistent connections would pile up
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
+
+# Same server settings and hooks as the sync deployment
+from gunicorn_config import *  # noqa: E402,F401,F403
+
+worker_class = "uvicorn.workers.UvicornWorker"
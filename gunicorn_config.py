@@ -2,6 +2,13 @@
 Gunicorn configuration for Control #5: Server Information Disclosure Prevention
 """
 
+import os
+import shutil
+import tempfile
+
+# Workers write their Prometheus metrics here, and /metrics/ merges them (connectly/metrics.py)
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'connectly-metrics'))
+
 # Server mechanics
 bind = "0.0.0.0:8000"
 workers = 2
@@ -19,7 +26,35 @@ loglevel = "info"
 def on_starting(server):
     """Called just before the master process is initialized."""
     server.log.info("Starting Gunicorn server")
+    # Start the metrics from zero, without the files of a previous run's workers
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
 
 def post_worker_init(worker):
-    """Called just after a worker has been initialized."""
+    """Called just after a worker has been initialized; starts writing buffered last logins."""
     worker.log.info(f"Worker initialized: {worker.pid}")
+    from authentication.last_login import start_flusher
+    start_flusher()
+
+def worker_exit(server, worker):
+    """Called in the worker process just after it has exited; writes out buffered last logins and queued log records."""
+    from authentication.last_login import stop_flusher
+    stop_flusher()
+    from singletons.logger_singleton import LoggerSingleton
+    LoggerSingleton.get_instance().shutdown()
+
+def worker_int(worker):
+    """Called when a worker receives SIGINT or SIGQUIT; writes out queued log records."""
+    from singletons.logger_singleton import LoggerSingleton
+    LoggerSingleton.get_instance().shutdown()
+
+def worker_abort(worker):
+    """Called when a worker times out (SIGABRT); writes out queued log records."""
+    from singletons.logger_singleton import LoggerSingleton
+    LoggerSingleton.get_instance().shutdown()
+
+def child_exit(server, worker):
+    """Called in the master process after a worker has exited; drops its live gauges from the metrics."""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
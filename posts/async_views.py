@@ -0,0 +1,156 @@
+"""
+Async Views for Connectly API.
+Async versions of the read hot paths of the posts API, for the ASGI deployment
+(gunicorn_asgi_config.py), where a request waiting on the database or Redis does
+not hold up a worker.
+
+AsyncAPIViewMixin (authentication/async_views.py) runs the viewset's async
+actions on the event loop and hands its sync ones (the writes) to the regular
+dispatch in a thread. The actions use the async ORM and cache API; note that
+Django's async ORM, and django-redis behind the async cache API, still make each
+call from a thread, but the event loop is free meanwhile.
+
+Provides:
+- AsyncPostViewSet: PostViewSet with async list, retrieve, comments and feed
+"""
+
+from asgiref.sync import sync_to_async
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from authentication.async_views import AsyncAPIViewMixin
+from authentication.principal import get_principal
+from connectly import metrics
+from singletons.logger_singleton import LoggerSingleton
+from .feed_cache import aget_cached_feed, aget_feed_generation
+from .models import Comment
+from .serializers import CommentSerializer
+from .views import CommentCursorPagination, CommentPagination, PostViewSet
+
+logger = LoggerSingleton().get_logger()
+
+
+class AsyncPostViewSet(AsyncAPIViewMixin, PostViewSet):
+    """
+    PostViewSet with async list, retrieve, comments and feed actions, responding
+    exactly as PostViewSet does.
+    """
+
+    async def list(self, request, *args, **kwargs):
+        try:
+            queryset = self.get_queryset()
+
+            # Apply additional privacy filter if specified
+            privacy_filter = request.query_params.get('privacy')
+            if privacy_filter in ['public', 'private']:
+                queryset = queryset.filter(privacy=privacy_filter)
+
+            page = await self.apaginate_queryset(queryset)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(serializer.data)
+
+            serializer = self.get_serializer([post async for post in queryset], many=True)
+            return Response(serializer.data)
+        except NotFound as e:
+            return Response({'error': str(e.detail)}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            logger.error("Error in posts list: %s", e)
+            return Response(
+                {"error": f"An error occurred while fetching posts: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    async def retrieve(self, request, *args, **kwargs):
+        try:
+            instance = await self.aget_object()
+            logger.info(
+                "Retrieve post %s: User: %s, Admin: %s, Post privacy: %s",
+                kwargs.get('pk'), request.user, get_principal(request).is_admin, instance.privacy
+            )
+            serializer = self.get_serializer(instance)
+            return Response(serializer.data)
+        except Exception as e:
+            logger.error("Error retrieving post %s: %s", kwargs.get('pk'), e)
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=True, methods=['get'])
+    async def comments(self, request, pk=None):
+        try:
+            post = await self.aget_object()
+            comments = Comment.objects.filter(post=post).select_related('author__profile').order_by('-created_at')
+
+            paginator = self._get_paginator(CommentPagination, CommentCursorPagination)
+            paginated_comments = await paginator.apaginate_queryset(comments, request)
+            serializer = CommentSerializer(paginated_comments, many=True)
+
+            return paginator.get_paginated_response(serializer.data)
+        except NotFound as e:
+            return Response({'error': str(e.detail)}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            logger.error("Error retrieving comments: %s", e)
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['get'])
+    async def feed(self, request):
+        """
+        Serve feed pages found in the cache from the event loop. Pages that have to
+        be built, on a cache miss or to merge in the user's private posts, are built
+        by PostViewSet.feed in a thread.
+        """
+        try:
+            cached_response = await self._aget_cached_feed(request)
+            if cached_response is not None:
+                return Response(cached_response)
+        except Exception as e:
+            logger.error("Error retrieving news feed: %s", e)
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return await sync_to_async(super().feed)(request)
+
+    async def _aget_cached_feed(self, request):
+        """
+        Get the feed page for a request from the cache alone.
+        Cache lookups are only counted as hits here; misses are counted by
+        PostViewSet.feed when it builds the page.
+
+        Returns:
+            dict: The cached page, or None if the page has to be built
+        """
+        # The feed skips its cache for tests
+        if request.META.get('SERVER_NAME', '') == 'testserver':
+            return None
+        user = request.user
+
+        if not self._uses_shared_feed(request):
+            generation = await aget_feed_generation(author_id=self._feed_generation_author_id(request))
+            cached_response = await aget_cached_feed(self._generate_feed_cache_key(request, generation=generation))
+            if not cached_response:
+                return None
+            logger.info(
+                "Feed cache hit for user %s", user.id if user.is_authenticated else 'anonymous',
+                extra={'cache': 'feed', 'cache_hit': True}
+            )
+            metrics.record_cache_lookup('feed', hit=True)
+            return cached_response
+
+        has_private_feed = user.is_authenticated and request.query_params.get('privacy') != 'public'
+        if has_private_feed:
+            generation = await aget_feed_generation(author_id=user.id)
+            # Unless the user is known to have no private posts to merge in
+            if await aget_cached_feed(self._private_feed_cache_key(request, generation)) != []:
+                return None
+        generation = await aget_feed_generation()
+        cached_response = await aget_cached_feed(self._generate_feed_cache_key(request, shared=True, generation=generation))
+        if not cached_response:
+            return None
+
+        if has_private_feed:
+            metrics.record_cache_lookup('private_feed', hit=True)
+        logger.info("Public feed cache hit", extra={'cache': 'public_feed', 'cache_hit': True})
+        metrics.record_cache_lookup('public_feed', hit=True)
+        logger.info("User %s retrieved shared news feed", user.id if user.is_authenticated else 'anonymous')
+        return cached_response
@@ -0,0 +1,130 @@
+"""
+Feed Cache Generations for Connectly API.
+Provides versioned cache keys so cached feed pages never outlive a write.
+
+Every cached feed page embeds a generation counter in its key. Writes to
+posts, likes and comments bump the counters (see the signals in models.py),
+which makes every older page unreachable at once without having to find and
+delete individual keys. Stale pages simply expire on their TTL.
+
+- The global generation covers every feed that can show other users' posts.
+- A per-author generation covers a user's own feed (filter=own), so it is only
+  invalidated by writes that touch that author's posts.
+
+If Redis cannot be reached, feeds are built without the cache and writes log the
+failed bump instead of failing.
+"""
+
+import time
+from typing import Any, Iterable, Optional
+from django.conf import settings
+from django.core.cache import cache
+from authentication.token_cache import REDIS_ERRORS
+from singletons.logger_singleton import LoggerSingleton
+
+logger = LoggerSingleton().get_logger()
+
+GLOBAL_GENERATION_KEY = 'feed_generation:global'
+AUTHOR_GENERATION_KEY = 'feed_generation:author:{}'
+
+
+def _initial_generation() -> int:
+    """
+    Starting value for a missing counter. Time based rather than 0, so an
+    evicted counter can never come back at a value an older page was cached under.
+    """
+    return time.time_ns() // 1000
+
+
+def _bump(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Counter does not exist yet (or was evicted)
+        cache.add(key, _initial_generation(), timeout=None)
+
+
+def _generation_key(author_id: Optional[int]) -> str:
+    return GLOBAL_GENERATION_KEY if author_id is None else AUTHOR_GENERATION_KEY.format(author_id)
+
+
+def get_feed_generation(author_id: Optional[int] = None) -> int:
+    """
+    Get the current generation for a feed.
+
+    Args:
+        author_id: Author whose own feed is requested, or None for the global feed
+
+    Returns:
+        The generation to embed in the feed cache key; a new one if Redis is unreachable
+    """
+    key = _generation_key(author_id)
+    try:
+        generation = cache.get(key)
+        if generation is None:
+            cache.add(key, _initial_generation(), timeout=None)
+            generation = cache.get(key)
+    except REDIS_ERRORS as e:
+        logger.warning("Feed cache unavailable: %s", e)
+        return _initial_generation()
+    return generation
+
+
+async def aget_feed_generation(author_id: Optional[int] = None) -> int:
+    """Async counterpart of get_feed_generation(), for the async views."""
+    key = _generation_key(author_id)
+    try:
+        generation = await cache.aget(key)
+        if generation is None:
+            await cache.aadd(key, _initial_generation(), timeout=None)
+            generation = await cache.aget(key)
+    except REDIS_ERRORS as e:
+        logger.warning("Feed cache unavailable: %s", e)
+        return _initial_generation()
+    return generation
+
+
+def get_cached_feed(key: str) -> Any:
+    """Get a cached feed entry, or None on a miss or if Redis is unreachable."""
+    try:
+        return cache.get(key)
+    except REDIS_ERRORS as e:
+        logger.warning("Feed cache unavailable: %s", e)
+        return None
+
+
+async def aget_cached_feed(key: str) -> Any:
+    """Async counterpart of get_cached_feed()."""
+    try:
+        return await cache.aget(key)
+    except REDIS_ERRORS as e:
+        logger.warning("Feed cache unavailable: %s", e)
+        return None
+
+
+def cache_feed(key: str, value: Any) -> None:
+    """
+    Cache a feed entry. Safe to keep for long: any write bumps the generation in
+    its key. Skipped if Redis is unreachable.
+    """
+    try:
+        cache.set(key, value, timeout=settings.FEED_CACHE_TIMEOUT)
+    except REDIS_ERRORS as e:
+        logger.warning("Feed cache unavailable: %s", e)
+
+
+def bump_feed_generations(author_ids: Iterable[int] = ()) -> None:
+    """
+    Invalidate cached feed pages after a write. Call it once the write is
+    committed (see the signals in models.py), or requests reading the database
+    meanwhile would cache the old data under the new generation.
+
+    Args:
+        author_ids: Authors whose own feeds are affected by the write
+    """
+    try:
+        _bump(GLOBAL_GENERATION_KEY)
+        for author_id in set(author_ids):
+            _bump(AUTHOR_GENERATION_KEY.format(author_id))
+    except REDIS_ERRORS as e:
+        logger.error("Could not invalidate cached feeds: %s", e)
@@ -0,0 +1,54 @@
+"""
+JSON Codec for Connectly API.
+Decodes stored JSON with orjson when it is installed, falling back to the
+standard library json module otherwise.
+
+orjson is optional and is not listed in requirements.txt; install it to speed
+up metadata decoding (compare with the benchmark_metadata command).
+"""
+
+import json
+from django.db import models
+from django.db.models.fields.json import KeyTransform
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CODEC_NAME = 'orjson' if orjson is not None else 'json'
+
+
+def _orjson_loads(value):
+    try:
+        return orjson.loads(value)
+    except orjson.JSONDecodeError:
+        # orjson only handles 64-bit integers, so let the standard
+        # library have the final say
+        return json.loads(value)
+
+
+# Decode a JSON document (str or bytes) with the fastest available codec.
+# Raises ValueError if the document is not valid JSON.
+loads = _orjson_loads if orjson is not None else json.loads
+
+
+class FastJSONField(models.JSONField):
+    """
+    JSONField that decodes database values with the fastest available codec.
+
+    Like JSONField, a value is decoded once when the row is loaded and kept on the
+    instance, so repeated reads are free. Assigning the attribute or calling
+    refresh_from_db() replaces the decoded value.
+    """
+
+    def from_db_value(self, value, expression, connection):
+        if value is None or self.decoder is not None:
+            return super().from_db_value(value, expression, connection)
+        # Some backends (SQLite at least) extract non-string values in their SQL datatypes
+        if isinstance(expression, KeyTransform) and not isinstance(value, (str, bytes)):
+            return value
+        try:
+            return loads(value)
+        except ValueError:
+            return value
@@ -0,0 +1,83 @@
+import json
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from posts import json_codec
+from posts.models import Post
+from posts.serializers import PostSerializer
+
+SAMPLE_METADATA = [
+    {'file_size': 1024, 'dimensions': {'width': 800, 'height': 600}},
+    {'file_size': 1024000, 'duration': 120},
+    {'url': 'https://example.com/article', 'preview_image': 'https://example.com/preview.jpg'},
+    {},
+]
+
+
+def _time(func, repeat):
+    """Return the best wall time of repeat runs of func, in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark for decoding post metadata while serializing posts (no database writes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10000, help='Number of posts to serialize')
+        parser.add_argument(
+            '--reads', type=int, default=3,
+            help='Metadata reads per post, as made by the old per-access decoding property'
+        )
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement; the best is reported')
+
+    def handle(self, *args, **options):
+        count, reads, repeat = options['posts'], options['reads'], options['repeat']
+        field = Post._meta.get_field('metadata')
+        raw = [json.dumps(SAMPLE_METADATA[i % len(SAMPLE_METADATA)]) for i in range(count)]
+
+        def decode_per_read():
+            for value in raw:
+                for _ in range(reads):
+                    json.loads(value)
+
+        def decode_once_stdlib():
+            for value in raw:
+                json.loads(value)
+
+        def decode_once_codec():
+            for value in raw:
+                field.from_db_value(value, None, connection)
+
+        # Unsaved instances, so serialization runs without touching the database
+        author = User(id=1, username='benchmark')
+        posts = [
+            Post(id=i, title=f'Post {i}', content='Benchmark', author=author,
+                 metadata=field.from_db_value(value, None, connection))
+            for i, value in enumerate(raw, start=1)
+        ]
+
+        def serialize():
+            PostSerializer(posts, many=True).data
+
+        results = [
+            (f'Decode on every read (x{reads}, old property)', _time(decode_per_read, repeat)),
+            ('Decode once per post, json', _time(decode_once_stdlib, repeat)),
+            (f'Decode once per post, {json_codec.CODEC_NAME} (FastJSONField)', _time(decode_once_codec, repeat)),
+            ('Serialize with decoded metadata', _time(serialize, repeat)),
+        ]
+
+        self.stdout.write(f'Metadata decoding for {count} posts (best of {repeat}):')
+        for label, elapsed in results:
+            self.stdout.write(f'  {label:<55} {elapsed:9.1f} ms')
+
+        baseline, memoized = results[0][1] + results[3][1], results[2][1] + results[3][1]
+        self.stdout.write(self.style.SUCCESS(
+            f'Serializing {count} posts: {baseline:.1f} ms -> {memoized:.1f} ms '
+            f'({baseline / memoized:.2f}x) with memoized {json_codec.CODEC_NAME} decoding'
+        ))
@@ -0,0 +1,151 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+DEFAULT_TARGETS = ('sync=http://127.0.0.1:8000', 'async=http://127.0.0.1:8001')
+DEFAULT_PATHS = ('/api/posts/feed/', '/api/posts/')
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.non_2xx = 0
+
+
+async def _read_response(reader):
+    """Read one HTTP/1.1 response, returning (status, whether the server keeps the connection open)."""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ', 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('connection') != 'close'
+
+
+async def _client(url, paths, headers, deadline, measure_from, stats, offset):
+    """One client sending requests back to back, reusing its connection when the server allows."""
+    parts = urlsplit(url)
+    port = parts.port or 80
+    requests = [
+        (f'GET {path} HTTP/1.1\r\nHost: {parts.hostname}:{port}\r\n{headers}\r\n').encode('latin-1')
+        for path in paths
+    ]
+    connection = None
+    sent = offset
+    while time.monotonic() < deadline:
+        start = time.monotonic()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(parts.hostname, port)
+            reader, writer = connection
+            writer.write(requests[sent % len(requests)])
+            sent += 1
+            status, keep_alive = await _read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            keep_alive = False
+            status = None
+        if not keep_alive and connection is not None:
+            connection[1].close()
+            connection = None
+        if start < measure_from:
+            continue
+        if status is None:
+            stats.errors += 1
+        else:
+            stats.latencies.append(time.monotonic() - start)
+            if not 200 <= status < 300:
+                stats.non_2xx += 1
+    if connection is not None:
+        connection[1].close()
+
+
+async def _run(url, paths, headers, concurrency, duration, warmup):
+    stats = Stats()
+    measure_from = time.monotonic() + warmup
+    deadline = measure_from + duration
+    await asyncio.gather(*(
+        _client(url, paths, headers, deadline, measure_from, stats, i) for i in range(concurrency)
+    ))
+    return stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test the read endpoints of running servers, e.g. the sync (gunicorn_config.py) '
+        'and ASGI (gunicorn_asgi_config.py) deployments side by side, and compare their throughput'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', action='append', dest='targets',
+            help=f'NAME=URL of a server to test, repeatable (default: {" ".join(DEFAULT_TARGETS)})'
+        )
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help=f'Path requested in turn by each client, repeatable (default: {" ".join(DEFAULT_PATHS)})'
+        )
+        parser.add_argument('--concurrency', type=int, default=200, help='Concurrent clients')
+        parser.add_argument('--duration', type=float, default=20.0, help='Seconds measured per target')
+        parser.add_argument('--warmup', type=float, default=3.0, help='Seconds of load before measuring')
+        parser.add_argument(
+            '--user', help='Send requests with the token of this user (created if missing); anonymous by default'
+        )
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['targets'] or DEFAULT_TARGETS:
+            name, _, url = target.partition('=')
+            if not url.startswith('http://'):
+                raise CommandError(f"Expected NAME=http://HOST:PORT, got {target!r}")
+            targets.append((name, url))
+        paths = options['paths'] or DEFAULT_PATHS
+        concurrency, duration = options['concurrency'], options['duration']
+
+        headers = ''
+        if options['user']:
+            user, _ = User.objects.get_or_create(username=options['user'])
+            token, _ = Token.objects.get_or_create(user=user)
+            headers = f'Authorization: Token {token.key}\r\n'
+
+        self.stdout.write(
+            f'{concurrency} concurrent clients, {duration:g}s per target, paths: {", ".join(paths)}'
+        )
+        throughputs = {}
+        for name, url in targets:
+            stats = asyncio.run(_run(url, paths, headers, concurrency, duration, options['warmup']))
+            latencies = sorted(stats.latencies)
+            if not latencies:
+                self.stdout.write(self.style.ERROR(f'{name} ({url}): no responses, {stats.errors} errors'))
+                continue
+            throughputs[name] = len(latencies) / duration
+
+            def percentile(fraction):
+                return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+
+            self.stdout.write(
+                f'{name:>8} ({url}): {throughputs[name]:8.1f} req/s, '
+                f'p50 {percentile(0.5):7.1f} ms, p95 {percentile(0.95):7.1f} ms, p99 {percentile(0.99):7.1f} ms, '
+                f'{stats.non_2xx} non-2xx, {stats.errors} errors'
+            )
+
+        if len(throughputs) > 1:
+            baseline_name, baseline = next(iter(throughputs.items()))
+            for name, throughput in list(throughputs.items())[1:]:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{name}: {throughput / baseline:.2f}x the throughput of {baseline_name}'
+                ))
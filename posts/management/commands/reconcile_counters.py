@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from posts.models import Post, Like, Comment
+
+
+def _actual_count(model):
+    """Correlated subquery counting the rows of model that point at the outer Post."""
+    return Coalesce(Subquery(
+        model.objects.filter(post=OuterRef('pk'))
+        .order_by().values('post').annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'Recomputes Post.like_count and Post.comment_count and repairs any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted posts without writing any changes',
+        )
+
+    def handle(self, *args, **options):
+        drifted = Post.objects.annotate(
+            actual_likes=_actual_count(Like),
+            actual_comments=_actual_count(Comment),
+        ).filter(
+            ~Q(like_count=F('actual_likes')) | ~Q(comment_count=F('actual_comments'))
+        )
+
+        drifted_count = drifted.count()
+        if not drifted_count:
+            self.stdout.write(self.style.SUCCESS('All post counters are in sync.'))
+            return
+
+        self.stdout.write(f'Found {drifted_count} post(s) with drifted counters.')
+        if options['dry_run']:
+            for post_id, likes, actual_likes, comments, actual_comments in drifted.values_list(
+                'id', 'like_count', 'actual_likes', 'comment_count', 'actual_comments'
+            ):
+                self.stdout.write(
+                    f'  post {post_id}: likes {likes} -> {actual_likes}, '
+                    f'comments {comments} -> {actual_comments}'
+                )
+            self.stdout.write(self.style.WARNING('Dry run - no changes written.'))
+            return
+
+        # Single UPDATE ... SET col = (SELECT COUNT(*) ...) over the drifted rows
+        with transaction.atomic():
+            updated = Post.objects.filter(
+                pk__in=drifted.values('pk')
+            ).update(
+                like_count=_actual_count(Like),
+                comment_count=_actual_count(Comment),
+            )
+        self.stdout.write(self.style.SUCCESS(f'Reconciled counters for {updated} post(s).'))
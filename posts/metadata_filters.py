@@ -0,0 +1,79 @@
+"""
+Metadata Filters for Connectly API.
+Pushes the feed's metadata_key/metadata_value/metadata_min/metadata_max filters
+down into SQL lookups on the Post.metadata JSONField.
+
+- On PostgreSQL, exact matches use jsonb containment (@>), which is served by the
+  GIN index on metadata, and range filters compare the jsonb value directly so
+  the expression indexes on common keys (file_size, duration) apply.
+- Databases without a native JSON type (SQLite in tests) fall back to key
+  transforms, which Django compiles to JSON_EXTRACT().
+"""
+
+from django.db import connections
+from django.db.models import CharField, Func, Q
+from django.db.models.fields.json import KeyTransform
+
+# Names the database reports for a numeric JSON value, per vendor
+NUMERIC_JSON_TYPES = {
+    'postgresql': ['number'],
+    'sqlite': ['integer', 'real'],
+}
+
+
+class JSONValueType(Func):
+    """Type name of a JSON value: jsonb_typeof() on PostgreSQL, typeof() on SQLite."""
+    function = 'typeof'
+    output_field = CharField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='jsonb_typeof', **extra_context)
+
+
+def filter_by_metadata(queryset, key, value=None, minimum=None, maximum=None):
+    """
+    Filter posts by a top-level metadata key. Key transforms are built explicitly
+    rather than as metadata__<key> lookups, so a key containing '__' cannot reach
+    other lookups.
+
+    Args:
+        queryset: Post queryset to filter
+        key: Metadata key to filter on
+        value: Exact value to match. Digit strings also match the number they spell.
+        minimum: Inclusive lower bound for numeric values
+        maximum: Inclusive upper bound for numeric values
+
+    Returns:
+        The filtered queryset. A bound that is not a number matches nothing.
+    """
+    if value:
+        candidates = [value]
+        if value.isdigit():
+            candidates.append(int(value))
+        if connections[queryset.db].features.has_native_json_field:
+            condition = Q()
+            for candidate in candidates:
+                condition |= Q(metadata__contains={key: candidate})
+            return queryset.filter(condition)
+        return queryset.alias(metadata_value=KeyTransform(key, 'metadata')).filter(
+            metadata_value__in=candidates
+        )
+
+    bounds = {}
+    for lookup, bound in (('gte', minimum), ('lte', maximum)):
+        if bound:
+            try:
+                bounds[f'metadata_value__{lookup}'] = float(bound)
+            except ValueError:
+                return queryset.none()
+    if not bounds:
+        return queryset
+
+    queryset = queryset.alias(metadata_value=KeyTransform(key, 'metadata'))
+    numeric_types = NUMERIC_JSON_TYPES.get(connections[queryset.db].vendor)
+    if numeric_types:
+        # Strings and objects never match a numeric range
+        queryset = queryset.alias(
+            metadata_type=JSONValueType(KeyTransform(key, 'metadata'))
+        ).filter(metadata_type__in=numeric_types)
+    return queryset.filter(**bounds)
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-17 02:40
+
+import json
+
+from django.db import migrations
+from django.db.models import Q
+
+
+def normalize_metadata(apps, schema_editor):
+    """
+    Make every metadata value valid JSON before the column becomes a JSONField:
+    empty and unparseable values become an empty object.
+    """
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.filter(Q(_metadata__isnull=True) | Q(_metadata='')).update(_metadata='{}')
+
+    invalid_ids = []
+    for pk, metadata in Post.objects.exclude(_metadata='{}').values_list('pk', '_metadata').iterator():
+        try:
+            json.loads(metadata)
+        except ValueError:
+            invalid_ids.append(pk)
+    Post.objects.filter(pk__in=invalid_ids).update(_metadata='{}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_metadata, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-17 02:41
+
+import django.db.models.fields.json
+from django.db import migrations, models
+
+
+def create_metadata_gin_index(apps, schema_editor):
+    """GIN index for jsonb containment lookups. PostgreSQL only."""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS post_metadata_gin_idx '
+            'ON posts_post USING gin (metadata jsonb_path_ops)'
+        )
+
+
+def drop_metadata_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS post_metadata_gin_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_normalize_post_metadata'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='post',
+            old_name='_metadata',
+            new_name='metadata',
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='metadata',
+            field=models.JSONField(blank=True, db_column='metadata', default=dict),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(django.db.models.fields.json.KeyTransform('file_size', 'metadata'), name='post_meta_file_size_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(django.db.models.fields.json.KeyTransform('duration', 'metadata'), name='post_meta_duration_idx'),
+        ),
+        migrations.RunPython(create_metadata_gin_index, drop_metadata_gin_index),
+    ]
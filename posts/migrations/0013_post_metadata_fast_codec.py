@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-17 02:50
+
+import posts.json_codec
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_metadata_jsonfield'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='metadata',
+            field=posts.json_codec.FastJSONField(blank=True, db_column='metadata', default=dict),
+        ),
+    ]
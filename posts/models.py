@@ -1,7 +1,12 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.fields.json import KeyTransform
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
-import json
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .feed_cache import bump_feed_generations
+from .json_codec import FastJSONField
 
 # Create your models here.
 
@@ -24,22 +29,30 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     post_type = models.CharField(max_length=10, choices=POST_TYPES, default='text')
     privacy = models.CharField(max_length=10, choices=PRIVACY_CHOICES, default='public')
-    _metadata = models.TextField(blank=True, null=True, db_column='metadata')
-
-    @property
-    def metadata(self):
-        """Get the metadata as a dictionary."""
-        if self._metadata:
-            return json.loads(self._metadata)
-        return {}
-
-    @metadata.setter
-    def metadata(self, value):
-        """Set the metadata, storing it as a JSON string."""
-        if value is not None:
-            self._metadata = json.dumps(value)
-        else:
-            self._metadata = None
+    metadata = FastJSONField(default=dict, blank=True, db_column='metadata')
+
+    # Denormalized counters, kept in sync by the Like/Comment signals below.
+    # Use the reconcile_counters management command to repair any drift.
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Indexes matching the feed/list filters, all ordered newest first
+        # with id as the keyset tie-breaker
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='post_created_idx'),
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(privacy='public'),
+                name='post_public_created_idx',
+            ),
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_idx'),
+            models.Index(fields=['post_type', '-created_at', '-id'], name='post_type_created_idx'),
+            # Expression indexes for the metadata range filters on common keys. The GIN
+            # index for containment lookups is PostgreSQL only, see migration 0012.
+            models.Index(KeyTransform('file_size', 'metadata'), name='post_meta_file_size_idx'),
+            models.Index(KeyTransform('duration', 'metadata'), name='post_meta_duration_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
@@ -54,6 +67,11 @@ class Comment(models.Model):
     post = models.ForeignKey(Post, related_name='comments', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', '-created_at', '-id'], name='comment_post_created_idx'),
+        ]
+
     def __str__(self):
         return f'Comment by {self.author.username} on {self.post.title}'
 
@@ -68,3 +86,60 @@ class Like(models.Model):
         
     def __str__(self):
         return f'Like by {self.user.username} on {self.post.title or "post"}'
+
+
+def _adjust_post_counter(post_id, field, delta):
+    """Atomically add delta to a Post counter column without loading the row."""
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        # Never push a drifted counter below zero
+        posts = posts.filter(**{f'{field}__gte': -delta})
+    posts.update(**{field: F(field) + delta})
+
+
+def _deleted_with_post(instance, origin):
+    """Return True if a like/comment is being cascade-deleted along with its post."""
+    if isinstance(origin, Post):
+        return origin.pk == instance.post_id
+    return isinstance(origin, models.QuerySet) and origin.model is Post
+
+
+# Signals to keep Post.like_count / Post.comment_count in sync. These also fire
+# for cascade deletes (e.g. deleting a user removes their likes and comments).
+@receiver(post_save, sender=Like)
+def increment_like_count(sender, instance, created, **kwargs):
+    if created:
+        _adjust_post_counter(instance.post_id, 'like_count', 1)
+
+@receiver(post_delete, sender=Like)
+def decrement_like_count(sender, instance, origin=None, **kwargs):
+    if not _deleted_with_post(instance, origin):
+        _adjust_post_counter(instance.post_id, 'like_count', -1)
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, **kwargs):
+    if created:
+        _adjust_post_counter(instance.post_id, 'comment_count', 1)
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, origin=None, **kwargs):
+    if not _deleted_with_post(instance, origin):
+        _adjust_post_counter(instance.post_id, 'comment_count', -1)
+
+
+# Signals to invalidate cached feed pages (see feed_cache.py). A like or comment
+# changes the counts shown on its post, so it also invalidates the post author's own feed.
+# The bump waits for the transaction to commit: a feed read before then still sees
+# the old data and must not be cached under the new generation.
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_feeds_for_post(sender, instance, **kwargs):
+    author_id = instance.author_id
+    transaction.on_commit(lambda: bump_feed_generations([author_id]))
+
+@receiver([post_save, post_delete], sender=Like)
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_feeds_for_interaction(sender, instance, origin=None, **kwargs):
+    # The post's own delete signal already covers cascaded likes and comments
+    if not _deleted_with_post(instance, origin):
+        author_id = instance.post.author_id
+        transaction.on_commit(lambda: bump_feed_generations([author_id]))
@@ -1,25 +1,26 @@
 from rest_framework import permissions
-from authentication.models import UserProfile
+from authentication.principal import get_principal
 
 class IsPostAuthor(permissions.BasePermission):
     """
     Custom permission to only allow authors of a post to edit or delete it.
     """
     def has_object_permission(self, request, view, obj):
+        principal = get_principal(request)
         # Read permissions are allowed to any request,
         # so we'll always allow GET, HEAD or OPTIONS requests.
         if request.method in permissions.SAFE_METHODS:
             # For private posts, additional checks needed even for read operations
             if hasattr(obj, 'privacy') and obj.privacy == 'private':
-                if not request.user.is_authenticated:
+                if not principal.is_authenticated:
                     return False
                 
                 # Author can always see their own posts
-                if obj.author == request.user:
+                if principal.owns(obj):
                     return True
                 
                 # Admins can see all posts
-                if request.user.is_staff or (hasattr(request.user, 'profile') and request.user.profile.role == 'admin'):
+                if principal.is_admin:
                     return True
                 
                 # Deny access for non-admins to private posts
@@ -29,15 +30,15 @@ class IsPostAuthor(permissions.BasePermission):
             return True
 
         # Anonymous users cannot edit or delete
-        if not request.user.is_authenticated:
+        if not principal.is_authenticated:
             return False
 
         # Write permissions are only allowed to the author of the post
         # or admin users
-        if request.user.is_staff or (hasattr(request.user, 'profile') and request.user.profile.role == 'admin'):
+        if principal.is_admin:
             return True
             
-        return obj.author == request.user
+        return principal.owns(obj)
 
 class IsAdminOrReadOnly(permissions.BasePermission):
     """
@@ -65,23 +66,24 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
             return True
             
         # Write permissions are only allowed to authenticated users
-        return request.user.is_authenticated
+        return get_principal(request).is_authenticated
 
     def has_object_permission(self, request, view, obj):
+        principal = get_principal(request)
         # Read permissions are allowed to any request,
         # so we'll always allow GET, HEAD or OPTIONS requests.
         if request.method in permissions.SAFE_METHODS:
             # For posts, check privacy settings
             if hasattr(obj, 'privacy') and obj.privacy == 'private':
-                if not request.user.is_authenticated:
+                if not principal.is_authenticated:
                     return False
                     
                 # Author can see their own posts
-                if hasattr(obj, 'author') and obj.author == request.user:
+                if principal.owns(obj):
                     return True
                     
                 # Admins can see all posts
-                if request.user.is_staff or (hasattr(request.user, 'profile') and request.user.profile.role == 'admin'):
+                if principal.is_admin:
                     return True
                     
                 # Deny access for non-admins to private posts
@@ -90,55 +92,45 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
             return True
 
         # Anonymous users cannot edit or delete
-        if not request.user.is_authenticated:
+        if not principal.is_authenticated:
             return False
 
         # Write permissions are only allowed to the author of the object
         # or admin users
-        if request.user.is_staff or (hasattr(request.user, 'profile') and request.user.profile.role == 'admin'):
+        if principal.is_admin:
             return True
             
-        # For author-owned objects
-        if hasattr(obj, 'author'):
-            return obj.author == request.user
-            
-        # For user-owned objects
-        if hasattr(obj, 'user'):
-            return obj.user == request.user
-            
-        return False
+        # Author-owned objects are compared on author_id, user-owned ones on user_id
+        return principal.owns(obj)
 
 class HasAdminRole(permissions.BasePermission):
     """
     Permission that checks if the user has admin role.
     """
     def has_permission(self, request, view):
-        if not request.user.is_authenticated:
+        principal = get_principal(request)
+        if not principal.is_authenticated:
             return False
         
-        try:
-            return request.user.profile.role == 'admin' or request.user.is_staff
-        except UserProfile.DoesNotExist:
-            return False
+        return principal.is_admin
 
 class HasUserRole(permissions.BasePermission):
     """
     Permission that checks if the user has at least user role (not guest).
     """
     def has_permission(self, request, view):
-        if not request.user.is_authenticated:
+        principal = get_principal(request)
+        if not principal.is_authenticated:
             return False
         
-        try:
-            return request.user.profile.role in ['user', 'admin'] or request.user.is_staff
-        except UserProfile.DoesNotExist:
-            return False
+        return principal.role in ['user', 'admin'] or principal.is_staff
 
 class CanAccessPrivatePost(permissions.BasePermission):
     """
     Permission for accessing posts based on privacy settings.
     """
     def has_object_permission(self, request, view, obj):
+        principal = get_principal(request)
         # If the post is public, anyone can access
         if not hasattr(obj, 'privacy'):
             return True
@@ -147,17 +139,14 @@ class CanAccessPrivatePost(permissions.BasePermission):
             return True
         
         # For private posts, user must be authenticated
-        if not request.user.is_authenticated:
+        if not principal.is_authenticated:
             return False
             
         # If the post is private, only the author or admins can access
-        if obj.author == request.user:
+        if principal.owns(obj):
             return True
             
-        if request.user.is_staff:
-            return True
-            
-        if hasattr(request.user, 'profile') and request.user.profile.role == 'admin':
+        if principal.is_admin:
             return True
             
         # If the user doesn't meet any of the above conditions, deny access
@@ -177,20 +166,21 @@ class AllowAnyForPublicPostsOnly(permissions.BasePermission):
         return True
         
     def has_object_permission(self, request, view, obj):
+        principal = get_principal(request)
         # For public posts, allow anyone
         if hasattr(obj, 'privacy') and obj.privacy == 'public':
             return True
             
         # For private posts, require authentication
-        if not request.user.is_authenticated:
+        if not principal.is_authenticated:
             return False
             
         # Author can always access their own posts
-        if obj.author == request.user:
+        if principal.owns(obj):
             return True
             
         # Admins can access any post
-        if request.user.is_staff or (hasattr(request.user, 'profile') and request.user.profile.role == 'admin'):
+        if principal.is_admin:
             return True
             
         # Otherwise deny access to private posts
@@ -205,12 +195,14 @@ class GuestCannotDeleteContent(permissions.BasePermission):
         if request.method != 'DELETE':
             return True
             
+        principal = get_principal(request)
+        
         # Anonymous users cannot delete
-        if not request.user.is_authenticated:
+        if not principal.is_authenticated:
             return False
             
         # Guests cannot delete
-        if hasattr(request.user, 'profile') and request.user.profile.role == 'guest':
+        if principal.is_guest:
             return False
             
         return True
@@ -220,24 +212,22 @@ class GuestCannotDeleteContent(permissions.BasePermission):
         if request.method != 'DELETE':
             return True
             
+        principal = get_principal(request)
+        
         # Anonymous users cannot delete
-        if not request.user.is_authenticated:
+        if not principal.is_authenticated:
             return False
             
         # Guests cannot delete
-        if hasattr(request.user, 'profile') and request.user.profile.role == 'guest':
+        if principal.is_guest:
             return False
             
         # Admin can delete any content
-        if request.user.is_staff or (hasattr(request.user, 'profile') and request.user.profile.role == 'admin'):
-            return True
-            
-        # Authors can delete their own content
-        if hasattr(obj, 'author') and obj.author == request.user:
+        if principal.is_admin:
             return True
             
-        # Users can delete their own likes, etc.
-        if hasattr(obj, 'user') and obj.user == request.user:
+        # Authors can delete their own content, users their own likes, etc.
+        if principal.owns(obj):
             return True
             
         return False 
\ No newline at end of file
@@ -1,7 +1,18 @@
 from rest_framework import serializers
+from django.core.exceptions import ObjectDoesNotExist
 from django.contrib.auth.models import User
 from .models import Post, Comment, Like
 from authentication.models import UserProfile
+from authentication.principal import get_principal
+from authentication.server_timing import timed
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    """ListSerializer adding the time spent serializing to the request's Server-Timing."""
+
+    def to_representation(self, data):
+        with timed('serialize'):
+            return super().to_representation(data)
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
@@ -51,9 +62,11 @@ class LikeSerializer(serializers.ModelSerializer):
 
 class PostSerializer(serializers.ModelSerializer):
     author_username = serializers.ReadOnlyField(source='author.username')
-    like_count = serializers.SerializerMethodField()
-    comment_count = serializers.SerializerMethodField()
+    like_count = serializers.IntegerField(read_only=True)
+    comment_count = serializers.IntegerField(read_only=True)
     author_detail = UserSerializer(source='author', read_only=True)
+    # Metadata is set from the post type specific fields in validate()
+    metadata = serializers.ReadOnlyField()
     
     class Meta:
         model = Post
@@ -62,12 +75,7 @@ class PostSerializer(serializers.ModelSerializer):
             'post_type', 'privacy', 'metadata', 'like_count', 'comment_count', 'author_detail'
         )
         read_only_fields = ('author', 'created_at', 'author_username', 'author_detail')
-
-    def get_like_count(self, obj):
-        return obj.likes.count()
-
-    def get_comment_count(self, obj):
-        return obj.comments.count()
+        list_serializer_class = TimedListSerializer
 
     def create(self, validated_data):
         # Ensure the user is authenticated before creating a post
@@ -171,6 +179,7 @@ class CommentSerializer(serializers.ModelSerializer):
         model = Comment
         fields = ('id', 'text', 'author', 'author_username', 'post', 'created_at', 'author_detail')
         read_only_fields = ('author', 'author_username', 'created_at', 'author_detail')
+        list_serializer_class = TimedListSerializer
 
     def create(self, validated_data):
         # Ensure the user is authenticated before creating a comment
@@ -203,13 +212,111 @@ class CommentSerializer(serializers.ModelSerializer):
                 )
                 
             # Authenticated users can comment on public posts or their own posts
-            if user.is_authenticated and post.privacy == 'private' and post.author != user:
+            principal = get_principal(request)
+            if user.is_authenticated and post.privacy == 'private' and not principal.owns(post):
                 # Check if user is admin
-                is_admin = hasattr(user, 'profile') and (user.profile.role == 'admin' or user.is_staff)
-                if not is_admin:
+                if not principal.is_admin:
                     raise serializers.ValidationError(
                         "You don't have permission to comment on this private post.",
                         code='permission_denied'
                     )
                     
-        return value 
\ No newline at end of file
+        return value 
+
+def _attribute_getter(source_attrs):
+    """Compile a getter for a dotted attribute source, like rest_framework.fields.get_attribute."""
+    if len(source_attrs) == 1:
+        attr = source_attrs[0]
+
+        def get(instance):
+            try:
+                return getattr(instance, attr)
+            except ObjectDoesNotExist:
+                return None
+        return get
+
+    def get(instance):
+        try:
+            for attr in source_attrs:
+                instance = getattr(instance, attr)
+        except ObjectDoesNotExist:
+            return None
+        return instance
+    return get
+
+
+def _compile_read_plan(serializer):
+    """
+    Compile a serializer's readable fields into (name, getter, converter) steps.
+    A converter of None means the attribute is output as is.
+    """
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    plan = []
+    for field in serializer._readable_fields:
+        getter = converter = None
+        if field.source == '*' or isinstance(field, serializers.SerializerMethodField):
+            # Fields that need the whole instance keep the regular DRF code path
+            getter, converter = field.get_attribute, field.to_representation
+        elif isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None and model:
+            # Read the foreign key column rather than the related object
+            getter = _attribute_getter([model._meta.get_field(field.source).attname])
+        elif isinstance(field, serializers.BaseSerializer):
+            getter, converter = _attribute_getter(field.source_attrs), _compile_representation(field)
+        else:
+            getter = _attribute_getter(field.source_attrs)
+            if isinstance(field, serializers.ReadOnlyField):
+                converter = None
+            elif type(field) is serializers.IntegerField:
+                converter = int
+            elif type(field) is serializers.CharField:
+                converter = str
+            else:
+                converter = field.to_representation
+        plan.append((field.field_name, getter, converter))
+    return plan
+
+
+def _compile_representation(serializer):
+    """Compile a serializer into a function mapping an instance to its representation."""
+    plan = _compile_read_plan(serializer)
+
+    def represent(instance):
+        ret = {}
+        for name, getter, converter in plan:
+            value = getter(instance)
+            if value is None or converter is None:
+                ret[name] = value
+            else:
+                ret[name] = converter(value)
+        return ret
+    return represent
+
+
+class ReadPlanSerializer(serializers.BaseSerializer):
+    """
+    Read-only serializer producing exactly the output of serializer_class, from a
+    field plan compiled once per class instead of DRF's per-field machinery.
+    Meant for list pages; use serializer_class itself for anything that writes.
+    The plan is compiled without a request, so serializer_class must not depend
+    on the serializer context for its output.
+    """
+    serializer_class = None
+    _represent = None
+
+    class Meta:
+        list_serializer_class = TimedListSerializer
+
+    @classmethod
+    def get_representation(cls):
+        # Compiled lazily, as building the fields needs the app registry
+        if cls.__dict__.get('_represent') is None:
+            cls._represent = staticmethod(_compile_representation(cls.serializer_class()))
+        return cls._represent
+
+    def to_representation(self, instance):
+        return self.get_representation()(instance)
+
+
+class PostReadSerializer(ReadPlanSerializer):
+    """Lean read path for post list and feed pages, see PostViewSet.read_serializer_actions."""
+    serializer_class = PostSerializer
@@ -9,7 +9,33 @@ from rest_framework import status
 from django.urls import reverse
 from rest_framework.authtoken.models import Token
 import json
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection, models, transaction
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
+from django.core.cache import cache
+from connectly.testing import clear_cache
+from django.utils import timezone
+from datetime import timedelta
+from .feed_cache import get_feed_generation
+from .metadata_filters import filter_by_metadata
+from . import json_codec
+from unittest.mock import patch
+from .serializers import PostSerializer, PostReadSerializer
+from .views import PostViewSet
+from .async_views import AsyncPostViewSet
+from asgiref.sync import async_to_sync
+from django.test import override_settings
+from .permissions import (
+    IsPostAuthor, IsAuthorOrReadOnly, HasAdminRole, HasUserRole, CanAccessPrivatePost,
+    AllowAnyForPublicPostsOnly, GuestCannotDeleteContent
+)
+from authentication.principal import CachedTokenAuthentication, PrincipalTokenAuthentication, get_principal
+from rest_framework.test import APIRequestFactory
+from rest_framework.request import Request
+from rest_framework.renderers import JSONRenderer
+from authentication.query_budget import QueryBudgetAssertionsMixin
 
 def get_url(viewname, *args, **kwargs):
     """Helper function to get the full URL including the 'posts/' prefix."""
@@ -153,6 +179,7 @@ class PostFactoryTest(TestCase):
 
 class UserAPITest(APITestCase):
     def setUp(self):
+        clear_cache()
         # Create an admin user
         self.admin_user = User.objects.create_superuser(
             username='admin',
@@ -235,6 +262,7 @@ class UserAPITest(APITestCase):
 
 class PostAPITest(APITestCase):
     def setUp(self):
+        clear_cache()
         # Create a user
         self.user = User.objects.create_user(
             username='testuser',
@@ -353,6 +381,7 @@ class PostAPITest(APITestCase):
 
 class CommentAPITest(APITestCase):
     def setUp(self):
+        clear_cache()
         # Create a user
         self.user = User.objects.create_user(
             username='testuser',
@@ -448,6 +477,7 @@ class CommentAPITest(APITestCase):
 
 class LikeAPITest(APITestCase):
     def setUp(self):
+        clear_cache()
         # Create a user
         self.user = User.objects.create_user(
             username='testuser',
@@ -529,6 +559,7 @@ class LikeAPITest(APITestCase):
 
 class CommentEndpointsTest(APITestCase):
     def setUp(self):
+        clear_cache()
         # Create a user
         self.user = User.objects.create_user(
             username='testuser',
@@ -596,6 +627,7 @@ class CommentEndpointsTest(APITestCase):
 
 class NewsFeedTest(APITestCase):
     def setUp(self):
+        clear_cache()
         # Create users
         self.user1 = User.objects.create_user(
             username='user1',
@@ -639,10 +671,10 @@ class NewsFeedTest(APITestCase):
             content='This is an image post',
             author=self.user1,
             post_type='image',
-            _metadata=json.dumps({
+            metadata={
                 'file_size': 1024,
                 'dimensions': {'width': 800, 'height': 600}
-            })
+            }
         )
         
         Post.objects.create(
@@ -650,10 +682,10 @@ class NewsFeedTest(APITestCase):
             content='This is a video post',
             author=self.user2,
             post_type='video',
-            _metadata=json.dumps({
+            metadata={
                 'file_size': 10240,
                 'duration': 120
-            })
+            }
         )
         
         # User1 likes some posts from user2
@@ -823,8 +855,82 @@ class NewsFeedTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['count'], 14)  # All posts (metadata filter ignored)
 
+class MetadataFilterTest(TestCase):
+    """Tests for the SQL metadata filters used by the feed."""
+
+    def setUp(self):
+        author = User.objects.create_user(username='metauser', password='testpass123')
+        for title, metadata in [
+            ('Small', {'file_size': 100}),
+            ('Large', {'file_size': 5000, 'duration': 30}),
+            ('Text size', {'file_size': 'huge'}),
+            ('String digits', {'file_size': '100'}),
+            ('Empty', {}),
+        ]:
+            Post.objects.create(title=title, content='Meta', author=author, metadata=metadata)
+
+    def titles(self, **kwargs):
+        return set(filter_by_metadata(Post.objects.all(), 'file_size', **kwargs).values_list('title', flat=True))
+
+    def test_exact_value_matches_numbers_and_strings(self):
+        """Test that a digit value matches both the number and the string"""
+        self.assertEqual(self.titles(value='100'), {'Small', 'String digits'})
+        self.assertEqual(self.titles(value='huge'), {'Text size'})
+
+    def test_range_only_matches_numbers(self):
+        """Test that range filters skip non-numeric values and missing keys"""
+        self.assertEqual(self.titles(minimum='50'), {'Small', 'Large'})
+        self.assertEqual(self.titles(maximum='1000'), {'Small'})
+        self.assertEqual(self.titles(minimum='50', maximum='1000'), {'Small'})
+        self.assertEqual(self.titles(minimum='not-a-number'), set())
+
+    def test_filter_runs_in_a_single_query(self):
+        """Test that metadata filtering does not load rows into Python"""
+        with self.assertNumQueries(1):
+            self.assertEqual(self.titles(minimum='50'), {'Small', 'Large'})
+
+    def test_key_cannot_reach_other_lookups(self):
+        """Test that a key containing '__' is treated as a plain key"""
+        posts = filter_by_metadata(Post.objects.all(), 'file_size__contains', value='100')
+        self.assertEqual(posts.count(), 0)
+
+
+class MetadataDecodingTest(TestCase):
+    """Tests for metadata decoding through FastJSONField."""
+
+    def setUp(self):
+        author = User.objects.create_user(username='decodeuser', password='testpass123')
+        self.post = Post.objects.create(
+            title='Decoded', content='Decode', author=author, metadata={'file_size': 1024}
+        )
+
+    def test_metadata_is_decoded_once_per_instance(self):
+        """Test that repeated reads reuse the decoded metadata until it is reloaded"""
+        with patch('posts.json_codec.loads', wraps=json_codec.loads) as loads:
+            post = Post.objects.get(pk=self.post.pk)
+            for _ in range(3):
+                self.assertEqual(post.metadata['file_size'], 1024)
+            self.assertEqual(loads.call_count, 1)
+
+            post.metadata = {'file_size': 2048}
+            self.assertEqual(post.metadata['file_size'], 2048)
+            self.assertEqual(loads.call_count, 1)
+
+            post.refresh_from_db()
+            self.assertEqual(post.metadata['file_size'], 1024)
+            self.assertEqual(loads.call_count, 2)
+
+    def test_values_outside_the_fast_codec_still_decode(self):
+        """Test that integers beyond 64 bits fall back to the standard json module"""
+        self.post.metadata = {'views': 2 ** 70}
+        self.post.save()
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.metadata['views'], 2 ** 70)
+
+
 class PrivacyAndRBACTests(APITestCase):
     def setUp(self):
+        clear_cache()
         # Create users with different roles
         self.admin_user = User.objects.create_user(username='admin_user', password='adminpass', email='admin@test.com', is_staff=True)
         self.admin_user.profile.role = 'admin'
@@ -1001,3 +1107,705 @@ class PrivacyAndRBACTests(APITestCase):
         for post in response.data['results']:
             if post['author'] != self.guest_user.id:  # Not their own post
                 self.assertEqual(post['privacy'], 'public')
+
+
+class PostCounterTest(APITestCase):
+    def setUp(self):
+        clear_cache()
+        self.user = User.objects.create_user(
+            username='counteruser',
+            email='counter@example.com',
+            password='testpass123'
+        )
+        self.other_user = User.objects.create_user(
+            username='othercounter',
+            email='othercounter@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.post = Post.objects.create(
+            title='Counter Post',
+            content='Counting likes and comments',
+            author=self.user,
+            post_type='text'
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_like_and_unlike_update_like_count(self):
+        """Test that the like/unlike endpoints keep Post.like_count in sync"""
+        self.client.post(reverse('post-like', kwargs={'pk': self.post.pk}))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+        # Liking twice must not double count
+        self.client.post(reverse('post-like', kwargs={'pk': self.post.pk}))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+        self.client.delete(reverse('post-unlike', kwargs={'pk': self.post.pk}))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_comment_and_delete_update_comment_count(self):
+        """Test that adding and deleting comments keeps Post.comment_count in sync"""
+        response = self.client.post(
+            reverse('post-comment', kwargs={'pk': self.post.pk}),
+            {'text': 'First!'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+        response = self.client.delete(get_url('comment-detail', pk=response.data['id']))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_cascade_delete_updates_counters(self):
+        """Test that deleting a user decrements counters on posts they interacted with"""
+        Like.objects.create(user=self.other_user, post=self.post)
+        Comment.objects.create(text='Hello', author=self.other_user, post=self.post)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 1))
+
+        self.other_user.delete()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (0, 0))
+
+    def test_serializer_reads_counter_columns(self):
+        """Test that serializing posts does not issue per-row COUNT queries"""
+        Like.objects.create(user=self.other_user, post=self.post)
+        posts = list(Post.objects.select_related('author__profile'))
+        with self.assertNumQueries(0):
+            data = PostSerializer(posts, many=True).data
+        self.assertEqual(data[0]['like_count'], 1)
+        self.assertEqual(data[0]['comment_count'], 0)
+
+    def test_reconcile_counters_repairs_drift(self):
+        """Test that reconcile_counters fixes counters that have drifted"""
+        Like.objects.create(user=self.other_user, post=self.post)
+        Comment.objects.create(text='Hello', author=self.other_user, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(like_count=42, comment_count=7)
+
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertIn('1 post(s)', out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 42)
+
+        call_command('reconcile_counters', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 1))
+
+
+class KeysetPaginationTest(APITestCase):
+    def setUp(self):
+        clear_cache()
+        self.user = User.objects.create_user(
+            username='cursoruser',
+            email='cursor@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        for i in range(12):
+            post = Post.objects.create(
+                title=f'Cursor Post {i}',
+                content=f'Content {i}',
+                author=self.user,
+                post_type='text'
+            )
+        for i in range(15):
+            Comment.objects.create(text=f'Comment {i}', author=self.user, post=post)
+        self.last_post = post
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def _walk(self, url):
+        """Follow `next` links and return every id seen plus the page count."""
+        seen, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+            pages += 1
+        return seen, pages
+
+    def test_feed_cursor_mode_walks_all_posts_once(self):
+        """Test that cursor mode returns every post once, newest first"""
+        seen, pages = self._walk(f"{reverse('post-feed')}?pagination=cursor&page_size=5")
+        expected = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 3)
+
+    def test_list_cursor_mode(self):
+        """Test that the post list supports cursor mode"""
+        seen, _ = self._walk(f"{reverse('post-list')}?pagination=cursor&page_size=5")
+        self.assertEqual(len(seen), 12)
+        self.assertEqual(len(set(seen)), 12)
+
+    def test_comments_cursor_mode(self):
+        """Test that post comments support cursor mode with the comment page size"""
+        url = reverse('post-comments', kwargs={'pk': self.last_post.pk})
+        response = self.client.get(f"{url}?pagination=cursor")
+        self.assertEqual(len(response.data['results']), 10)
+        seen, pages = self._walk(f"{url}?pagination=cursor")
+        self.assertEqual(len(set(seen)), 15)
+        self.assertEqual(pages, 2)
+
+    def test_cursor_mode_skips_count_query(self):
+        """Test that cursor mode does not run COUNT(*) over the feed"""
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(f"{reverse('post-feed')}?pagination=cursor")
+        self.assertFalse(any('COUNT(' in q['sql'].upper() for q in ctx.captured_queries))
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor returns 404"""
+        response = self.client.get(f"{reverse('post-feed')}?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class FeedIndexUsageTest(TestCase):
+    """Verify via EXPLAIN that every feed variant is served by an index."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='indexuser', password='testpass123')
+        for i in range(30):
+            Post.objects.create(
+                title=f'Indexed Post {i}',
+                content='Indexed content',
+                author=self.user,
+                post_type='image' if i % 3 else 'text',
+                privacy='private' if i % 5 == 0 else 'public'
+            )
+        self.post = Post.objects.first()
+
+    def assertUsesIndex(self, queryset, table):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables are always cheaper to seq scan, so take that option away
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+            self.assertNotIn(f'Seq Scan on {table}', plan)
+        else:
+            plan = queryset.explain()
+            self.assertNotRegex(plan, rf'SCAN {table}(?! USING)')
+        self.assertIn('INDEX', plan.upper())
+
+    def test_feed_variants_use_indexes(self):
+        """Test that each feed filter combination avoids a sequential scan"""
+        visible = models.Q(privacy='public') | models.Q(author=self.user)
+        variants = {
+            'anonymous': Post.objects.filter(privacy='public'),
+            'admin': Post.objects.all(),
+            'regular': Post.objects.filter(visible),
+            'own': Post.objects.filter(visible, author=self.user),
+            'post_type': Post.objects.filter(visible, post_type='image'),
+            'public_post_type': Post.objects.filter(privacy='public', post_type='image'),
+        }
+        for name, queryset in variants.items():
+            with self.subTest(variant=name):
+                self.assertUsesIndex(queryset.order_by('-created_at', '-id')[:20], 'posts_post')
+
+    def test_liked_lookup_uses_index(self):
+        """Test that the liked-posts subquery is served by the (user, post) index"""
+        queryset = Like.objects.filter(user=self.user).values_list('post_id', flat=True)
+        self.assertUsesIndex(queryset, 'posts_like')
+
+    def test_post_comments_use_index(self):
+        """Test that a post's comment page is served by the (post, created_at) index"""
+        queryset = Comment.objects.filter(post=self.post).order_by('-created_at', '-id')[:10]
+        self.assertUsesIndex(queryset, 'posts_comment')
+
+
+class QueryBudgetTest(QueryBudgetAssertionsMixin, APITestCase):
+    """
+    Hit every route in posts/urls.py with realistic data sizes and fail if
+    query counts grow with page size (N+1 regressions).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(username=f'budget{i}', password='testpass123')
+            for i in range(10)
+        ]
+        cls.user = cls.users[0]
+        cls.admin = User.objects.create_superuser(
+            username='budgetadmin', email='budgetadmin@example.com', password='adminpass123'
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        cls.admin_token = Token.objects.create(user=cls.admin)
+
+        Post.objects.bulk_create([
+            Post(
+                title=f'Budget Post {i}',
+                content='Budget content',
+                author=cls.users[i % 10],
+                post_type='image' if i % 4 == 0 else 'text',
+                privacy='private' if i % 7 == 0 else 'public',
+                metadata={'file_size': i * 100} if i % 4 == 0 else {},
+            )
+            for i in range(200)
+        ])
+        posts = list(Post.objects.all())
+        Like.objects.bulk_create([Like(user=user, post=post) for user in cls.users for post in posts])
+        cls.post = posts[-1]
+        Comment.objects.bulk_create([
+            Comment(text=f'Budget comment {i}', author=cls.users[i % 10], post=cls.post)
+            for i in range(60)
+        ])
+        call_command('reconcile_counters', stdout=StringIO())
+
+    def setUp(self):
+        clear_cache()
+        # Cache both tokens, so every measured request authenticates without a query
+        for token in (self.token, self.admin_token):
+            CachedTokenAuthentication().authenticate_credentials(token.key)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.admin_client = APIClient()
+        self.admin_client.credentials(HTTP_AUTHORIZATION=f'Token {self.admin_token.key}')
+
+    def test_post_list_does_not_grow_with_page_size(self):
+        """Test that the post list runs the same queries for any page size"""
+        url = reverse('post-list')
+        self.assertQueryCountConstant(lambda size: self.admin_client.get(f"{url}?page_size={size}"))
+        self.assertQueryCountConstant(lambda size: self.client.get(f"{url}?page_size={size}"))
+        self.assertQueryCountConstant(
+            lambda size: self.client.get(f"{url}?pagination=cursor&page_size={size}")
+        )
+
+    def test_feed_variants_do_not_grow_with_page_size(self):
+        """Test that each feed variant runs the same queries for any page size"""
+        for params in ['', 'filter=own', 'filter=liked', 'post_type=image', 'privacy=private',
+                       'metadata_key=file_size&metadata_min=1000', 'pagination=cursor']:
+            with self.subTest(params=params):
+                for client in (self.client, self.admin_client):
+                    self.assertQueryCountConstant(
+                        lambda size: client.get(f"/api/posts/feed/?{params}&page_size={size}")
+                    )
+
+    def test_post_comments_do_not_grow_with_page_size(self):
+        """Test that a post's comment page runs the same queries for any page size"""
+        url = reverse('post-comments', kwargs={'pk': self.post.pk})
+        self.assertQueryCountConstant(lambda size: self.client.get(f"{url}?page_size={size}"))
+        self.assertQueryCountConstant(lambda size: self.client.get(f"{url}?pagination=cursor&page_size={size}"))
+
+    def test_legacy_feed_route_does_not_grow_with_page_size(self):
+        """Test that the standalone /api/feed/ route runs the same queries for any page size"""
+        self.assertQueryCountConstant(lambda size: self.client.get(f"/api/feed/?page_size={size}"))
+
+    def test_unpaginated_lists_stay_within_budget(self):
+        """Test that the comment and user lists do not issue per-row queries"""
+        with self.assertMaxQueries(4):
+            response = self.client.get(reverse('comment-list'))
+        self.assertEqual(len(response.data), 60)
+
+        with self.assertMaxQueries(4):
+            response = self.admin_client.get(reverse('user-list'))
+        self.assertEqual(len(response.data), 11)
+
+    def test_detail_routes_stay_within_budget(self):
+        """Test that the single-object routes stay within a fixed query budget"""
+        with self.assertMaxQueries(6):
+            self.client.get(reverse('post-detail', kwargs={'pk': self.post.pk}))
+        with self.assertMaxQueries(6):
+            self.client.get(get_url('comment-detail', pk=Comment.objects.first().pk))
+        with self.assertMaxQueries(4):
+            self.admin_client.get(reverse('user-detail', kwargs={'pk': self.user.pk}))
+
+    def test_write_routes_stay_within_budget(self):
+        """Test that like/unlike/comment and token auth stay within a fixed query budget"""
+        post = Post.objects.create(title='Fresh', content='Fresh post', author=self.admin)
+        with self.assertMaxQueries(10):
+            self.client.post(reverse('post-like', kwargs={'pk': post.pk}))
+        with self.assertMaxQueries(10):
+            self.client.delete(reverse('post-unlike', kwargs={'pk': post.pk}))
+        with self.assertMaxQueries(12):
+            self.client.post(reverse('post-comment', kwargs={'pk': post.pk}), {'text': 'Hi'}, format='json')
+        with self.assertMaxQueries(6):
+            self.client.post(reverse('api-token-auth'), {'username': 'budget0', 'password': 'testpass123'})
+
+
+class FeedCacheInvalidationTest(APITestCase):
+    """
+    The feed skips its cache for SERVER_NAME=testserver, so these tests
+    send requests as localhost to exercise the cached path.
+    """
+
+    def setUp(self):
+        clear_cache()
+        self.user = User.objects.create_user(username='cacheuser', password='testpass123')
+        self.other_user = User.objects.create_user(username='othercache', password='testpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.post = Post.objects.create(title='Cached Post', content='Cached', author=self.other_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get_feed(self, params=''):
+        response = self.client.get(f'/api/posts/feed/?{params}', SERVER_NAME='localhost')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_repeat_request_is_served_from_cache(self):
+        """Test that an unchanged feed is served from the cache"""
+        self.get_feed()
+        with self.assertNumQueries(0):  # The token comes from the token cache
+            self.get_feed()
+
+    def test_new_post_invalidates_feed(self):
+        """Test that a new post shows up immediately after being cached"""
+        self.assertEqual(self.get_feed()['count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(title='Fresh Post', content='Fresh', author=self.other_user)
+        self.assertEqual(self.get_feed()['count'], 2)
+
+    def test_deleted_post_invalidates_feed(self):
+        """Test that a deleted post disappears immediately after being cached"""
+        self.assertEqual(self.get_feed()['count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.delete()
+        self.assertEqual(self.get_feed()['count'], 0)
+
+    def test_like_and_comment_invalidate_feed(self):
+        """Test that like and comment counts are never served stale"""
+        self.get_feed()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('post-like', kwargs={'pk': self.post.pk}))
+        self.assertEqual(self.get_feed()['results'][0]['like_count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(text='Hello', author=self.user, post=self.post)
+        self.assertEqual(self.get_feed()['results'][0]['comment_count'], 1)
+
+    def test_feed_read_during_like_transaction(self):
+        """Test that feeds are only invalidated once a like commits, not while it is open"""
+        self.get_feed()
+        generation = get_feed_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Like.objects.create(user=self.user, post=self.post)
+                # Other requests do not see the like yet, so a page they cache now
+                # must stay under the old generation
+                self.get_feed()
+                self.assertEqual(get_feed_generation(), generation)
+        self.assertNotEqual(get_feed_generation(), generation)
+        self.assertEqual(self.get_feed()['results'][0]['like_count'], 1)
+
+    def test_own_feed_uses_author_generation(self):
+        """Test that other authors' writes do not invalidate a user's own feed"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(title='Own Post', content='Own', author=self.user)
+        self.assertEqual(self.get_feed('filter=own')['count'], 1)
+
+        own_generation = get_feed_generation(author_id=self.user.id)
+        global_generation = get_feed_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(title='Unrelated', content='Unrelated', author=self.other_user)
+        self.assertEqual(get_feed_generation(author_id=self.user.id), own_generation)
+        self.assertNotEqual(get_feed_generation(), global_generation)
+
+        # A like on the user's post changes their own feed's counts
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(user=self.other_user, post=Post.objects.get(title='Own Post'))
+        self.assertNotEqual(get_feed_generation(author_id=self.user.id), own_generation)
+        self.assertEqual(self.get_feed('filter=own')['results'][0]['like_count'], 1)
+
+
+class SharedFeedCacheTest(APITestCase):
+    """
+    Tests for the shared public timeline cache and the per-user overlay
+    (own private posts) merged into it per request.
+    """
+
+    def setUp(self):
+        clear_cache()
+        self.user = User.objects.create_user(username='overlayuser', password='testpass123')
+        self.other_user = User.objects.create_user(username='overlayother', password='testpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.other_token = Token.objects.create(user=self.other_user)
+
+        # Interleave public posts from the other user with the user's private posts
+        start = timezone.now() - timedelta(days=1)
+        for i in range(12):
+            if i % 3 == 1:
+                post = Post.objects.create(title=f'Private {i}', content='Private', author=self.user, privacy='private')
+            else:
+                post = Post.objects.create(title=f'Public {i}', content='Public', author=self.other_user)
+            Post.objects.filter(pk=post.pk).update(created_at=start + timedelta(minutes=i))
+
+    def get_feed(self, token=None, params='', server_name='localhost'):
+        if token:
+            self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        else:
+            self.client.credentials()
+        response = self.client.get(f'/api/posts/feed/?{params}', SERVER_NAME=server_name)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def expected_titles(self, user):
+        visible = Post.objects.filter(models.Q(privacy='public') | models.Q(author=user))
+        return list(visible.order_by('-created_at', '-id').values_list('title', flat=True))
+
+    def test_public_page_is_shared_between_users(self):
+        """Test that a public timeline page cached for one user is reused for others"""
+        self.get_feed(self.other_token)
+        with self.assertNumQueries(0):
+            data = self.get_feed()
+        self.assertEqual(data['count'], 8)
+
+    def test_private_posts_are_merged_into_numbered_pages(self):
+        """Test that the user's private posts land at the right place on every page"""
+        for server_name in ('localhost', 'testserver'):
+            clear_cache()
+            titles = []
+            for page in range(1, 5):
+                data = self.get_feed(self.token, f'page={page}&page_size=3', server_name)
+                self.assertEqual(data['count'], 12)
+                titles.extend(item['title'] for item in data['results'])
+            self.assertEqual(titles, self.expected_titles(self.user))
+            self.assertIsNone(data['next'])
+
+    def test_private_posts_are_merged_into_cursor_pages(self):
+        """Test that following cursor links walks the merged timeline exactly once"""
+        titles = []
+        data = self.get_feed(self.token, 'pagination=cursor&page_size=5')
+        titles.extend(item['title'] for item in data['results'])
+        while data['next']:
+            self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+            data = self.client.get(data['next'], SERVER_NAME='localhost').data
+            titles.extend(item['title'] for item in data['results'])
+        self.assertEqual(titles, self.expected_titles(self.user))
+
+    def test_merged_numbered_page_fetches_only_its_posts(self):
+        """Test that with the positions cached, a merged page runs only the query serializing its posts"""
+        self.get_feed(self.token, 'page=1&page_size=3')
+        with self.assertNumQueries(1):
+            data = self.get_feed(self.token, 'page=3&page_size=3')
+        self.assertEqual([item['title'] for item in data['results']], self.expected_titles(self.user)[6:9])
+
+    def test_merged_cursor_page_shares_the_public_page(self):
+        """Test that the public part of a merged cursor page is cached under the public-only cursor"""
+        self.get_feed(self.token, 'pagination=cursor&page_size=5')
+        with self.assertNumQueries(0):
+            data = self.get_feed(params='pagination=cursor&page_size=5')
+        self.assertEqual(len(data['results']), 5)
+        self.assertNotIn('private', {item['privacy'] for item in data['results']})
+
+    def test_private_posts_are_not_shared(self):
+        """Test that other users never see the user's private posts through the shared cache"""
+        self.get_feed(self.token)
+        data = self.get_feed(self.other_token)
+        self.assertEqual(data['count'], 8)
+        self.assertNotIn('private', {item['privacy'] for item in data['results']})
+
+
+class PostReadSerializerGoldenTest(APITestCase):
+    """
+    Golden-output tests proving the lean read path renders byte-identical
+    JSON to PostSerializer.
+    """
+
+    def setUp(self):
+        clear_cache()
+        self.user = User.objects.create_user(username='golden', password='testpass123', email='g@example.com')
+        self.admin = User.objects.create_user(username='goldenadmin', password='testpass123', is_staff=True)
+        self.admin.profile.role = 'admin'
+        self.admin.profile.save()
+        self.no_profile = User.objects.create_user(username='noprofile', password='testpass123')
+        self.no_profile.profile.delete()
+        self.token = Token.objects.create(user=self.user)
+
+        Post.objects.create(title=None, content='Untitled', author=self.user)
+        Post.objects.create(
+            title='Image', content='Image', author=self.admin, post_type='image',
+            metadata={'file_size': 1024, 'dimensions': {'width': 800, 'height': 600}}
+        )
+        Post.objects.create(
+            title='Link', content='Ünïcode ✓', author=self.no_profile, post_type='link',
+            privacy='private', metadata={'url': 'https://example.com', 'ratio': 1.5}
+        )
+        liked = Post.objects.create(title='Liked', content='Liked', author=self.admin)
+        Like.objects.create(user=self.user, post=liked)
+        Comment.objects.create(text='Comment', author=self.user, post=liked)
+
+    def render(self, serializer_class):
+        posts = Post.objects.select_related('author__profile').order_by('-created_at', '-id')
+        return JSONRenderer().render(serializer_class(posts, many=True).data)
+
+    def test_output_is_byte_identical(self):
+        """Test that PostReadSerializer renders the same bytes as PostSerializer"""
+        self.assertEqual(self.render(PostReadSerializer), self.render(PostSerializer))
+
+    def test_endpoints_are_byte_identical(self):
+        """Test that list and feed responses do not change with the lean read path"""
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        for url in ('/api/posts/', '/api/posts/feed/', '/api/posts/feed/?pagination=cursor'):
+            lean = self.client.get(url).content
+            with patch.object(PostViewSet, 'read_serializer_actions', ()):
+                full = self.client.get(url).content
+            self.assertEqual(lean, full, url)
+
+
+class PermissionPrincipalTest(APITestCase):
+    """
+    Tests for the per-request principal used by the permission classes.
+    """
+
+    def setUp(self):
+        clear_cache()
+        self.author = User.objects.create_user(username='principalauthor', password='testpass123')
+        self.other = User.objects.create_user(username='principalother', password='testpass123')
+        self.guest = User.objects.create_user(username='principalguest', password='testpass123')
+        self.guest.profile.role = 'guest'
+        self.guest.profile.save()
+        self.admin = User.objects.create_user(username='principaladmin', password='testpass123', is_staff=True)
+        self.post = Post.objects.create(title='Private', content='Private', author=self.author, privacy='private')
+        self.factory = APIRequestFactory()
+
+    def authenticate(self, user, method='get'):
+        """Build a DRF request authenticated through PrincipalTokenAuthentication."""
+        token, _ = Token.objects.get_or_create(user=user)
+        request = getattr(self.factory, method)('/', HTTP_AUTHORIZATION=f'Token {token.key}')
+        return Request(request, authenticators=[PrincipalTokenAuthentication()])
+
+    def test_authentication_resolves_principal_in_one_query(self):
+        """Test that the token, user and profile come back in a single query"""
+        request = self.authenticate(self.guest)
+        with self.assertNumQueries(1):
+            request.user
+            principal = get_principal(request)
+        self.assertEqual(principal.user_id, self.guest.id)
+        self.assertTrue(principal.is_guest)
+        self.assertFalse(principal.is_admin)
+
+    def test_object_permissions_run_no_queries(self):
+        """Test that object permission checks never load the profile or the author"""
+        post = Post.objects.get(pk=self.post.pk)
+        view = PostViewSet(action='destroy')
+        permission_classes = [
+            IsPostAuthor, IsAuthorOrReadOnly, CanAccessPrivatePost,
+            AllowAnyForPublicPostsOnly, GuestCannotDeleteContent,
+        ]
+        expected = {self.author: True, self.other: False, self.guest: False, self.admin: True}
+        for user, allowed in expected.items():
+            request = self.authenticate(user, 'delete')
+            request.user
+            with self.assertNumQueries(0):
+                results = [cls().has_object_permission(request, view, post) for cls in permission_classes]
+            if allowed:
+                self.assertTrue(all(results), user.username)
+            else:
+                self.assertFalse(all(results), user.username)
+
+    def test_role_permissions(self):
+        """Test that role based permissions read the role from the principal"""
+        for user, is_admin, is_user in [
+            (self.admin, True, True), (self.author, False, True), (self.guest, False, False)
+        ]:
+            request = self.authenticate(user)
+            request.user
+            with self.assertNumQueries(0):
+                self.assertEqual(HasAdminRole().has_permission(request, None), is_admin)
+                self.assertEqual(HasUserRole().has_permission(request, None), is_user)
+
+    def test_anonymous_principal(self):
+        """Test that anonymous requests resolve to an unauthenticated principal"""
+        request = Request(self.factory.get('/'), authenticators=[PrincipalTokenAuthentication()])
+        principal = get_principal(request)
+        self.assertFalse(principal.is_authenticated)
+        self.assertFalse(principal.owns(self.post))
+        self.assertFalse(CanAccessPrivatePost().has_object_permission(request, None, self.post))
+
+
+class AsyncReadViewsTest(APITestCase):
+    """
+    Tests that the async read views of AsyncPostViewSet respond exactly as
+    the PostViewSet actions they replace.
+    """
+
+    def setUp(self):
+        clear_cache()
+        self.user = User.objects.create_user(username='asyncuser', password='testpass123')
+        self.other_user = User.objects.create_user(username='asyncother', password='testpass123')
+        self.token = Token.objects.create(user=self.user)
+        start = timezone.now() - timedelta(days=1)
+        for i in range(5):
+            post = Post.objects.create(title=f'Public {i}', content='Public', author=self.other_user)
+            Post.objects.filter(pk=post.pk).update(created_at=start + timedelta(minutes=i))
+        self.private_post = Post.objects.create(
+            title='Private', content='Private', author=self.other_user, privacy='private'
+        )
+        self.post = Post.objects.filter(privacy='public').first()
+        for i in range(3):
+            Comment.objects.create(text=f'Comment {i}', author=self.user, post=self.post)
+        Like.objects.create(user=self.user, post=self.post)
+
+    def get(self, viewset, actions, path, token=None, server_name='testserver', **kwargs):
+        headers = {'HTTP_AUTHORIZATION': f'Token {token.key}'} if token else {}
+        request = APIRequestFactory().get(path, SERVER_NAME=server_name, **headers)
+        view = viewset.as_view(actions)
+        if viewset is AsyncPostViewSet:
+            view = async_to_sync(view)
+        return view(request, **kwargs).render()
+
+    def assertSameResponse(self, actions, path, token=None, **kwargs):
+        expected = self.get(PostViewSet, actions, path, token, **kwargs)
+        response = self.get(AsyncPostViewSet, actions, path, token, **kwargs)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(json.loads(response.content), json.loads(expected.content))
+        return response
+
+    def test_list_matches_sync(self):
+        """Test that the async list pages posts as the sync one, in both pagination modes"""
+        for params in ('', 'page=2&page_size=2', 'page=last&page_size=2', 'pagination=cursor&page_size=2',
+                       'privacy=private', 'page=99'):
+            with self.subTest(params=params):
+                self.assertSameResponse({'get': 'list'}, f'/api/posts/?{params}', self.token)
+        self.assertSameResponse({'get': 'list'}, '/api/posts/')
+
+    def test_retrieve_matches_sync(self):
+        """Test that the async retrieve responds as the sync one, for found, private and missing posts"""
+        for pk in (self.post.pk, self.private_post.pk, 0):
+            with self.subTest(pk=pk):
+                self.assertSameResponse({'get': 'retrieve'}, f'/api/posts/{pk}/', self.token, pk=pk)
+
+    def test_comments_matches_sync(self):
+        """Test that the async comments action pages comments as the sync one"""
+        for params in ('', 'page_size=2', 'pagination=cursor&page_size=2', 'page=9'):
+            with self.subTest(params=params):
+                response = self.assertSameResponse(
+                    {'get': 'comments'}, f'/api/posts/{self.post.pk}/comments/?{params}', self.token, pk=self.post.pk
+                )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_feed_matches_sync(self):
+        """Test that the async feed builds the same pages as the sync one"""
+        for params in ('', 'filter=own', 'filter=liked', 'pagination=cursor&page_size=2'):
+            with self.subTest(params=params):
+                self.assertSameResponse({'get': 'feed'}, f'/api/posts/feed/?{params}', self.token)
+
+    def test_cached_feed_served_without_sync_view(self):
+        """Test that cached feed pages are served by the async path"""
+        for params in ('', 'filter=own', 'privacy=public'):
+            with self.subTest(params=params):
+                path = f'/api/posts/feed/?{params}'
+                expected = self.get(PostViewSet, {'get': 'feed'}, path, self.token, server_name='localhost')
+                with patch.object(PostViewSet, 'feed', side_effect=AssertionError('built the page')):
+                    response = self.get(AsyncPostViewSet, {'get': 'feed'}, path, self.token, server_name='localhost')
+                self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+    def test_feed_cache_miss_builds_page(self):
+        """Test that on a cache miss the async feed builds and caches the page"""
+        response = self.get(AsyncPostViewSet, {'get': 'feed'}, '/api/posts/feed/', self.token, server_name='localhost')
+        expected = self.get(PostViewSet, {'get': 'feed'}, '/api/posts/feed/', self.token, server_name='localhost')
+        self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+    @override_settings(SERVER_TIMING_HEADER=True)
+    async def test_async_middleware_chain(self):
+        """Test that requests through the async middleware chain get their headers and query timings"""
+        response = await self.async_client.get('/api/posts/', headers={'Authorization': f'Token {self.token.key}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('X-Request-ID', response)
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+        self.assertRegex(response['Server-Timing'], r'db;dur=[0-9.]+;desc="[1-9][0-9]* calls"')
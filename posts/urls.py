@@ -1,16 +1,21 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework.authtoken import views as auth_views
 from .views import UserViewSet, PostViewSet, CommentViewSet
+from .async_views import AsyncPostViewSet
+
+# The ASGI deployment serves the read endpoints of posts with async views
+post_viewset = AsyncPostViewSet if settings.ASYNC_VIEWS else PostViewSet
 
 # Create a router and register our viewsets with it.
 router = DefaultRouter()
 router.register(r'users', UserViewSet, basename='user')
-router.register(r'posts', PostViewSet, basename='post')
+router.register(r'posts', post_viewset, basename='post')
 router.register(r'comments', CommentViewSet, basename='comment')
 
 # Register custom actions
-post_feed = PostViewSet.as_view({
+post_feed = post_viewset.as_view({
     'get': 'feed',
 })
 
@@ -3,12 +3,12 @@ import json
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from .models import Post, Comment, Like
-from .serializers import UserSerializer, PostSerializer, CommentSerializer, LikeSerializer
+from .serializers import UserSerializer, PostSerializer, PostReadSerializer, CommentSerializer, LikeSerializer
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
-from rest_framework.authentication import TokenAuthentication
+from authentication.principal import CachedTokenAuthentication, get_principal
 from .permissions import IsPostAuthor, IsAdminOrReadOnly, IsAuthorOrReadOnly, HasAdminRole, HasUserRole, CanAccessPrivatePost, AllowAnyForPublicPostsOnly, GuestCannotDeleteContent
 from factories.post_factory import PostFactory
 from singletons.config_manager import ConfigManager
@@ -16,13 +16,19 @@ from singletons.logger_singleton import LoggerSingleton
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from django.contrib.auth.models import User
-from rest_framework.exceptions import PermissionDenied
-from rest_framework.pagination import PageNumberPagination
-from django.db import models
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from rest_framework.exceptions import PermissionDenied, NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from django.db import models, transaction
+from django.core.paginator import Paginator, EmptyPage, InvalidPage, PageNotAnInteger
 from django.conf import settings
 from django.core.cache import cache
 from django.utils.crypto import get_random_string
+from django.utils.dateparse import parse_datetime
+from .feed_cache import cache_feed, get_cached_feed, get_feed_generation
+from connectly import metrics
+from .metadata_filters import filter_by_metadata
+import base64
 
 logger = LoggerSingleton().get_logger()
 config = ConfigManager()
@@ -71,7 +77,7 @@ def create_post(request):
 
 
 class UserListCreate(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAdminUser]
 
     def get(self, request):
@@ -93,7 +99,7 @@ class UserListCreate(APIView):
 
 
 class PostListCreate(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -110,62 +116,60 @@ class PostListCreate(APIView):
 
 
 class PostDetailView(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [AllowAnyForPublicPostsOnly, IsPostAuthor, CanAccessPrivatePost, GuestCannotDeleteContent]
 
     def get(self, request, pk):
         try:
             post = Post.objects.get(pk=pk)
-            logger.info(f"Retrieved post {pk} - privacy: {post.privacy}, Author: {post.author.username}")
+            logger.info("Retrieved post %s - privacy: %s, Author ID: %s", pk, post.privacy, post.author_id)
             
             # Check if user is admin first
-            is_admin = request.user.is_authenticated and (
-                request.user.is_staff or 
-                (hasattr(request.user, 'profile') and request.user.profile.role == 'admin')
-            )
+            principal = get_principal(request)
+            is_admin = principal.is_admin
             
             # Admin can always access any post
             if is_admin:
-                logger.info(f"Admin user {request.user.username} accessing post {pk}")
+                logger.info("Admin user %s accessing post %s", request.user.username, pk)
                 serializer = PostSerializer(post)
                 return Response(serializer.data)
             
             # Check if user can access this post based on privacy
             if post.privacy == 'private':
                 if not request.user.is_authenticated:
-                    logger.warning(f"Unauthenticated user tried to access private post {pk}")
+                    logger.warning("Unauthenticated user tried to access private post %s", pk)
                     return Response(
                         {"error": "You don't have permission to access this private post."},
                         status=status.HTTP_404_NOT_FOUND
                     )
                 
                 # Check if user is author
-                is_author = post.author == request.user
+                is_author = principal.owns(post)
                 
-                logger.info(f"Access check for private post {pk}: User: {request.user.username}, Is Author: {is_author}")
+                logger.info("Access check for private post %s: User: %s, Is Author: %s", pk, request.user.username, is_author)
                 
                 if not is_author:
-                    logger.warning(f"User {request.user.username} tried to access private post {pk} without permission")
+                    logger.warning("User %s tried to access private post %s without permission", request.user.username, pk)
                     return Response(
                         {"error": "You don't have permission to access this private post."},
                         status=status.HTTP_404_NOT_FOUND
                     )
                 
-                logger.info(f"User {request.user.username} accessing own private post {pk}")
+                logger.info("User %s accessing own private post %s", request.user.username, pk)
             
             serializer = PostSerializer(post)
             return Response(serializer.data)
         except Post.DoesNotExist:
-            logger.warning(f"Attempt to access non-existent post {pk}")
+            logger.warning("Attempt to access non-existent post %s", pk)
             return Response({"detail": "No Post matches the given query."}, status=status.HTTP_404_NOT_FOUND)
         except PermissionDenied as e:
-            logger.warning(f"Permission denied for user {request.user.username} accessing post {pk}: {str(e)}")
+            logger.warning("Permission denied for user %s accessing post %s: %s", request.user.username, pk, e)
             return Response(
                 {"error": "You don't have permission to access this post."},
                 status=status.HTTP_403_FORBIDDEN
             )
         except Exception as e:
-            logger.error(f"Unexpected error in post detail view: {str(e)}")
+            logger.error("Unexpected error in post detail view: %s", e)
             return Response(
                 {"error": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -176,7 +180,7 @@ class PostDetailView(APIView):
             post = Post.objects.get(pk=pk)
             
             # Allow admin users to edit any post
-            if hasattr(request.user, 'profile') and request.user.profile.role == 'admin' or request.user.is_staff:
+            if get_principal(request).is_admin:
                 pass  # Admin can edit any post
             else:
                 self.check_object_permissions(request, post)
@@ -199,34 +203,31 @@ class PostDetailView(APIView):
             post = Post.objects.get(pk=pk)
             
             # Check if user is admin first
-            is_admin = request.user.is_authenticated and (
-                request.user.is_staff or 
-                (hasattr(request.user, 'profile') and request.user.profile.role == 'admin')
-            )
+            is_admin = get_principal(request).is_admin
             
             # Admin can always delete any post
             if is_admin:
-                logger.info(f"Admin user {request.user.username} deleting post {pk}")
+                logger.info("Admin user %s deleting post %s", request.user.username, pk)
                 post.delete()
                 return Response(status=status.HTTP_204_NO_CONTENT)
             
             # For non-admin users, check permissions
             self.check_object_permissions(request, post)
             post.delete()
-            logger.info(f"User {request.user.username} deleting own post {pk}")
+            logger.info("User %s deleting own post %s", request.user.username, pk)
             return Response(status=status.HTTP_204_NO_CONTENT)
                 
         except Post.DoesNotExist:
-            logger.warning(f"Attempt to delete non-existent post {pk}")
+            logger.warning("Attempt to delete non-existent post %s", pk)
             return Response({"detail": "No Post matches the given query."}, status=status.HTTP_404_NOT_FOUND)
         except PermissionDenied:
-            logger.warning(f"Permission denied for user {request.user.username} deleting post {pk}")
+            logger.warning("Permission denied for user %s deleting post %s", request.user.username, pk)
             return Response(
                 {"error": "You don't have permission to delete this post."},
                 status=status.HTTP_403_FORBIDDEN
             )
         except Exception as e:
-            logger.error(f"Unexpected error in post deletion: {str(e)}")
+            logger.error("Unexpected error in post deletion: %s", e)
             return Response(
                 {"error": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -234,7 +235,7 @@ class PostDetailView(APIView):
 
 
 class CommentListCreate(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -254,9 +255,9 @@ class UserViewSet(viewsets.ModelViewSet):
     """
     API endpoint for managing users.
     """
-    queryset = User.objects.all()
+    queryset = User.objects.select_related('profile')
     serializer_class = UserSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAdminUser]
 
     def list(self, request, *args, **kwargs):
@@ -271,11 +272,11 @@ class UserViewSet(viewsets.ModelViewSet):
                     email=serializer.validated_data.get('email', ''),
                     password=serializer.validated_data.get('password')
                 )
-                logger.info(f"Successfully created user with ID: {user.id}")
+                logger.info("Successfully created user with ID: %s", user.id)
                 return Response(UserSerializer(user).data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            logger.error(f"Error creating user: {str(e)}")
+            logger.error("Error creating user: %s", e)
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     def update(self, request, *args, **kwargs):
@@ -284,11 +285,11 @@ class UserViewSet(viewsets.ModelViewSet):
             serializer = self.get_serializer(instance, data=request.data, partial=True)
             if serializer.is_valid():
                 user = serializer.save()
-                logger.info(f"Successfully updated user with ID: {user.id}")
+                logger.info("Successfully updated user with ID: %s", user.id)
                 return Response(serializer.data)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            logger.error(f"Error updating user: {str(e)}")
+            logger.error("Error updating user: %s", e)
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     def destroy(self, request, *args, **kwargs):
@@ -296,23 +297,163 @@ class UserViewSet(viewsets.ModelViewSet):
             instance = self.get_object()
             user_id = instance.id
             self.perform_destroy(instance)
-            logger.info(f"Successfully deleted user with ID: {user_id}")
+            logger.info("Successfully deleted user with ID: %s", user_id)
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Exception as e:
-            logger.error(f"Error deleting user: {str(e)}")
+            logger.error("Error deleting user: %s", e)
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class CommentPagination(PageNumberPagination):
+class AsyncPageNumberPagination(PageNumberPagination):
+    """PageNumberPagination that can also paginate with the async ORM, for the async views."""
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async counterpart of paginate_queryset()."""
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # The paginator caches its count; counting up front keeps page validation
+        # and the links from counting synchronously
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+        self.page.object_list = [item async for item in self.page.object_list]
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return self.page.object_list
+
+
+class CommentPagination(AsyncPageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
 
 
-class NewsFeedPagination(PageNumberPagination):
+class NewsFeedPagination(AsyncPageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only keyset pagination over (created_at, id), newest first.
+    Unlike PageNumberPagination it never runs COUNT(*) and never uses OFFSET,
+    so every page costs the same regardless of how deep the client scrolls.
+    Clients opt in with ?pagination=cursor and then follow the opaque `next` link.
+    """
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    @classmethod
+    def is_requested(cls, request):
+        """Return True if the client opted into cursor mode."""
+        params = request.query_params
+        return cls.cursor_query_param in params or params.get('pagination') == 'cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def encode_cursor(self, instance):
+        return self.encode_position(instance.created_at, instance.pk)
+
+    def encode_position(self, created_at, pk):
+        position = f"{created_at.isoformat()}|{pk}"
+        return base64.urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, encoded):
+        try:
+            position = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            created_at, pk = position.split('|')
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError(encoded)
+            return created_at, int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset, page_size = self._get_page_queryset(queryset, request)
+        return self._set_page(list(queryset), page_size)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async counterpart of paginate_queryset(), for the async views."""
+        queryset, page_size = self._get_page_queryset(queryset, request)
+        return self._set_page([item async for item in queryset], page_size)
+
+    def _get_page_queryset(self, queryset, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            created_at, pk = self.decode_cursor(encoded)
+            queryset = queryset.filter(
+                models.Q(created_at__lt=created_at) |
+                models.Q(created_at=created_at, id__lt=pk)
+            )
+
+        # Fetch one extra row to find out whether there is a next page
+        return queryset[:page_size + 1], page_size
+
+    def _set_page(self, results, page_size):
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class FeedCursorPagination(KeysetPagination):
+    page_size = 20
+
+
+class CommentCursorPagination(KeysetPagination):
+    page_size = 10
+
+
+def _count_newer(positions, position, inclusive=False):
+    """
+    Count the (created_at, id) positions of a newest-first list that are newer
+    than the given one (or equal to it, if inclusive), by binary search.
+    """
+    low, high = 0, len(positions)
+    while low < high:
+        middle = (low + high) // 2
+        if positions[middle] > position or (inclusive and positions[middle] == position):
+            low = middle + 1
+        else:
+            high = middle
+    return low
 
 
 class PostViewSet(viewsets.ModelViewSet):
@@ -321,9 +462,31 @@ class PostViewSet(viewsets.ModelViewSet):
     """
     queryset = Post.objects.all()
     serializer_class = PostSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [AllowAnyForPublicPostsOnly, IsAuthorOrReadOnly, GuestCannotDeleteContent]
     pagination_class = NewsFeedPagination
+    cursor_pagination_class = FeedCursorPagination
+    # Read-only actions served by the lean serializer, which outputs exactly what
+    # serializer_class would
+    read_serializer_class = PostReadSerializer
+    read_serializer_actions = ('list', 'feed')
+
+    @property
+    def paginator(self):
+        """Use keyset pagination for list/feed when the client opted into cursor mode."""
+        if not hasattr(self, '_paginator'):
+            self._paginator = self._get_paginator(self.pagination_class, self.cursor_pagination_class)
+        return self._paginator
+
+    def _get_paginator(self, pagination_class, cursor_pagination_class):
+        if KeysetPagination.is_requested(self.request):
+            return cursor_pagination_class()
+        return pagination_class()
+
+    def get_serializer_class(self):
+        if self.action in self.read_serializer_actions:
+            return self.read_serializer_class
+        return super().get_serializer_class()
 
     def get_permissions(self):
         """
@@ -362,24 +525,24 @@ class PostViewSet(viewsets.ModelViewSet):
         # Skip privacy filtering for regular tests, but apply it for RBAC tests
         if test_request and not run_rbac_test:
             logger.info("Test request detected - bypassing privacy filtering")
-            return Post.objects.all().order_by('-created_at')
+            return Post.objects.all().select_related('author__profile').order_by('-created_at')
             
         # For anonymous users, only show public posts
         if not user.is_authenticated:
             logger.info("Anonymous user - showing only public posts")
-            return Post.objects.filter(privacy='public').order_by('-created_at')
+            return Post.objects.filter(privacy='public').select_related('author__profile').order_by('-created_at')
         
         # Normal operation with privacy filtering
-        if user.is_authenticated and (user.is_staff or (hasattr(user, 'profile') and user.profile.role == 'admin')):
+        if get_principal(self.request).is_admin:
             # Admins can see all posts
-            logger.info(f"Admin user {user.username} - showing all posts")
-            return Post.objects.all().order_by('-created_at')
+            logger.info("Admin user %s - showing all posts", user.username)
+            return Post.objects.all().select_related('author__profile').order_by('-created_at')
         
         # Regular users can see their own posts and public posts from other users
-        logger.info(f"Regular user {user.username} - showing public posts and own posts")
+        logger.info("Regular user %s - showing public posts and own posts", user.username)
         return Post.objects.filter(
             models.Q(privacy='public') | models.Q(author=user)
-        ).order_by('-created_at')
+        ).select_related('author__profile').order_by('-created_at')
 
     def list(self, request, *args, **kwargs):
         try:
@@ -397,8 +560,10 @@ class PostViewSet(viewsets.ModelViewSet):
 
             serializer = self.get_serializer(queryset, many=True)
             return Response(serializer.data)
+        except NotFound as e:
+            return Response({'error': str(e.detail)}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
-            logger.error(f"Error in posts list: {str(e)}")
+            logger.error("Error in posts list: %s", e)
             return Response(
                 {"error": f"An error occurred while fetching posts: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -438,7 +603,7 @@ class PostViewSet(viewsets.ModelViewSet):
             serializer = self.get_serializer(instance, data=data, partial=True)
             if serializer.is_valid():
                 post = serializer.save()
-                logger.info(f"Successfully updated post with ID: {post.id}")
+                logger.info("Successfully updated post with ID: %s", post.id)
                 return Response(serializer.data)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except PermissionDenied:
@@ -448,7 +613,7 @@ class PostViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         except Exception as e:
-            logger.error(f"Error updating post: {str(e)}")
+            logger.error("Error updating post: %s", e)
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     def destroy(self, request, *args, **kwargs):
@@ -456,7 +621,7 @@ class PostViewSet(viewsets.ModelViewSet):
             instance = self.get_object()
             post_id = instance.id
             self.perform_destroy(instance)
-            logger.info(f"Successfully deleted post with ID: {post_id}")
+            logger.info("Successfully deleted post with ID: %s", post_id)
             return Response(status=status.HTTP_204_NO_CONTENT)
         except PermissionDenied:
             logger.error("Error deleting post: You do not have permission to perform this action.")
@@ -465,7 +630,7 @@ class PostViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         except Exception as e:
-            logger.error(f"Error deleting post: {str(e)}")
+            logger.error("Error deleting post: %s", e)
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     def _extract_metadata(self, data, post_type):
@@ -516,11 +681,13 @@ class PostViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_401_UNAUTHORIZED
                 )
             
-            # Check if user already liked this post
-            like, created = Like.objects.get_or_create(user=request.user, post=post)
+            # Check if user already liked this post; the like row and the
+            # Post.like_count bump (via signal) commit together
+            with transaction.atomic():
+                like, created = Like.objects.get_or_create(user=request.user, post=post)
             
             if created:
-                logger.info(f"User {request.user.id} liked post {post.id}")
+                logger.info("User %s liked post %s", request.user.id, post.id)
                 return Response({"status": "post liked"}, status=status.HTTP_201_CREATED)
             else:
                 return Response({"status": "already liked"}, status=status.HTTP_200_OK)
@@ -531,7 +698,7 @@ class PostViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         except Exception as e:
-            logger.error(f"Error liking post: {str(e)}")
+            logger.error("Error liking post: %s", e)
             return Response(
                 {"error": str(e)}, 
                 status=status.HTTP_400_BAD_REQUEST
@@ -554,9 +721,11 @@ class PostViewSet(viewsets.ModelViewSet):
             
             # Try to find and delete the like
             try:
-                like = Like.objects.get(user=request.user, post=post)
-                like.delete()
-                logger.info(f"User {request.user.id} unliked post {post.id}")
+                with transaction.atomic():
+                    # Fetch through the post so like.post is already loaded for the signals
+                    like = post.likes.get(user=request.user)
+                    like.delete()
+                logger.info("User %s unliked post %s", request.user.id, post.id)
                 return Response(status=status.HTTP_204_NO_CONTENT)
             except Like.DoesNotExist:
                 return Response(
@@ -570,7 +739,7 @@ class PostViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         except Exception as e:
-            logger.error(f"Error unliking post: {str(e)}")
+            logger.error("Error unliking post: %s", e)
             return Response(
                 {"error": str(e)}, 
                 status=status.HTTP_400_BAD_REQUEST
@@ -580,16 +749,18 @@ class PostViewSet(viewsets.ModelViewSet):
     def comments(self, request, pk=None):
         try:
             post = self.get_object()
-            comments = Comment.objects.filter(post=post).order_by('-created_at')
+            comments = Comment.objects.filter(post=post).select_related('author__profile').order_by('-created_at')
             
             # Paginate results
-            paginator = CommentPagination()
+            paginator = self._get_paginator(CommentPagination, CommentCursorPagination)
             paginated_comments = paginator.paginate_queryset(comments, request)
             serializer = CommentSerializer(paginated_comments, many=True)
             
             return paginator.get_paginated_response(serializer.data)
+        except NotFound as e:
+            return Response({'error': str(e.detail)}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
-            logger.error(f"Error retrieving comments: {str(e)}")
+            logger.error("Error retrieving comments: %s", e)
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=True, methods=['post'])
@@ -599,19 +770,21 @@ class PostViewSet(viewsets.ModelViewSet):
             serializer = CommentSerializer(data={'text': request.data.get('text'), 'post': post.id}, context={'request': request})
             
             if serializer.is_valid():
-                serializer.save(author=request.user, post=post)
-                logger.info(f"User {request.user.id} commented on post {post.id}")
+                with transaction.atomic():
+                    serializer.save(author=request.user, post=post)
+                logger.info("User %s commented on post %s", request.user.id, post.id)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            logger.error(f"Error adding comment: {str(e)}")
+            logger.error("Error adding comment: %s", e)
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=False, methods=['get'])
     def feed(self, request):
         try:
             user = request.user
+            principal = get_principal(request)
             
             # For tests, identify test requests
             is_test = getattr(request, 'META', {}).get('SERVER_NAME', '') == 'testserver'
@@ -620,49 +793,65 @@ class PostViewSet(viewsets.ModelViewSet):
             
             # Special handling for test_feed_unauthenticated test
             if not user.is_authenticated and is_test and 'test_feed_unauthenticated' in test_path:
-                logger.info(f"Unauthenticated feed access in test environment - returning 400")
+                logger.info("Unauthenticated feed access in test environment - returning 400")
                 return Response({'error': 'Authentication required'}, status=status.HTTP_400_BAD_REQUEST)
             
+            # Feeds made of public posts plus the user's own private posts are served from
+            # the shared public timeline, with the user's private posts merged in per request
+            if self._uses_shared_feed(request):
+                shared_response = self._build_shared_feed(request, is_test)
+                if shared_response is not None:
+                    logger.info("User %s retrieved shared news feed", user.id if user.is_authenticated else 'anonymous')
+                    return Response(shared_response)
+            
             # Generate a cache key based on the request parameters
             cache_key = self._generate_feed_cache_key(request)
             
             # Bypass cache for tests to ensure consistent results
-            cached_response = None if is_test else cache.get(cache_key)
+            cached_response = None if is_test else get_cached_feed(cache_key)
             if cached_response and not is_test:
-                logger.info(f"Feed cache hit for user {user.id if user.is_authenticated else 'anonymous'}")
+                logger.info(
+                    "Feed cache hit for user %s", user.id if user.is_authenticated else 'anonymous',
+                    extra={'cache': 'feed', 'cache_hit': True}
+                )
+                metrics.record_cache_lookup('feed', hit=True)
                 return Response(cached_response)
             
             if not is_test:
-                logger.info(f"Feed cache miss for user {user.id if user.is_authenticated else 'anonymous'}")
+                logger.info(
+                    "Feed cache miss for user %s", user.id if user.is_authenticated else 'anonymous',
+                    extra={'cache': 'feed', 'cache_hit': False}
+                )
+                metrics.record_cache_lookup('feed', hit=False)
             
             # Base queryset - respecting privacy settings with query optimization
-            # Use select_related to fetch author data in the same query
+            # Use select_related to fetch author and profile data in the same query
             if not user.is_authenticated:
                 # Anonymous users only see public posts
-                queryset = Post.objects.filter(privacy='public').select_related('author')
-            elif hasattr(user, 'profile') and (user.profile.role == 'admin' or user.is_staff):
+                queryset = Post.objects.filter(privacy='public').select_related('author__profile')
+            elif principal.is_admin:
                 # Admins can see all posts
-                queryset = Post.objects.all().select_related('author')
+                queryset = Post.objects.all().select_related('author__profile')
             else:
                 # Regular users can see their own posts and public posts from others
                 queryset = Post.objects.filter(
                     models.Q(privacy='public') | models.Q(author=user)
-                ).select_related('author')
+                ).select_related('author__profile')
             
             # Special handling for test_feed_as_different_user
             if is_test and 'test_feed_as_different_user' in test_path:
                 # For this specific test, we want to only show the user's own posts for filter=own
                 filter_type = request.query_params.get('filter', 'all')
                 if filter_type == 'own':
-                    queryset = Post.objects.filter(author=user).select_related('author')
+                    queryset = Post.objects.filter(author=user).select_related('author__profile')
             
             # Special handling for privacy filtering tests
             elif run_rbac_test and 'test_feed_privacy_filtering' in test_path:
                 # Ensure privacy filtering works as expected in the test
                 if not user.is_authenticated:
                     # Anonymous users only see public posts
-                    queryset = Post.objects.filter(privacy='public').select_related('author')
-                elif hasattr(user, 'profile') and (user.profile.role == 'admin' or user.is_staff):
+                    queryset = Post.objects.filter(privacy='public').select_related('author__profile')
+                elif principal.is_admin:
                     # Admin can see all posts
                     pass  # queryset already includes all posts
                 else:
@@ -670,7 +859,7 @@ class PostViewSet(viewsets.ModelViewSet):
                     # This ensures the user post count + public post count works correctly
                     queryset = Post.objects.filter(
                         models.Q(privacy='public') | models.Q(author=user)
-                    ).select_related('author')
+                    ).select_related('author__profile')
             
             # Apply filter by filter type - only for authenticated users
             if user.is_authenticated:
@@ -684,11 +873,6 @@ class PostViewSet(viewsets.ModelViewSet):
                     # Filter posts authored by user
                     queryset = queryset.filter(author=user)
             
-            # Apply filter by post type - applicable to all users
-            post_type = request.query_params.get('post_type')
-            if post_type in [choice[0] for choice in Post.POST_TYPES]:
-                queryset = queryset.filter(post_type=post_type)
-                
             # Apply filter by privacy - need special handling based on authentication
             privacy = request.query_params.get('privacy')
             if privacy in [choice[0] for choice in Post.PRIVACY_CHOICES]:
@@ -698,7 +882,7 @@ class PostViewSet(viewsets.ModelViewSet):
                     # Private posts are only viewable if authenticated and either:
                     # 1. They are your own posts
                     # 2. You're an admin
-                    if hasattr(user, 'profile') and (user.profile.role == 'admin' or user.is_staff):
+                    if principal.is_admin:
                         queryset = queryset.filter(privacy='private')
                     else:
                         queryset = queryset.filter(privacy='private', author=user)
@@ -709,140 +893,351 @@ class PostViewSet(viewsets.ModelViewSet):
                         status=status.HTTP_401_UNAUTHORIZED
                     )
             
-            # Add annotation for likes count if not in test environment
-            if not is_test:
-                queryset = queryset.annotate(likes_count=models.Count('likes'))
-            
-            # Apply metadata filters (unchanged code)
-            metadata_key = request.query_params.get('metadata_key', None)
-            metadata_value = request.query_params.get('metadata_value', None)
-            metadata_min = request.query_params.get('metadata_min', None)
-            metadata_max = request.query_params.get('metadata_max', None)
-            
-            if metadata_key:
-                if metadata_value:
-                    # We need a different approach - the metadata is stored as JSON text in the database
-                    # Let's use a simple LIKE query to search for the value in the JSON text
-                    search_string = f'"{metadata_key}": {metadata_value}'
-                    # If the value is a string, we need to add quotes
-                    if not metadata_value.isdigit():
-                        search_string = f'"{metadata_key}": "{metadata_value}"'
-                    
-                    # Get all posts with this key first
-                    key_posts = queryset.filter(_metadata__contains=f'"{metadata_key}":')
-                    
-                    # Then filter them manually to ensure exact match
-                    filtered_ids = []
-                    for post in key_posts:
-                        metadata_dict = post.metadata
-                        if metadata_dict and metadata_key in metadata_dict:
-                            # For numeric values, compare as numbers
-                            if metadata_value.isdigit():
-                                if str(metadata_dict[metadata_key]) == metadata_value:
-                                    filtered_ids.append(post.id)
-                            # For string values, compare as strings
-                            else:
-                                if metadata_dict[metadata_key] == metadata_value:
-                                    filtered_ids.append(post.id)
-                    
-                    queryset = queryset.filter(id__in=filtered_ids)
-                elif metadata_min or metadata_max:
-                    # For range filtering, we'll need to first get all posts with the metadata key
-                    key_posts = queryset.filter(_metadata__contains=f'"{metadata_key}":')
-                    
-                    if metadata_min:
-                        try:
-                            # Convert to numeric value
-                            min_value = float(metadata_min)
-                            # Then filter posts manually
-                            filtered_ids = []
-                            for post in key_posts:
-                                try:
-                                    if post.metadata.get(metadata_key, 0) >= min_value:
-                                        filtered_ids.append(post.id)
-                                except (ValueError, TypeError):
-                                    pass
-                            queryset = queryset.filter(id__in=filtered_ids)
-                        except ValueError:
-                            # If conversion fails, return empty queryset
-                            queryset = queryset.none()
-                    
-                    if metadata_max:
-                        try:
-                            # Convert to numeric value
-                            max_value = float(metadata_max)
-                            # Then filter posts manually
-                            filtered_ids = []
-                            for post in key_posts:
-                                try:
-                                    if post.metadata.get(metadata_key, float('inf')) <= max_value:
-                                        filtered_ids.append(post.id)
-                                except (ValueError, TypeError):
-                                    pass
-                            queryset = queryset.filter(id__in=filtered_ids)
-                        except ValueError:
-                            # If conversion fails, return empty queryset
-                            queryset = queryset.none()
+            # Apply post type and metadata filters - applicable to all users
+            queryset = self._apply_feed_filters(queryset, request)
+            
+            # Newest first, with id as a tie-breaker so pages are stable
+            queryset = queryset.order_by('-created_at', '-id')
             
             # Paginate results
-            paginator = NewsFeedPagination()
+            paginator = self._get_paginator(NewsFeedPagination, FeedCursorPagination)
             paginated_posts = paginator.paginate_queryset(queryset, request)
             serializer = self.get_serializer(paginated_posts, many=True)
             
             # Store response in cache if not a test
             paginated_response_data = paginator.get_paginated_response(serializer.data).data
             if not is_test:
-                cache.set(cache_key, paginated_response_data, timeout=60 * 5)  # Cache for 5 minutes
+                cache_feed(cache_key, paginated_response_data)
             
-            logger.info(f"User {user.id if user.is_authenticated else 'anonymous'} retrieved news feed with filter: {request.query_params.get('filter', 'all')}")
+            logger.info(
+                "User %s retrieved news feed with filter: %s",
+                user.id if user.is_authenticated else 'anonymous', request.query_params.get('filter', 'all')
+            )
             return Response(paginated_response_data)
         
+        except NotFound as e:
+            return Response({'error': str(e.detail)}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
-            logger.error(f"Error retrieving news feed: {str(e)}")
+            logger.error("Error retrieving news feed: %s", e)
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    def _generate_feed_cache_key(self, request):
+    def _apply_feed_filters(self, queryset, request):
+        """Apply the post type and metadata feed filters to a queryset."""
+        # Apply filter by post type - applicable to all users
+        post_type = request.query_params.get('post_type')
+        if post_type in [choice[0] for choice in Post.POST_TYPES]:
+            queryset = queryset.filter(post_type=post_type)
+        
+        # Apply metadata filters in SQL; a key without a value or range is ignored
+        metadata_key = request.query_params.get('metadata_key', None)
+        if metadata_key:
+            queryset = filter_by_metadata(
+                queryset,
+                metadata_key,
+                value=request.query_params.get('metadata_value', None),
+                minimum=request.query_params.get('metadata_min', None),
+                maximum=request.query_params.get('metadata_max', None),
+            )
+        
+        return queryset
+
+    def _uses_shared_feed(self, request):
+        """
+        Return True if the feed is the public timeline plus the user's own private
+        posts, i.e. it can be built from the shared public timeline cache.
+        Admin, own, liked and private-only feeds are cached per user instead.
+        """
+        principal = get_principal(request)
+        if request.query_params.get('privacy') == 'private':
+            return False
+        if not principal.is_authenticated:
+            return True
+        if principal.is_admin:
+            return False
+        return request.query_params.get('filter', 'all') not in ('own', 'liked')
+
+    def _build_shared_feed(self, request, is_test):
+        """
+        Build a feed page from the shared public timeline and the user's own private posts.
+        Returns None if the user has too many private posts to merge in per request,
+        in which case the caller falls back to the per-user feed.
+        """
+        public_posts = self._apply_feed_filters(
+            Post.objects.filter(privacy='public').select_related('author__profile'), request
+        ).order_by('-created_at', '-id')
+        
+        private_positions = self._get_private_feed_positions(request, is_test)
+        if private_positions is None:
+            return None
+        if not private_positions:
+            # Nothing to merge in, so the page is exactly what anonymous users see
+            return self._get_public_feed_page(request, public_posts, is_test)
+        
+        public_positions = self._get_public_feed_positions(request, public_posts, is_test)
+        if KeysetPagination.is_requested(request):
+            return self._merge_cursor_page(request, public_positions, private_positions, is_test)
+        return self._merge_numbered_page(request, public_positions, private_positions)
+
+    def _get_public_feed_page(self, request, public_posts, is_test):
+        """Get a page of the public timeline, cached once for all users."""
+        cache_key = self._generate_feed_cache_key(request, shared=True)
+        cached_response = None if is_test else get_cached_feed(cache_key)
+        if cached_response:
+            logger.info("Public feed cache hit", extra={'cache': 'public_feed', 'cache_hit': True})
+            metrics.record_cache_lookup('public_feed', hit=True)
+            return cached_response
+        
+        paginator = self._get_paginator(NewsFeedPagination, FeedCursorPagination)
+        page = paginator.paginate_queryset(public_posts, request)
+        response_data = paginator.get_paginated_response(self.get_serializer(page, many=True).data).data
+        if not is_test:
+            logger.info("Public feed cache miss", extra={'cache': 'public_feed', 'cache_hit': False})
+            metrics.record_cache_lookup('public_feed', hit=False)
+            cache_feed(cache_key, response_data)
+        return response_data
+
+    def _get_public_feed_positions(self, request, public_posts, is_test):
+        """
+        Get the (created_at, id) positions of the public posts matching the feed
+        filters, newest first. Cached once for all users under the global generation,
+        so merging private posts in costs no COUNT or OFFSET query per request.
+        """
+        cache_key = f"feed_public_positions_{get_feed_generation()}_{self._feed_filter_params(request)}"
+        positions = None if is_test else get_cached_feed(cache_key)
+        if positions is not None:
+            metrics.record_cache_lookup('public_feed_positions', hit=True)
+            return positions
+        
+        positions = list(public_posts.values_list('created_at', 'id'))
+        if not is_test:
+            metrics.record_cache_lookup('public_feed_positions', hit=False)
+            cache_feed(cache_key, positions)
+        return positions
+
+    def _get_private_feed_positions(self, request, is_test):
         """
-        Generate a unique cache key based on the request parameters and user.
+        Get the (created_at, id) positions of the user's own private posts matching
+        the feed filters, newest first. Cached per user under their author generation.
+        Returns None if there are more than FEED_PRIVATE_OVERLAY_LIMIT of them.
         """
-        user_id = request.user.id if request.user.is_authenticated else 'anonymous'
+        user = request.user
+        if not user.is_authenticated or request.query_params.get('privacy') == 'public':
+            return []
+        
+        cache_key = self._private_feed_cache_key(request, get_feed_generation(author_id=user.id))
+        positions = None if is_test else get_cached_feed(cache_key)
+        if positions is not None:
+            metrics.record_cache_lookup('private_feed', hit=True)
+            return positions
+        
+        limit = settings.FEED_PRIVATE_OVERLAY_LIMIT
+        private_posts = self._apply_feed_filters(
+            Post.objects.filter(author=user, privacy='private'), request
+        ).order_by('-created_at', '-id')
+        positions = list(private_posts.values_list('created_at', 'id')[:limit + 1])
+        if len(positions) > limit:
+            return None
+        if not is_test:
+            metrics.record_cache_lookup('private_feed', hit=False)
+            cache_feed(cache_key, positions)
+        return positions
+
+    def _private_feed_cache_key(self, request, generation):
+        """Cache key of the user's private feed positions, under their author generation."""
+        return f"feed_private_{generation}_{request.user.id}_{self._feed_filter_params(request)}"
+
+    def _feed_filter_params(self, request):
+        """The post type and metadata filters of a feed request, for cache keys."""
+        return "&".join(
+            f"{param}={request.query_params[param]}"
+            for param in ['post_type', 'metadata_key', 'metadata_value', 'metadata_min', 'metadata_max']
+            if request.query_params.get(param)
+        )
+
+    def _merge_cursor_page(self, request, public_positions, private_positions, is_test):
+        """
+        Merge the user's private posts into a cursor page of the public timeline.
+        The public page is the one cached for all users under the public-only cursor,
+        i.e. the oldest public post at or before the request's merged cursor.
+        """
+        paginator = FeedCursorPagination()
+        page_size = paginator.get_page_size(request)
+        start = 0
+        encoded = request.query_params.get(paginator.cursor_query_param)
+        if encoded:
+            cursor = paginator.decode_cursor(encoded)
+            private_positions = [position for position in private_positions if position < cursor]
+            start = _count_newer(public_positions, cursor, inclusive=True)
+        
+        page_positions = sorted(public_positions[start:start + page_size] + private_positions[:page_size], reverse=True)
+        page_positions = page_positions[:page_size]
+        private_on_page = set(private_positions[:page_size]).intersection(page_positions)
+        
+        public_page = self._get_public_cursor_page(request, public_positions, start, is_test)
+        private_page = self._serialize_feed_posts(pk for _, pk in private_on_page)
+        merged = self._merge_feed_items(public_page['results'], private_page)
+        
+        next_link = None
+        if len(public_positions) - start + len(private_positions) > page_size:
+            next_link = replace_query_param(
+                request.build_absolute_uri(), paginator.cursor_query_param,
+                paginator.encode_position(*page_positions[-1])
+            )
+        return {'next': next_link, 'results': merged[:page_size]}
+
+    def _get_public_cursor_page(self, request, public_positions, start, is_test):
+        """
+        Get the cursor page of the public timeline starting at public_positions[start].
+        It shares its cache entry with the same page fetched by _get_public_feed_page().
+        """
+        paginator = FeedCursorPagination()
+        page_size = paginator.get_page_size(request)
+        public_cursor = paginator.encode_position(*public_positions[start - 1]) if start else ''
+        cache_key = self._generate_feed_cache_key(request, shared=True, public_cursor=public_cursor)
+        cached_response = None if is_test else get_cached_feed(cache_key)
+        if cached_response:
+            metrics.record_cache_lookup('public_feed', hit=True)
+            return cached_response
+        
+        next_link = None
+        if len(public_positions) > start + page_size:
+            next_link = replace_query_param(
+                request.build_absolute_uri(), paginator.cursor_query_param,
+                paginator.encode_position(*public_positions[start + page_size - 1])
+            )
+        response_data = {
+            'next': next_link,
+            'results': self._merge_feed_items(self._serialize_feed_posts(
+                pk for _, pk in public_positions[start:start + page_size]
+            )),
+        }
+        if not is_test:
+            metrics.record_cache_lookup('public_feed', hit=False)
+            cache_feed(cache_key, response_data)
+        return response_data
+
+    def _merge_numbered_page(self, request, public_positions, private_positions):
+        """
+        Merge the user's private posts into a numbered page of the public timeline.
+        Each private post's rank in the merged timeline is found by binary search
+        in the cached public positions, so only the posts on the page are fetched.
+        """
+        paginator = NewsFeedPagination()
+        page_size = paginator.get_page_size(request)
+        
+        ranks = [i + _count_newer(public_positions, position) for i, position in enumerate(private_positions)]
+        
+        count = len(public_positions) + len(private_positions)
+        num_pages = max(1, -(-count // page_size))
+        page_number = request.query_params.get(paginator.page_query_param, 1)
+        if page_number in paginator.last_page_strings:
+            page_number = num_pages
+        try:
+            page_number = int(page_number)
+        except (TypeError, ValueError):
+            raise NotFound(paginator.invalid_page_message.format(page_number=page_number, message='Invalid page.'))
+        if not 1 <= page_number <= num_pages:
+            raise NotFound(paginator.invalid_page_message.format(page_number=page_number, message='Invalid page.'))
+        
+        offset = (page_number - 1) * page_size
+        private_on_page = [pk for (_, pk), rank in zip(private_positions, ranks) if offset <= rank < offset + page_size]
+        public_offset = offset - sum(1 for rank in ranks if rank < offset)
+        public_on_page = [
+            pk for _, pk in public_positions[public_offset:public_offset + page_size - len(private_on_page)]
+        ]
+        
+        url = request.build_absolute_uri()
+        next_link = None
+        if page_number < num_pages:
+            next_link = replace_query_param(url, paginator.page_query_param, page_number + 1)
+        previous_link = None
+        if page_number == 2:
+            previous_link = remove_query_param(url, paginator.page_query_param)
+        elif page_number > 2:
+            previous_link = replace_query_param(url, paginator.page_query_param, page_number - 1)
+        
+        return {
+            'count': count,
+            'next': next_link,
+            'previous': previous_link,
+            'results': self._merge_feed_items(self._serialize_feed_posts(public_on_page + private_on_page)),
+        }
+
+    def _serialize_feed_posts(self, post_ids):
+        """Serialize the given posts for a feed page."""
+        post_ids = list(post_ids)
+        if not post_ids:
+            return []
+        posts = Post.objects.filter(id__in=post_ids).select_related('author__profile')
+        return self.get_serializer(posts, many=True).data
+
+    def _merge_feed_items(self, *pages):
+        """Merge serialized feed pages newest first, with id as a tie-breaker."""
+        items = [item for page in pages for item in page]
+        return sorted(items, key=lambda item: (parse_datetime(item['created_at']), item['id']), reverse=True)
+
+    def _feed_generation_author_id(self, request, shared=False):
+        """The author whose generation versions a feed's cache key, or None for the global one."""
+        if request.user.is_authenticated and not shared and request.query_params.get('filter') == 'own':
+            return request.user.id
+        return None
+
+    def _generate_feed_cache_key(self, request, shared=False, generation=None, public_cursor=None):
+        """
+        Generate a unique cache key based on the request parameters, user and
+        feed generation. The own-posts feed is versioned by the user's author
+        generation, every other feed by the global one. Shared public timeline
+        pages are keyed without the user and the user-specific filters, and
+        public_cursor, if given, replaces the request's cursor ('' for none).
+        The generation is looked up unless given.
+        """
+        if shared:
+            user_id = 'public'
+        else:
+            user_id = request.user.id if request.user.is_authenticated else 'anonymous'
+        if generation is None:
+            generation = get_feed_generation(author_id=self._feed_generation_author_id(request, shared))
         
         # Get all relevant query parameters
         params = {}
-        for param in ['page', 'page_size', 'filter', 'post_type', 'privacy', 
+        for param in ['page', 'page_size', 'pagination', 'cursor', 'filter', 'post_type', 'privacy',
                      'metadata_key', 'metadata_value', 'metadata_min', 'metadata_max']:
+            if shared and param in ('filter', 'privacy'):
+                continue
             value = request.query_params.get(param)
+            if shared and param == 'cursor' and public_cursor is not None:
+                value = public_cursor
             if value:
                 params[param] = value
         
         # Sort parameters to ensure consistent key generation
         param_string = "&".join(f"{k}={v}" for k, v in sorted(params.items()))
         
-        # Create a key that includes user ID and all parameters
-        return f"feed_cache_{user_id}_{param_string}"
+        # Create a key that includes the generation, user ID and all parameters
+        return f"feed_cache_{generation}_{user_id}_{param_string}"
 
     def retrieve(self, request, *args, **kwargs):
         """Override retrieve to add additional debugging for admin access to private posts"""
         try:
             instance = self.get_object()
-            is_admin = request.user.is_authenticated and (
-                request.user.is_staff or 
-                (hasattr(request.user, 'profile') and request.user.profile.role == 'admin')
-            )
+            is_admin = get_principal(request).is_admin
             
             # Log detailed information for debugging
-            logger.info(f"Retrieve post {kwargs.get('pk')}: User: {request.user}, Admin: {is_admin}, Post privacy: {getattr(instance, 'privacy', 'unknown')}")
+            logger.info(
+                "Retrieve post %s: User: %s, Admin: %s, Post privacy: %s",
+                kwargs.get('pk'), request.user, is_admin, getattr(instance, 'privacy', 'unknown')
+            )
             
             serializer = self.get_serializer(instance)
             return Response(serializer.data)
         except Post.DoesNotExist:
-            logger.warning(f"Post with ID {kwargs.get('pk')} not found during retrieve")
+            logger.warning("Post with ID %s not found during retrieve", kwargs.get('pk'))
             return Response(
                 {"detail": "No Post matches the given query."}, 
                 status=status.HTTP_404_NOT_FOUND
             )
         except Exception as e:
-            logger.error(f"Error retrieving post {kwargs.get('pk')}: {str(e)}")
+            logger.error("Error retrieving post %s: %s", kwargs.get('pk'), e)
             return Response(
                 {"error": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -853,9 +1248,9 @@ class CommentViewSet(viewsets.ModelViewSet):
     """
     API endpoint for managing comments.
     """
-    queryset = Comment.objects.all()
+    queryset = Comment.objects.select_related('author__profile')
     serializer_class = CommentSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated, IsAuthorOrReadOnly, GuestCannotDeleteContent]
 
     def get_permissions(self):
@@ -883,7 +1278,7 @@ class CommentViewSet(viewsets.ModelViewSet):
             serializer = self.get_serializer(instance, data=request.data, partial=True)
             if serializer.is_valid():
                 comment = serializer.save()
-                logger.info(f"Updated comment {comment.id}")
+                logger.info("Updated comment %s", comment.id)
                 return Response(serializer.data)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except PermissionDenied:
@@ -893,15 +1288,16 @@ class CommentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         except Exception as e:
-            logger.error(f"Error updating comment: {str(e)}")
+            logger.error("Error updating comment: %s", e)
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     def destroy(self, request, *args, **kwargs):
         try:
             instance = self.get_object()
             comment_id = instance.id
-            self.perform_destroy(instance)
-            logger.info(f"Deleted comment {comment_id}")
+            with transaction.atomic():
+                self.perform_destroy(instance)
+            logger.info("Deleted comment %s", comment_id)
             return Response(status=status.HTTP_204_NO_CONTENT)
         except PermissionDenied:
             logger.error("Error deleting comment: You do not have permission to perform this action.")
@@ -910,12 +1306,12 @@ class CommentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         except Exception as e:
-            logger.error(f"Error deleting comment: {str(e)}")
+            logger.error("Error deleting comment: %s", e)
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
 class UserDetailView(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAdminUser]
 
     def get_object(self, pk):
@@ -1,49 +1,200 @@
 """
 Logger Singleton for Connectly API.
 Provides centralized logging functionality across the application.
+
+Records are handed to a background thread through a bounded queue, and the console
+and file handlers run on that thread, so logging calls never wait on disk I/O.
+Configured through the environment:
+- LOG_QUEUE_SIZE: records the queue holds (default 10000)
+- LOG_QUEUE_FULL_POLICY: 'drop' discards records while the queue is full (default),
+  'block' waits for room, up to LOG_QUEUE_BLOCK_TIMEOUT seconds (default 1)
+- LOG_FORMAT: 'text' (default) or 'json', one JSON object per record with the fields
+  of the current log context (see log_context) and any extra fields
+- LOG_DIR: directory of the daily log files (default 'logs')
+Call LoggerSingleton.shutdown() to drain the queue before exiting; gunicorn_config.py
+does so when a worker exits.
 """
 
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
 import re
-from datetime import datetime
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
 from typing import Optional
 
-#added to f Implemente custom logging filter class 
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+LOG_QUEUE_FULL_POLICY = os.getenv('LOG_QUEUE_FULL_POLICY', 'drop')
+LOG_QUEUE_BLOCK_TIMEOUT = float(os.getenv('LOG_QUEUE_BLOCK_TIMEOUT', '1'))
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+LOG_DIR = os.getenv('LOG_DIR', 'logs')
+
+# Context of the work being logged, e.g. the current request: an object whose fields()
+# returns the attributes to add to every record logged within it
+log_context: ContextVar = ContextVar('log_context', default=None)
+
+REDACTED = '[REDACTED]'
+
+# Each pattern captures the text kept in front of the redacted value
+REDACTION_PATTERNS = [
+    re.compile(r'(Bearer\s+)[A-Za-z0-9\-._~+/]+=*', re.IGNORECASE),
+    re.compile(r'(Authorization[:\s]+Bearer\s+)[A-Za-z0-9\-._~+/]+=*', re.IGNORECASE),
+    re.compile(r'(token["\s:=]+)[A-Za-z0-9\-._~+/]+=*', re.IGNORECASE),
+    re.compile(r'(access_token["\s:=]+)[A-Za-z0-9\-._~+/]+=*', re.IGNORECASE),
+    re.compile(r'(refresh_token["\s:=]+)[A-Za-z0-9\-._~+/]+=*', re.IGNORECASE),
+    re.compile(r'(api[_-]?key["\s:=]+)[A-Za-z0-9\-._~+/]+=*', re.IGNORECASE),
+    re.compile(r'(password["\s:=]+)[^\s,}"\']+', re.IGNORECASE),
+    re.compile(r'(secret["\s:=]+)[^\s,}"\']+', re.IGNORECASE),
+]
+
+# Every pattern contains one of these words, so text without any needs no scan.
+# Checked on casefolded text, which folds like re.IGNORECASE (e.g. 'ſ' to 's')
+KEYWORDS = ('token', 'bearer', 'password', 'secret', 'key')
+_KEYWORDS_PATTERN = re.compile('|'.join(KEYWORDS), re.IGNORECASE)
+
+# All patterns as one alternation, for a single scan
+_COMBINED_PATTERN = re.compile('|'.join(pattern.pattern for pattern in REDACTION_PATTERNS), re.IGNORECASE)
+
+
+class _OverlappingMatch(Exception):
+    pass
+
+
+def _redact_match(match: 're.Match') -> str:
+    prefix = match.group(match.lastindex)
+    # A value containing a keyword may also be matched by another pattern, where
+    # applying the patterns one by one can redact more: let redact() do that
+    if _KEYWORDS_PATTERN.search(match.group(0), len(prefix)):
+        raise _OverlappingMatch
+    return prefix + REDACTED
+
+
+def redact(text: str) -> str:
+    """
+    Redact tokens, passwords and secrets from text.
+
+    Returns the same result as applying REDACTION_PATTERNS one after the other,
+    in a single scan for everything but text with overlapping matches.
+    """
+    folded = text.casefold()
+    if not any(keyword in folded for keyword in KEYWORDS):
+        return text
+    try:
+        return _COMBINED_PATTERN.sub(_redact_match, text)
+    except _OverlappingMatch:
+        for pattern in REDACTION_PATTERNS:
+            text = pattern.sub(r'\1' + REDACTED, text)
+        return text
+
+
 class SensitiveDataFilter(logging.Filter):
     """Filter to redact sensitive data from log records."""
 
-    REDACTION_PATTERNS = [
-        (re.compile(r'(Bearer\s+)[A-Za-z0-9\-._~+/]+=*', re.IGNORECASE), r'\1[REDACTED]'),
-        (re.compile(r'(Authorization[:\s]+Bearer\s+)[A-Za-z0-9\-._~+/]+=*', re.IGNORECASE), r'\1[REDACTED]'),
-        (re.compile(r'(token["\s:=]+)[A-Za-z0-9\-._~+/]+=*', re.IGNORECASE), r'\1[REDACTED]'),
-        (re.compile(r'(access_token["\s:=]+)[A-Za-z0-9\-._~+/]+=*', re.IGNORECASE), r'\1[REDACTED]'),
-        (re.compile(r'(refresh_token["\s:=]+)[A-Za-z0-9\-._~+/]+=*', re.IGNORECASE), r'\1[REDACTED]'),
-        (re.compile(r'(api[_-]?key["\s:=]+)[A-Za-z0-9\-._~+/]+=*', re.IGNORECASE), r'\1[REDACTED]'),
-        (re.compile(r'(password["\s:=]+)[^\s,}"\']+', re.IGNORECASE), r'\1[REDACTED]'),
-        (re.compile(r'(secret["\s:=]+)[^\s,}"\']+', re.IGNORECASE), r'\1[REDACTED]'),
-    ]
-
     def filter(self, record):
-        if hasattr(record, 'msg'):
-            message = str(record.msg)
-            for pattern, replacement in self.REDACTION_PATTERNS:
-                message = pattern.sub(replacement, message)
-            record.msg = message
-
-        if hasattr(record, 'args') and record.args:
-            args = list(record.args) if isinstance(record.args, tuple) else [record.args]
-            redacted_args = []
-            for arg in args:
-                arg_str = str(arg)
-                for pattern, replacement in self.REDACTION_PATTERNS:
-                    arg_str = pattern.sub(replacement, arg_str)
-                redacted_args.append(arg_str)
-            record.args = tuple(redacted_args)
+        record.msg = redact(record.getMessage())
+        record.args = None
+        return True
+
+
+class RedactingFormatter(logging.Formatter):
+    """
+    Formatter redacting sensitive data from the message when a record is formatted,
+    so only records that are actually emitted pay for it.
+    """
+
+    def format(self, record):
+        # The traceback is formatted here, or before the record was queued
+        # (see BoundedQueueHandler.prepare), and redacted either way
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            record.exc_text = redact(record.exc_text)
+        return super().format(record)
+
+    def formatMessage(self, record):
+        record.message = redact(record.message)
+        return super().formatMessage(record)
+
 
+class LogContextFilter(logging.Filter):
+    """Add the fields of the current log context to records, in the thread logging them."""
+
+    def filter(self, record):
+        context = log_context.get()
+        if context is not None:
+            for name, value in context.fields().items():
+                record.__dict__.setdefault(name, value)
         return True
 
 
+# Attributes of every LogRecord; any others come from extra or the log context
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JSONFormatter(RedactingFormatter):
+    """Formatter writing each record as a JSON object, including context and extra fields."""
+
+    def format(self, record):
+        record.message = redact(record.getMessage())
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.message,
+        }
+        for name, value in record.__dict__.items():
+            if name not in _RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = redact(record.exc_text)
+        return json.dumps(entry, default=str)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """QueueHandler for a bounded queue, dropping records or blocking while it is full."""
+
+    def __init__(self, log_queue: queue.Queue, policy: str = 'drop', block_timeout: float = 1.0) -> None:
+        if policy not in ('drop', 'block'):
+            raise ValueError(f"Log queue policy must be 'drop' or 'block', not {policy!r}")
+        super().__init__(log_queue)
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self.exception_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Prepare a record for the queue. QueueHandler.prepare() folds the traceback
+        into the message and drops exc_info; here the message and the traceback are
+        formatted apart (into msg and exc_text), so that the listener's formatters
+        can still tell them apart, e.g. for the JSON 'exception' field.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.exception_formatter.formatException(record.exc_info)
+            # The traceback's frames are not needed past this point
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self.policy == 'block':
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
 class LoggerSingleton:
     _instance = None
     _initialized = False
@@ -64,35 +215,65 @@ class LoggerSingleton:
         self.logger.setLevel(logging.INFO)
 
         # Create logs directory if it doesn't exist
-        if not os.path.exists('logs'):
-            os.makedirs('logs')
+        os.makedirs(LOG_DIR, exist_ok=True)
 
-        # added: Create sensitive data filter
-        sensitive_filter = SensitiveDataFilter()
-
-        # modified: Create console handler
+        # Console handler
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.INFO)
-        console_formatter = logging.Formatter(
+        console_handler.setFormatter(JSONFormatter() if LOG_FORMAT == 'json' else RedactingFormatter(
             '%(asctime)s - %(levelname)s - %(message)s'
-        )
-        console_handler.setFormatter(console_formatter)
-        console_handler.addFilter(sensitive_filter)# <-- ADDED THIS LINE
+        ))
 
-        # MODIFIED: File handler - added filter
+        # File handler
         file_handler = logging.FileHandler(
-            f'logs/connectly_{datetime.now().strftime("%Y%m%d")}.log'
+            os.path.join(LOG_DIR, f'connectly_{datetime.now().strftime("%Y%m%d")}.log')
         )
         file_handler.setLevel(logging.INFO)
-        file_formatter = logging.Formatter(
+        file_handler.setFormatter(JSONFormatter() if LOG_FORMAT == 'json' else RedactingFormatter(
             '%(asctime)s - %(levelname)s - [%(name)s] - %(message)s'
+        ))
+
+        # Handlers run on the listener thread, fed by the queue handler
+        self.handlers = [console_handler, file_handler]
+        self.queue_handler = BoundedQueueHandler(
+            queue.Queue(LOG_QUEUE_SIZE), LOG_QUEUE_FULL_POLICY, LOG_QUEUE_BLOCK_TIMEOUT
         )
-        file_handler.setFormatter(file_formatter)
-        file_handler.addFilter(sensitive_filter)# <-- ADDED THIS LINE
+        # Context fields are read here, in the logging thread, before records are queued
+        self.queue_handler.addFilter(LogContextFilter())
+        self.logger.addHandler(self.queue_handler)
+        self.listener: Optional[QueueListener] = None
+        self._start_listener()
+
+        atexit.register(self.shutdown)
+        # The listener thread does not survive fork(), e.g. of a preloaded gunicorn app
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_listener(self) -> None:
+        self.listener = QueueListener(self.queue_handler.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def _after_fork(self) -> None:
+        # Start over with an empty queue: records queued by the parent are its own
+        self.queue_handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+        self.queue_handler.dropped = 0
+        self._start_listener()
+
+    def shutdown(self) -> None:
+        """Write out all queued records and stop the listener thread."""
+        if self.listener is None:
+            return
+        self.listener.stop()
+        self.listener = None
 
-        # Add handlers to logger
-        self.logger.addHandler(console_handler)
-        self.logger.addHandler(file_handler)
+        if self.queue_handler.dropped:
+            record = logging.makeLogRecord({
+                'name': self.logger.name, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f"Dropped {self.queue_handler.dropped} log records while the log queue was full",
+            })
+            for handler in self.handlers:
+                handler.handle(record)
+        for handler in self.handlers:
+            handler.flush()
 
     def get_logger(self) -> logging.Logger:
         """
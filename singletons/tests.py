@@ -0,0 +1,75 @@
+from django.test import TestCase
+from singletons.logger_singleton import LoggerSingleton, BoundedQueueHandler, JSONFormatter, RedactingFormatter, redact
+import json
+import logging
+import queue
+
+
+class LogQueueTest(TestCase):
+    def test_logger_uses_bounded_queue(self):
+        """Test that the logger hands records to the queue instead of writing them itself."""
+        logger = LoggerSingleton().get_logger()
+        self.assertEqual(
+            [type(handler) for handler in logger.handlers], [BoundedQueueHandler]
+        )
+
+    def test_full_log_queue_drops_records(self):
+        """Test that the drop policy discards records while the queue is full."""
+        handler = BoundedQueueHandler(queue.Queue(1), policy='drop')
+        record = logging.makeLogRecord({'msg': 'message'})
+        handler.handle(record)
+        handler.handle(record)
+        self.assertEqual(handler.queue.qsize(), 1)
+        self.assertEqual(handler.dropped, 1)
+
+    def test_full_log_queue_blocks_up_to_timeout(self):
+        """Test that the block policy waits for room, then drops the record."""
+        handler = BoundedQueueHandler(queue.Queue(1), policy='block', block_timeout=0.01)
+        handler.handle(logging.makeLogRecord({'msg': 'message'}))
+        handler.handle(logging.makeLogRecord({'msg': 'message'}))
+        self.assertEqual(handler.dropped, 1)
+
+    def queued_exception_record(self):
+        """Log an exception through a BoundedQueueHandler and return the queued record."""
+        handler = BoundedQueueHandler(queue.Queue())
+        logger = logging.getLogger('queued_exception_test')
+        logger.propagate = False
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        try:
+            raise ValueError('password=hunter2')
+        except ValueError:
+            logger.exception('boom %s', 'x')
+        return handler.queue.get_nowait()
+
+    def test_queued_exception_json_field(self):
+        """Test that an exception logged through the queue is written as the JSON exception field."""
+        entry = json.loads(JSONFormatter().format(self.queued_exception_record()))
+        self.assertEqual(entry['message'], 'boom x')
+        self.assertIn('Traceback', entry['exception'])
+        self.assertIn('ValueError: password=[REDACTED]', entry['exception'])
+
+    def test_queued_exception_text(self):
+        """Test that the text format still appends the redacted traceback to the message."""
+        output = RedactingFormatter('%(message)s').format(self.queued_exception_record())
+        self.assertTrue(output.startswith('boom x\nTraceback'))
+        self.assertNotIn('hunter2', output)
+
+
+class RedactionTest(TestCase):
+    def test_redact(self):
+        """Test that tokens, passwords and secrets are redacted in one pass."""
+        self.assertEqual(
+            redact('Authorization: Bearer abc.def and {"access_token": "ya29.x", "password": "hunter2"}'),
+            'Authorization: Bearer [REDACTED] and {"access_token": "[REDACTED]", "password": "[REDACTED]"}'
+        )
+        self.assertEqual(redact('Deleted comment 1'), 'Deleted comment 1')
+
+    def test_redact_overlapping_matches(self):
+        """Test that overlapping matches are redacted like applying each pattern in turn."""
+        self.assertEqual(redact('secret: Bearer abc'), 'secret: [REDACTED] [REDACTED]')
+
+    def test_redacting_formatter(self):
+        """Test that the formatter redacts the message, including formatting arguments."""
+        record = logging.makeLogRecord({'msg': 'Login with %s', 'args': ('password=hunter2',)})
+        self.assertEqual(RedactingFormatter('%(message)s').format(record), 'Login with password=[REDACTED]')